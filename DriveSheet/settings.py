@@ -54,7 +54,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "DriveSheet.middleware.AsyncWhiteNoiseMiddleware",
+    "DriveSheet.middleware.RequestTimingMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
@@ -147,4 +148,31 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / "staticfiles_build" / "static"
-STATICFILES_STORAGE = "whitenoise.storage.CompressedStaticFilesStorage"
\ No newline at end of file
+STATICFILES_STORAGE = "whitenoise.storage.CompressedStaticFilesStorage"
+
+# Geocoding cache (trip.services.geocode_cache)
+GEOCODE_CACHE_TTL_SECONDS = config("GEOCODE_CACHE_TTL_SECONDS", default=30 * 24 * 3600, cast=int)
+GEOCODE_CACHE_MAX_ENTRIES = config("GEOCODE_CACHE_MAX_ENTRIES", default=1024, cast=int)
+GEOCODE_MAX_CONCURRENCY = config("GEOCODE_MAX_CONCURRENCY", default=2, cast=int)
+
+# OpenRouteService result cache (trip.services.route_cache)
+ROUTE_CACHE_TTL_SECONDS = config("ROUTE_CACHE_TTL_SECONDS", default=7 * 24 * 3600, cast=int)
+
+# Store daily log segments packed on DailyLog instead of as LogSegment rows
+TRIP_COMPACT_LOG_SEGMENTS = config("TRIP_COMPACT_LOG_SEGMENTS", default=False, cast=bool)
+
+# Simulated plans for recurring lanes (trip.services.plan_cache)
+PLAN_CACHE_TTL_SECONDS = config("PLAN_CACHE_TTL_SECONDS", default=24 * 3600, cast=int)
+PLAN_CACHE_MAX_ENTRIES = config("PLAN_CACHE_MAX_ENTRIES", default=256, cast=int)
+
+# Name FUEL/BREAK/REST stops by reverse geocoding their interpolated position
+ROUTE_STOP_REVERSE_GEOCODE = config("ROUTE_STOP_REVERSE_GEOCODE", default=False, cast=bool)
+
+# Rendered log sheets/PDFs kept in the cache, keyed by content hash
+LOG_RENDER_CACHE_SECONDS = config("LOG_RENDER_CACHE_SECONDS", default=24 * 3600, cast=int)
+
+# Serialized trip retrieve/map/logs responses, revalidated by ETag
+TRIP_RESPONSE_CACHE_SECONDS = config("TRIP_RESPONSE_CACHE_SECONDS", default=3600, cast=int)
+
+# Delay before a trip job that hit an upstream outage is retried (doubles per attempt)
+TRIP_JOB_RETRY_BACKOFF_SECONDS = config("TRIP_JOB_RETRY_BACKOFF_SECONDS", default=30, cast=int)
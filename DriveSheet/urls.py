@@ -1,9 +1,11 @@
 
 from django.contrib import admin
 from django.urls import path, include
+from api.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api-auth/', include('rest_framework.urls')),
-    path('api/',include('api.urls'))
+    path('api/',include('api.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -1,11 +1,16 @@
 from rest_framework.routers import DefaultRouter
-from trip.views import TripViewSet
+from trip.views import DriverViewSet, TripViewSet
+from trip.async_views import create_trip, trip_map
 from django.urls import path, include
 
 router = DefaultRouter()
 
 router.register(r'trips', TripViewSet, basename='trip')
+router.register(r'drivers', DriverViewSet, basename='driver')
 
 urlpatterns = [
     path('', include(router.urls)),
-]
\ No newline at end of file
+    # native async (ASGI) trip planning endpoints
+    path('async/trips/', create_trip, name='async-trip-create'),
+    path('async/trips/<uuid:pk>/map/', trip_map, name='async-trip-map'),
+]
@@ -1,3 +1,9 @@
-from django.shortcuts import render
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from trip.services.instrumentation import metrics
 
-# Create your views here.
+
+@require_GET
+def metrics_view(request):
+    """Prometheus scrape endpoint for the in-process request metrics."""
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,7 +1,11 @@
 from django.contrib import admin
-from .models import Trip, RouteStop,DailyLog,LogSegment
+from .models import Driver, Trip, RouteStop,DailyLog,LogSegment,GeocodeCacheEntry,RouteCacheEntry,TripJob
 # Register your models here.
+admin.site.register(Driver)
 admin.site.register(Trip)
 admin.site.register(RouteStop)
 admin.site.register(DailyLog)
-admin.site.register(LogSegment)
\ No newline at end of file
+admin.site.register(LogSegment)
+admin.site.register(GeocodeCacheEntry)
+admin.site.register(RouteCacheEntry)
+admin.site.register(TripJob)
\ No newline at end of file
@@ -3,3 +3,21 @@ from django.apps import AppConfig
 
 class TripConfig(AppConfig):
     name = 'trip'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+        from trip.models import Trip
+        from trip.services.cycle_ledger import rebuild_trip_driver_ledger
+        from trip.services.instrumentation import instrument_connection
+        from trip.services.response_cache import invalidate_trip_responses
+
+        # SQL query counts and time for /metrics and Server-Timing
+        connection_created.connect(instrument_connection, dispatch_uid="trip.instrument_connection")
+
+        # cached retrieve/map/logs responses of a changed or deleted trip
+        post_save.connect(invalidate_trip_responses, sender=Trip, dispatch_uid="trip.invalidate_responses")
+        post_delete.connect(invalidate_trip_responses, sender=Trip, dispatch_uid="trip.invalidate_responses")
+
+        # a deleted trip's days no longer count against its driver's cycle
+        post_delete.connect(rebuild_trip_driver_ledger, sender=Trip, dispatch_uid="trip.rebuild_driver_ledger")
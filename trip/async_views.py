@@ -0,0 +1,136 @@
+import json
+import requests
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from trip.models import Trip, RouteStop
+from trip.serializers import TripSerializer
+from trip.services.cycle_ledger import LedgerConflict
+from trip.services.async_route_service import async_get_route
+from trip.services.plan_cache import plan_cache, plan_cache_key
+from trip.services.response_cache import aget_cached_response, aset_cached_response, trip_etag
+from trip.services.trip_planner import apply_driver_cycle, plan_trip, trip_locations
+from trip.views import upstream_error_status
+
+# Native async (ASGI) versions of TripViewSet.create and TripViewSet.map.
+# External calls are awaited on a pooled httpx client instead of blocking a
+# thread; responses match the DRF endpoints.
+
+
+@csrf_exempt
+@require_POST
+async def create_trip(request):
+    """Async version of `TripViewSet.create`."""
+    try:
+        body = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"detail": "Request body must be JSON."}, status=400)
+
+    serializer = TripSerializer(data=body)
+    # validation looks up the driver, if any
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=400)
+    data = serializer.validated_data
+    trip_data, _ = apply_driver_cycle(data)
+
+    # Recurring trips reuse a cached plan; otherwise geocode every location
+    # concurrently and route current -> pickup -> drops in one request
+    route = None
+    if plan_cache_key(trip_locations(trip_data), trip_data["cycle_used_hours"]) not in plan_cache:
+        current, pickup, *drops = trip_locations(trip_data)
+        try:
+            route = await async_get_route(current, drops[-1], [pickup, *drops[:-1]])
+        except ValueError as exc:
+            return JsonResponse({"detail": str(exc)}, status=400)
+        except requests.RequestException as exc:
+            return JsonResponse({"detail": str(exc)}, status=upstream_error_status(exc))
+
+    # Simulate and persist in a worker thread (the HOS run and stop naming
+    # are blocking, and the async ORM has no transactions), with the same
+    # ledger conflict retry as the sync endpoint
+    try:
+        trip, total_days = await sync_to_async(plan_trip)(data, route)
+    except LedgerConflict as exc:
+        return JsonResponse({"detail": str(exc)}, status=409)
+    except ValueError as exc:
+        return JsonResponse({"detail": str(exc)}, status=400)
+    except requests.RequestException as exc:
+        return JsonResponse({"detail": str(exc)}, status=upstream_error_status(exc))
+
+    return JsonResponse(
+        {
+            "trip_id": str(trip.id),
+            "total_days": total_days,
+            "total_distance_miles": trip.total_distance_miles,
+        },
+        status=201,
+    )
+
+
+@require_GET
+async def trip_map(request, pk):
+    """Async version of `TripViewSet.map`, with the same ETag validation."""
+    row = await Trip.objects.filter(pk=pk).values_list("id", "updated_at").afirst()
+    if row is None:
+        return JsonResponse({"detail": "No Trip matches the given query."}, status=404)
+    trip_id, updated_at = row
+    etag = trip_etag(trip_id, updated_at, "async_map")
+    last_modified = int(updated_at.timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        data = await aget_cached_response(trip_id, "async_map", etag)
+        if data is None:
+            data = await _map_data(trip_id)
+            if "geometry" not in data:
+                # retried on the next request, so not validated either
+                response = JsonResponse(data)
+                response["Cache-Control"] = "no-store"
+                return response
+            await aset_cached_response(trip_id, "async_map", etag, data)
+        response = JsonResponse(data)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+async def _map_data(pk):
+    trip = await Trip.objects.only(
+        "id", "pickup_location", "drop_location", "total_distance_miles",
+        "total_duration_hours", "route_geometry",
+    ).aget(pk=pk)
+
+    route_stops = [
+        {**stop, "id": str(stop["id"])}
+        async for stop in RouteStop.objects.filter(trip_id=pk)
+        .order_by("day_number", "start_time")
+        .values("id", "type", "start_time", "end_time", "duration_minutes",
+                "day_number", "location_name", "latitude", "longitude")
+    ]
+    data = {
+        "id": str(trip.id),
+        "pickup_location": trip.pickup_location,
+        "drop_location": trip.drop_location,
+        "total_distance_miles": trip.total_distance_miles,
+        "total_duration_hours": trip.total_duration_hours,
+        "route_stops": route_stops,
+    }
+
+    # Trips created before geometry was stored look it up once
+    geometry = trip.route_geometry
+    if geometry is None:
+        try:
+            geometry = (await async_get_route(trip.pickup_location, trip.drop_location)).get("geometry")
+        except Exception:
+            # If the lookup fails, data will just not include geometry
+            pass
+        else:
+            await Trip.objects.filter(pk=trip.pk).aupdate(route_geometry=geometry)
+
+    if geometry is not None:
+        data["geometry"] = geometry
+    return data
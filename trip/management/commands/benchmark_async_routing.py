@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.conf import settings
+from django.test import AsyncClient, Client, override_settings
+from django.utils import timezone
+from trip.models import GeocodeCacheEntry, RouteCacheEntry, Trip
+from trip.services import route_service
+
+
+class StubRoutingHandler(BaseHTTPRequestHandler):
+    """Minimal Nominatim + OpenRouteService stand-in with fixed latency."""
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.05
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+        digest = hashlib.sha1(query.encode()).digest()
+        lat = 30 + digest[0] / 16
+        lon = -120 + digest[1] / 8
+        self._reply([{"lat": str(lat), "lon": str(lon)}])
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        legs = len(body["coordinates"]) - 1
+        self._reply({
+            "routes": [{
+                "summary": {"distance": 1609 * 600 * legs, "duration": 3600 * 11 * legs},
+                "segments": [{"distance": 1609 * 600, "duration": 3600 * 11}] * legs,
+                "geometry": "_p~iF~ps|U_ulLnnqC_mqNvxq`@",
+            }]
+        })
+
+    def _reply(self, payload):
+        time.sleep(self.latency)
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubRoutingServer(ThreadingHTTPServer):
+    # the default backlog of 5 drops connections under benchmark load
+    request_queue_size = 256
+    daemon_threads = True
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/second of the WSGI (DRF) and native ASGI trip "
+        "create/map endpoints against a local stub routing server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument("--latency-ms", type=float, default=50,
+                            help="Simulated upstream latency per call.")
+        parser.add_argument("--keep", action="store_true",
+                            help="Keep the trips and cache rows created by the run.")
+
+    def handle(self, *args, **options):
+        StubRoutingHandler.latency = options["latency_ms"] / 1000
+        server = StubRoutingServer(("127.0.0.1", 0), StubRoutingHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        stub = f"http://127.0.0.1:{server.server_port}"
+
+        original_urls = (route_service.NOMINATIM_URL, route_service.ORS_DIRECTIONS_URL)
+        route_service.NOMINATIM_URL = f"{stub}/search"
+        route_service.ORS_DIRECTIONS_URL = f"{stub}/v2/directions/driving-car"
+        started = timezone.now()
+        trip_ids = []
+        # the in-process test clients send Host: testserver
+        allowed_hosts = override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"])
+        allowed_hosts.enable()
+        try:
+            rows = []
+            for label, runner, create_path, map_path in (
+                ("wsgi", self._run_wsgi, "/api/trips/", "/api/trips/{}/map/"),
+                ("asgi", self._run_asgi, "/api/async/trips/", "/api/async/trips/{}/map/"),
+            ):
+                payloads = self._payloads(label, options["requests"])
+                elapsed, responses = runner("post", create_path, payloads, options["concurrency"])
+                ids = [r.json()["trip_id"] for r in responses if r.status_code == 201]
+                trip_ids.extend(ids)
+                rows.append((label, "create", len(payloads), elapsed, len(payloads) - len(ids)))
+
+                map_paths = [map_path.format(trip_id) for trip_id in ids]
+                elapsed, responses = runner("get", map_paths, None, options["concurrency"])
+                errors = sum(1 for r in responses if r.status_code != 200)
+                rows.append((label, "map", len(map_paths), elapsed, errors))
+        finally:
+            allowed_hosts.disable()
+            route_service.NOMINATIM_URL, route_service.ORS_DIRECTIONS_URL = original_urls
+            server.shutdown()
+            server.server_close()
+            if not options["keep"]:
+                Trip.objects.filter(pk__in=trip_ids).delete()
+                GeocodeCacheEntry.objects.filter(query__startswith="bench ").delete()
+                RouteCacheEntry.objects.filter(created_at__gte=started).delete()
+
+        self.stdout.write(f"{'path':<6}{'endpoint':<10}{'requests':>10}{'seconds':>10}{'req/s':>10}{'errors':>8}")
+        for label, endpoint, count, elapsed, errors in rows:
+            rate = count / elapsed if elapsed else 0
+            self.stdout.write(
+                f"{label:<6}{endpoint:<10}{count:>10}{elapsed:>10.2f}{rate:>10.1f}{errors:>8}"
+            )
+
+    def _payloads(self, label, count):
+        # unique addresses so every request reaches the stub server
+        run = uuid.uuid4().hex[:8]
+        return [
+            {
+                "current_location": f"bench {run} {label} {i} current",
+                "pickup_location": f"bench {run} {label} {i} pickup",
+                "drop_location": f"bench {run} {label} {i} drop",
+                "cycle_used_hours": i % 70,
+            }
+            for i in range(count)
+        ]
+
+    def _run_wsgi(self, method, path, payloads, concurrency):
+        client_local = threading.local()
+
+        def send(item):
+            if not hasattr(client_local, "client"):
+                client_local.client = Client()
+            close_old_connections()
+            if method == "post":
+                return client_local.client.post(path, item, content_type="application/json")
+            return client_local.client.get(item)
+
+        items = payloads if method == "post" else path
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            responses = list(pool.map(send, items))
+        return time.perf_counter() - start, responses
+
+    def _run_asgi(self, method, path, payloads, concurrency):
+        async def run():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def send(item):
+                async with semaphore:
+                    if method == "post":
+                        return await client.post(path, item, content_type="application/json")
+                    return await client.get(item)
+
+            items = payloads if method == "post" else path
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(send(item) for item in items))
+            return time.perf_counter() - start, responses
+
+        return asyncio.run(run())
@@ -0,0 +1,67 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from trip.services.hos_benchmark import (
+    BASELINE_PATH,
+    BENCHMARK_DISTANCES,
+    GOLDEN_PATH,
+    find_regressions,
+    measure,
+    write_golden,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark HOSEngine.simulate, generate_daily_logs and trip persistence "
+        "across trip lengths and compare against the stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5,
+                            help="Runs per measurement; the median is kept.")
+        parser.add_argument("--threshold", type=float, default=0.5,
+                            help="Allowed relative slowdown before failing (0.5 = 50%%); "
+                                 "small absolute changes never fail.")
+        parser.add_argument("--baseline", default=str(BASELINE_PATH))
+        parser.add_argument("--save-baseline", action="store_true",
+                            help="Overwrite the baseline with this run's results.")
+        parser.add_argument("--write-golden", action="store_true",
+                            help="Regenerate the golden schedules from the current engine.")
+
+    def handle(self, *args, **options):
+        if options["write_golden"]:
+            count = write_golden()
+            self.stdout.write(f"Wrote {count} golden schedules to {GOLDEN_PATH}.")
+            return
+
+        results = {distance: measure(distance, options["repeat"]) for distance in BENCHMARK_DISTANCES}
+
+        self.stdout.write(
+            f"{'miles':>8}{'segments':>10}{'simulate ms':>13}{'peak KiB':>10}"
+            f"{'logs ms':>10}{'logs KiB':>10}{'persist ms':>12}{'queries':>9}"
+        )
+        for distance, m in results.items():
+            self.stdout.write(
+                f"{distance:>8}{m['segments']:>10}{m['simulate_ms']:>13.3f}"
+                f"{m['simulate_peak_kib']:>10.1f}{m['daily_logs_ms']:>10.3f}{m['daily_logs_peak_kib']:>10.1f}"
+                f"{m['persist_ms']:>12.3f}{m['persist_queries']:>9}"
+            )
+
+        if options["save_baseline"]:
+            with open(options["baseline"], "w") as f:
+                json.dump({str(d): m for d, m in results.items()}, f, indent=2)
+                f.write("\n")
+            self.stdout.write(f"Saved baseline to {options['baseline']}.")
+            return
+
+        try:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            self.stdout.write("No baseline found; run with --save-baseline to create one.")
+            return
+
+        regressions = find_regressions(results, baseline, options["threshold"])
+        if regressions:
+            raise CommandError("Performance regressions:\n" + "\n".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
@@ -0,0 +1,79 @@
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from trip.models import DailyLog, LogSegment, Trip
+from trip.services.log_generator import decode_segments, encode_segments
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert stored daily log segments between LogSegment rows and the "
+        "compact packed form on DailyLog.segments."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500,
+                            help="Daily logs converted per transaction.")
+        parser.add_argument("--keep-rows", action="store_true",
+                            help="Keep the LogSegment rows after packing them.")
+        parser.add_argument("--unpack", action="store_true",
+                            help="Restore LogSegment rows from packed daily logs.")
+
+    def handle(self, *args, **options):
+        convert = self._unpack_batch if options["unpack"] else self._pack_batch
+        total = 0
+        while True:
+            converted = convert(options["batch_size"], options["keep_rows"])
+            if not converted:
+                break
+            total += converted
+        action = "Unpacked" if options["unpack"] else "Packed"
+        self.stdout.write(f"{action} segments of {total} daily log(s).")
+
+    def _pack_batch(self, batch_size, keep_rows):
+        with transaction.atomic():
+            logs = list(
+                DailyLog.objects.select_for_update()
+                .filter(segments__isnull=True)
+                .only("id", "trip_id", "segments")[:batch_size]
+            )
+            if not logs:
+                return 0
+            segments_by_log = defaultdict(list)
+            rows = LogSegment.objects.filter(daily_log__in=logs)
+            for seg in rows.only("daily_log_id", "status", "start_minute", "end_minute"):
+                segments_by_log[seg.daily_log_id].append(seg)
+            for log in logs:
+                log.segments = encode_segments(segments_by_log[log.id])
+            DailyLog.objects.bulk_update(logs, ["segments"])
+            if not keep_rows:
+                rows.delete()
+            _touch_trips(logs)
+        return len(logs)
+
+    def _unpack_batch(self, batch_size, keep_rows):
+        with transaction.atomic():
+            logs = list(
+                DailyLog.objects.select_for_update()
+                .filter(segments__isnull=False)
+                .only("id", "trip_id", "segments")[:batch_size]
+            )
+            if not logs:
+                return 0
+            # rows kept by `--keep-rows` must not be duplicated
+            LogSegment.objects.filter(daily_log__in=logs).delete()
+            LogSegment.objects.bulk_create(
+                LogSegment(daily_log=log, **seg)
+                for log in logs
+                for seg in decode_segments(log.segments)
+            )
+            DailyLog.objects.filter(pk__in=[log.pk for log in logs]).update(segments=None)
+            _touch_trips(logs)
+        return len(logs)
+
+
+def _touch_trips(logs):
+    # segment ids change with the storage form, so cached `logs` responses
+    # and their ETags must be refreshed
+    Trip.objects.filter(pk__in={log.trip_id_id for log in logs}).update(updated_at=timezone.now())
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from trip.models import Driver
+from trip.services.cycle_ledger import rebuild_driver_ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute drivers' rolling duty ledgers from their persisted daily "
+        "logs, e.g. after trips were deleted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--driver", action="append", default=[],
+                            help="Driver id to rebuild (repeatable); all drivers by default.")
+
+    def handle(self, *args, **options):
+        drivers = Driver.objects.all()
+        if options["driver"]:
+            drivers = drivers.filter(pk__in=options["driver"])
+
+        total = 0
+        for driver_id in drivers.values_list("id", flat=True):
+            with transaction.atomic():
+                rebuild_driver_ledger(driver_id)
+            total += 1
+        self.stdout.write(f"Rebuilt cycle ledgers of {total} driver(s).")
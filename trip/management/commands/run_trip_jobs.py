@@ -0,0 +1,56 @@
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from trip.services.job_queue import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = "Run queued asynchronous trip planning jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2,
+                            help="Number of worker threads.")
+        parser.add_argument("--poll-interval", type=float, default=1.0,
+                            help="Seconds to sleep when the queue is empty.")
+        parser.add_argument("--once", action="store_true",
+                            help="Exit once the queue is empty instead of polling.")
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        threads = [
+            threading.Thread(
+                target=self._work,
+                args=(stop, options["poll_interval"], options["once"]),
+                name=f"trip-worker-{i}",
+                daemon=True,
+            )
+            for i in range(options["workers"])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(f"Started {len(threads)} trip job worker(s).")
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def _work(self, stop, poll_interval, once):
+        # each thread has its own DB connection
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                job = claim_next_job()
+                if job is None:
+                    if once:
+                        return
+                    time.sleep(poll_interval)
+                    continue
+                job = run_job(job)
+                self.stdout.write(f"Job {job.id}: {job.status}")
+        finally:
+            connection.close()
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:02
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0003_geocodecacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteCacheEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('distance_miles', models.FloatField()),
+                ('duration_hours', models.FloatField()),
+                ('geometry', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='route_geometry',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0004_route_geometry_and_cache'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='trip',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='dailylog',
+            index=models.Index(fields=['trip_id', 'day_number'], name='dailylog_trip_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logsegment',
+            index=models.Index(fields=['daily_log', 'start_minute'], name='logsegment_log_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='routestop',
+            index=models.Index(fields=['trip', 'day_number'], name='routestop_trip_day_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0006_tripjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailylog',
+            name='segments',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
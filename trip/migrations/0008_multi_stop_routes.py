@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0007_dailylog_segments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='routecacheentry',
+            name='legs',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='extra_drop_locations',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AlterField(
+            model_name='routecacheentry',
+            name='key',
+            field=models.CharField(max_length=512, unique=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0008_multi_stop_routes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='routestop',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='routestop',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0010_driver_cycle_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tripjob',
+            name='not_before',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
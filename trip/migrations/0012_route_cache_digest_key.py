@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-18 13:09
+
+from django.db import migrations, models
+
+
+def clear_route_cache(apps, schema_editor):
+    # entries keyed by the old coordinate strings can never be hit again,
+    # and some would not fit the shorter column
+    apps.get_model('trip', 'RouteCacheEntry').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trip', '0011_tripjob_not_before'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_route_cache, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='routecacheentry',
+            name='key',
+            field=models.CharField(max_length=64, unique=True),
+        ),
+    ]
@@ -3,6 +3,19 @@ from django.db import models
 
 # Create your models here.
 
+class Driver(models.Model):
+    id = models.UUIDField(primary_key=True,default=uuid.uuid4,editable=False)
+    name = models.CharField(max_length=255)
+    # rolling duty ledger (trip.services.cycle_ledger): the last 8 days ending
+    # on ledger_end_date, oldest first, as [on duty, leading off, trailing off] minutes
+    ledger_end_date = models.DateField(blank=True,null=True,editable=False)
+    ledger_days = models.JSONField(default=list,blank=True,editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    def __str__(self):
+        return self.name
+
+
 class Trip(models.Model):
     id  = models.UUIDField(primary_key=True,default=uuid.uuid4,editable=False)
     current_location = models.CharField(max_length=255)
@@ -11,7 +24,11 @@ class Trip(models.Model):
     cycle_used_hours = models.FloatField()
     total_distance_miles = models.FloatField(blank=True)
     total_duration_hours = models.FloatField(blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    route_geometry = models.TextField(blank=True,null=True,editable=False)
+    # drops made in order between pickup and drop_location
+    extra_drop_locations = models.JSONField(default=list,blank=True)
+    driver = models.ForeignKey(Driver,on_delete=models.SET_NULL,related_name='trips',blank=True,null=True)
+    created_at = models.DateTimeField(auto_now_add=True,db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
     def __str__(self):
         return str(self.id)
@@ -35,6 +52,14 @@ class RouteStop(models.Model):
     end_time = models.IntegerField()
     duration_minutes = models.IntegerField()
     day_number = models.IntegerField()
+    latitude = models.FloatField(blank=True,null=True)
+    longitude = models.FloatField(blank=True,null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['trip', 'day_number'], name='routestop_trip_day_idx'),
+        ]
+
     def __str__(self):
         return str(self.id)
     
@@ -46,6 +71,15 @@ class DailyLog(models.Model):
     total_driving_hours = models.DurationField()
     total_on_duty_hour = models.DurationField()
     total_off_duty_hour = models.DurationField()
+    # packed [status code, start, end] triples (see log_generator.encode_segments);
+    # null when the day's segments are stored as LogSegment rows
+    segments = models.JSONField(blank=True,null=True,editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['trip_id', 'day_number'], name='dailylog_trip_day_idx'),
+        ]
+
     def __str__(self):
         return str(self.id)
 
@@ -61,4 +95,62 @@ class LogSegment(models.Model):
     daily_log = models.ForeignKey(DailyLog,on_delete=models.CASCADE,related_name='log_segments')
     status = models.CharField(max_length=10,choices=status_choices)
     start_minute = models.IntegerField()
-    end_minute = models.IntegerField()
\ No newline at end of file
+    end_minute = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['daily_log', 'start_minute'], name='logsegment_log_start_idx'),
+        ]
+
+class GeocodeCacheEntry(models.Model):
+    id = models.UUIDField(primary_key=True,default=uuid.uuid4,editable=False)
+    query = models.CharField(max_length=255,unique=True)
+    lat = models.FloatField()
+    lon = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    def __str__(self):
+        return self.query
+
+
+class RouteCacheEntry(models.Model):
+    id = models.UUIDField(primary_key=True,default=uuid.uuid4,editable=False)
+    # sha256 of the rounded waypoint coordinates (route_cache_key)
+    key = models.CharField(max_length=64,unique=True)
+    distance_miles = models.FloatField()
+    duration_hours = models.FloatField()
+    geometry = models.TextField()
+    # per-leg distance_miles/duration_hours; null on single-leg entries cached before legs were stored
+    legs = models.JSONField(blank=True,null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    def __str__(self):
+        return self.key
+
+
+class TripJob(models.Model):
+    status_choices = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True,default=uuid.uuid4,editable=False)
+    status = models.CharField(max_length=10,choices=status_choices,default='PENDING')
+    payload = models.JSONField()
+    trip = models.ForeignKey(Trip,on_delete=models.SET_NULL,related_name='jobs',blank=True,null=True)
+    result = models.JSONField(blank=True,null=True)
+    error = models.TextField(blank=True)
+    attempts = models.IntegerField(default=0)
+    # a requeued job is not claimed again before this time
+    not_before = models.DateTimeField(blank=True,null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True,null=True)
+    finished_at = models.DateTimeField(blank=True,null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='tripjob_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return str(self.id)
@@ -0,0 +1,10 @@
+from rest_framework.pagination import CursorPagination
+
+
+class TripCursorPagination(CursorPagination):
+    # cursor pagination keeps deep pages as cheap as the first one on the
+    # indexed created_at column
+    ordering = '-created_at'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -1,5 +1,10 @@
+from django.conf import settings
+from django.utils.duration import duration_string
 from rest_framework import serializers
-from trip.models import Trip, RouteStop, DailyLog, LogSegment
+from trip.models import Driver, Trip, RouteStop, DailyLog, LogSegment, TripJob
+from trip.services.cycle_ledger import CycleLedger
+from trip.services.hos_engine import MAX_CYCLE_HOURS
+from trip.services.log_generator import decode_segments
 
 class LogSegmentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -16,12 +21,57 @@ class DailyLogSerializer(serializers.ModelSerializer):
 class RouteStopSerializer(serializers.ModelSerializer):
     class Meta:
         model = RouteStop
-        fields = ['id', 'type', 'start_time', 'end_time', 'duration_minutes', 'day_number', 'location_name']
+        fields = ['id', 'type', 'start_time', 'end_time', 'duration_minutes', 'day_number', 'location_name', 'latitude', 'longitude']
 
 class TripSerializer(serializers.ModelSerializer):
+    extra_drop_locations = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        required=False,
+        # every stop adds an on-duty hour to the day it is made on
+        max_length=getattr(settings, 'TRIP_MAX_EXTRA_DROPS', 8),
+    )
+
+    # taken from the driver's cycle ledger when a driver is given
+    cycle_used_hours = serializers.FloatField(required=False)
+
     class Meta:
         model = Trip
-        fields = '__all__'
+        exclude = ['route_geometry']
+
+    def validate(self, attrs):
+        if (not self.partial and attrs.get('driver') is None
+                and attrs.get('cycle_used_hours') is None):
+            raise serializers.ValidationError(
+                {'cycle_used_hours': 'This field is required for trips without a driver.'}
+            )
+        return attrs
+
+class DriverSerializer(serializers.ModelSerializer):
+    # read from the rolling duty ledger, as of the driver's next trip
+    next_start_date = serializers.SerializerMethodField()
+    cycle_used_hours = serializers.SerializerMethodField()
+    cycle_available_hours = serializers.SerializerMethodField()
+    last_restart_date = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Driver
+        fields = ['id', 'name', 'next_start_date', 'cycle_used_hours', 'cycle_available_hours',
+                  'last_restart_date', 'created_at', 'updated_at']
+
+    def get_next_start_date(self, driver):
+        return CycleLedger.from_driver(driver).next_start_date()
+
+    def get_cycle_used_hours(self, driver):
+        ledger = CycleLedger.from_driver(driver)
+        return ledger.cycle_used_hours(ledger.next_start_date())
+
+    def get_cycle_available_hours(self, driver):
+        return MAX_CYCLE_HOURS - self.get_cycle_used_hours(driver)
+
+    def get_last_restart_date(self, driver):
+        ledger = CycleLedger.from_driver(driver)
+        return ledger.last_restart_date(ledger.next_start_date())
+
 
 class TripMapSerializer(serializers.ModelSerializer):
     route_stops = RouteStopSerializer(many=True, read_only=True)
@@ -37,3 +87,183 @@ class TripLogsSerializer(serializers.ModelSerializer):
         model = Trip
         fields = ['id', 'total_distance_miles', 'total_duration_hours', 'daily_logs']
 
+
+def trip_logs_data(trip):
+    """Values-based equivalent of `TripLogsSerializer(trip).data`.
+
+    Reads the trip's daily logs and all of their segments with two
+    `.values()` queries, whatever the number of days, and builds the
+    response without instantiating model or serializer objects. Days stored
+    in compact form come with their segments packed, so when every day is
+    compact the segment query is skipped. Packed segments have no row of
+    their own; their id is "<daily log id>:<index>".
+    """
+    daily_logs = list(
+        DailyLog.objects.filter(trip_id=trip)
+        .order_by('day_number')
+        .values('id', 'day_number', 'date', 'total_driving_hours',
+                'total_on_duty_hour', 'total_off_duty_hour', 'segments')
+    )
+    segments_by_log = {}
+    for log in daily_logs:
+        if log['segments'] is None:
+            segments_by_log[log['id']] = []
+            continue
+        segments_by_log[log['id']] = [
+            {'id': f"{log['id']}:{index}", **seg}
+            for index, seg in enumerate(decode_segments(log['segments']))
+        ]
+
+    if any(log['segments'] is None for log in daily_logs):
+        segments = (
+            LogSegment.objects.filter(daily_log__trip_id=trip, daily_log__segments__isnull=True)
+            .order_by('start_minute')
+            .values_list('daily_log_id', 'id', 'status', 'start_minute', 'end_minute')
+        )
+        for daily_log_id, seg_id, status, start_minute, end_minute in segments:
+            segments_by_log[daily_log_id].append({
+                'id': str(seg_id),
+                'status': status,
+                'start_minute': start_minute,
+                'end_minute': end_minute,
+            })
+
+    return {
+        'id': str(trip.id),
+        'total_distance_miles': trip.total_distance_miles,
+        'total_duration_hours': trip.total_duration_hours,
+        'daily_logs': [
+            {
+                'id': str(log['id']),
+                'day_number': log['day_number'],
+                'date': log['date'].isoformat(),
+                'total_driving_hours': duration_string(log['total_driving_hours']),
+                'total_on_duty_hour': duration_string(log['total_on_duty_hour']),
+                'total_off_duty_hour': duration_string(log['total_off_duty_hour']),
+                'log_segments': segments_by_log[log['id']],
+            }
+            for log in daily_logs
+        ],
+    }
+
+
+class TripJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TripJob
+        fields = ['id', 'status', 'trip', 'result', 'error', 'attempts', 'not_before', 'created_at', 'started_at', 'finished_at']
+
+
+class TripListFilterSerializer(serializers.Serializer):
+    # query parameters accepted by the trip list endpoint
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+    min_distance = serializers.FloatField(required=False, min_value=0)
+    max_distance = serializers.FloatField(required=False, min_value=0)
+    location = serializers.CharField(required=False, max_length=255)
+
+    def validate(self, attrs):
+        if ('min_distance' in attrs and 'max_distance' in attrs
+                and attrs['min_distance'] > attrs['max_distance']):
+            raise serializers.ValidationError('min_distance must not exceed max_distance.')
+        return attrs
+
+
+class LogExportFilterSerializer(serializers.Serializer):
+    # query parameters accepted by the log export endpoint; `format` is
+    # left to DRF's content negotiation
+    export_format = serializers.ChoiceField(choices=['csv', 'ndjson'], default='csv')
+    date_after = serializers.DateField(required=False)
+    date_before = serializers.DateField(required=False)
+    # repeat `trip` in the query string for several trips
+    trip = serializers.ListField(child=serializers.UUIDField(), required=False)
+
+
+class TripBatchSerializer(serializers.Serializer):
+    # items are validated one by one with TripSerializer so that a bad trip
+    # only fails its own entry
+    trips = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=getattr(settings, 'TRIP_BATCH_MAX_SIZE', 100),
+    )
+
+
+class WhatIfSerializer(serializers.Serializer):
+    distances = serializers.ListField(
+        child=serializers.FloatField(min_value=0),
+        allow_empty=False,
+    )
+    cycle_used_hours = serializers.ListField(
+        child=serializers.FloatField(min_value=0, max_value=70),
+        allow_empty=False,
+    )
+
+    def validate(self, attrs):
+        max_cells = getattr(settings, 'TRIP_WHAT_IF_MAX_CELLS', 100_000)
+        if len(attrs['distances']) * len(attrs['cycle_used_hours']) > max_cells:
+            raise serializers.ValidationError(
+                f'At most {max_cells} (distance, cycle_used_hours) combinations per request.'
+            )
+        return attrs
+
+
+class FleetAvailabilitySerializer(serializers.Serializer):
+    # the load is either a distance or a pickup/drop pair to route
+    distance_miles = serializers.FloatField(required=False, min_value=0)
+    pickup_location = serializers.CharField(required=False, max_length=255)
+    drop_location = serializers.CharField(required=False, max_length=255)
+    # all drivers when omitted
+    drivers = serializers.ListField(
+        child=serializers.UUIDField(),
+        required=False,
+        allow_empty=False,
+        max_length=getattr(settings, 'FLEET_AVAILABILITY_MAX_DRIVERS', 5000),
+    )
+    start_date = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        has_locations = 'pickup_location' in attrs and 'drop_location' in attrs
+        if ('distance_miles' in attrs) == has_locations:
+            raise serializers.ValidationError(
+                'Give either distance_miles or both pickup_location and drop_location.'
+            )
+        return attrs
+
+
+class ReplanSegmentSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=LogSegment.status_choices)
+    start_minute = serializers.IntegerField(min_value=0, max_value=1440)
+    end_minute = serializers.IntegerField(min_value=0, max_value=1440)
+
+
+class TripReplanSerializer(serializers.Serializer):
+    # where the driver is: a day and minute of the trip's logs, and how far
+    # along the route (or a position to project onto it)
+    day_number = serializers.IntegerField(min_value=1)
+    minute = serializers.IntegerField(min_value=0, max_value=1439)
+    miles_completed = serializers.FloatField(required=False, min_value=0)
+    latitude = serializers.FloatField(required=False, min_value=-90, max_value=90)
+    longitude = serializers.FloatField(required=False, min_value=-180, max_value=180)
+    distance_since_fuel = serializers.FloatField(required=False, min_value=0)
+    # the day's actual log up to `minute`; the stored plan when omitted
+    log_segments = ReplanSegmentSerializer(many=True, required=False)
+
+    def validate(self, attrs):
+        has_position = 'latitude' in attrs and 'longitude' in attrs
+        if ('miles_completed' in attrs) == has_position:
+            raise serializers.ValidationError(
+                'Give either miles_completed or both latitude and longitude.'
+            )
+        if 'log_segments' in attrs:
+            end = 0
+            for seg in attrs['log_segments']:
+                if seg['start_minute'] != end or seg['end_minute'] <= seg['start_minute']:
+                    break
+                end = seg['end_minute']
+            else:
+                if end == attrs['minute']:
+                    return attrs
+            raise serializers.ValidationError(
+                {'log_segments': 'Segments must run back to back from minute 0 to `minute`.'}
+            )
+        return attrs
@@ -0,0 +1,106 @@
+import asyncio
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from trip.services import route_service
+from trip.services.geocode_cache import geocode_cache, normalize_query
+from trip.services.http_client import CircuitOpenError, get_async_http_client
+from trip.services.instrumentation import count, timed
+from trip.services.route_cache import route_cache, route_cache_key
+
+# Async counterparts of route_service for the ASGI views. Location parsing,
+# caching and response handling are shared with the sync module; only the
+# HTTP calls differ.
+
+
+async def async_request_geocode(query):
+    """Async version of `route_service._request_geocode`."""
+    params = {"q": query, "format": "json", "limit": 1}
+    headers = {"User-Agent": "DriveSheetBackend/1.0"}
+    try:
+        with timed("nominatim"):
+            r = await get_async_http_client().get(
+                "nominatim", route_service.NOMINATIM_URL, params=params, headers=headers
+            )
+        r.raise_for_status()
+        results = r.json()
+    except CircuitOpenError:
+        raise
+    except (httpx.HTTPError, requests.RequestException) as exc:
+        raise route_service.GeocodingUnavailable(f"Geocoding failed for '{query}': {exc}") from exc
+
+    if not results:
+        raise ValueError(f"Could not geocode location: '{query}'")
+
+    first = results[0]
+    return {"lat": first.get("lat"), "lon": first.get("lon")}
+
+
+async def async_resolve_locations(locations, max_workers=None):
+    """Async version of `route_service.resolve_locations`: cache misses are
+    geocoded concurrently, at most `max_workers` (default
+    GEOCODE_MAX_CONCURRENCY) in flight at a time.
+
+    Raises ValueError if any location cannot be resolved, or the
+    RequestException that stopped its geocoding.
+    """
+    cache_get = sync_to_async(geocode_cache.get)
+    cache_set = sync_to_async(geocode_cache.set)
+
+    geocoded = {}
+    misses = []
+    for obj in locations:
+        if not isinstance(obj, str) or route_service._parse_json_location(obj) is not None:
+            continue
+        key = normalize_query(obj)
+        if key in geocoded or key in misses:
+            continue
+        cached = await cache_get(obj)
+        if cached is None:
+            misses.append(key)
+        else:
+            count("geocode_cache_hit")
+            geocoded[key] = cached
+
+    if misses:
+        count("geocode_cache_miss", len(misses))
+        semaphore = asyncio.Semaphore(max_workers or route_service.GEOCODE_MAX_CONCURRENCY)
+
+        async def geocode(key):
+            async with semaphore:
+                return await async_request_geocode(key)
+
+        results = await asyncio.gather(*(geocode(key) for key in misses), return_exceptions=True)
+        for key, location in zip(misses, results):
+            if isinstance(location, (ValueError, requests.RequestException)):
+                geocoded[key] = location
+            elif isinstance(location, BaseException):
+                raise location
+            else:
+                await cache_set(key, location)
+                geocoded[key] = location
+
+    return [route_service._get_lat_lon(obj, geocoded) for obj in locations]
+
+
+async def async_get_route(origin, destination, waypoints=()):
+    """Async version of `route_service.get_route`, sharing its route cache."""
+    points = await async_resolve_locations([origin, *waypoints, destination])
+
+    key = route_cache_key(*(value for point in points for value in point))
+    cached = await sync_to_async(route_cache.get)(key)
+    if cached is not None:
+        count("route_cache_hit")
+        return cached
+
+    count("route_cache_miss")
+    payload = {"coordinates": [[lon, lat] for lat, lon in points]}
+    headers = {"Authorization": route_service.API_KEY, "Content-Type": "application/json"}
+    with timed("ors"):
+        res = await get_async_http_client().post(
+            "ors", route_service.ORS_DIRECTIONS_URL, json=payload, headers=headers
+        )
+    res.raise_for_status()
+    route = route_service._parse_directions(res.json(), len(points) - 1)
+    await sync_to_async(route_cache.set)(key, route)
+    return route
@@ -0,0 +1,202 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, timedelta
+from django.db import transaction
+from django.db.models import Max
+from trip.models import DailyLog, Driver, LogSegment
+from trip.services.hos_engine import DAY_MINUTES, MAX_CYCLE_HOURS, MINUTES_PER_HOUR
+from trip.services.log_generator import decode_segments
+
+# Rolling 70-hour/8-day duty ledger of a driver.
+#
+# Each driver keeps the last CYCLE_DAYS days of duty on its row, one
+# [on-duty, leading off-duty, trailing off-duty] triple (minutes) per day,
+# so the cycle hours available to a new trip are computed from at most
+# eight entries instead of the driver's whole log history. The off-duty
+# edges of each day are enough to find 34-hour restarts, which always
+# span a day boundary.
+
+CYCLE_DAYS = 8
+RESTART_MINUTES = 34 * MINUTES_PER_HOUR
+DUTY_STATUSES = ("DRIVING", "ON_DUTY")
+OFF_DAY = (0, DAY_MINUTES, DAY_MINUTES)
+
+
+class LedgerConflict(ValueError):
+    """A driver's ledger changed between planning a trip and writing it
+    (e.g. another trip of the driver was booked meanwhile)."""
+
+
+@dataclass(slots=True)
+class DutyDay:
+    """On-duty minutes of one calendar day and the off-duty time before the
+    first and after the last on-duty minute."""
+    on_duty_minutes: int
+    leading_off_minutes: int
+    trailing_off_minutes: int
+
+    @classmethod
+    def from_segments(cls, segments):
+        """Build from one day's (status, start_minute, end_minute) tuples.
+        Time a log does not cover (after the end of a trip) is off duty."""
+        duty = [(start, end) for status, start, end in segments if status in DUTY_STATUSES]
+        if not duty:
+            return cls(*OFF_DAY)
+        return cls(
+            sum(end - start for start, end in duty),
+            min(start for start, _ in duty),
+            DAY_MINUTES - max(end for _, end in duty),
+        )
+
+    @classmethod
+    def from_summary(cls, summary):
+        """Build from a DaySummary (HOSEngine.days)."""
+        return cls.from_segments((s.status, s.start_minute, s.end_minute) for s in summary.segments)
+
+    def merge(self, other):
+        """Combine two logs of the same date (e.g. two trips). The off-duty
+        edges keep the shorter side, so restarts are never overstated."""
+        if not other.on_duty_minutes:
+            return self
+        if not self.on_duty_minutes:
+            return other
+        return DutyDay(
+            self.on_duty_minutes + other.on_duty_minutes,
+            min(self.leading_off_minutes, other.leading_off_minutes),
+            min(self.trailing_off_minutes, other.trailing_off_minutes),
+        )
+
+
+class CycleLedger:
+    """The last CYCLE_DAYS days of duty ending on `end_date`, oldest first.
+
+    Stored on Driver as `ledger_end_date` and `ledger_days` (JSON lists of
+    DutyDay fields). Days without a log are off duty.
+    """
+
+    __slots__ = ("end_date", "days")
+
+    def __init__(self, end_date=None, days=None):
+        self.end_date = end_date
+        self.days = [DutyDay(*day) for day in days] if days else [DutyDay(*OFF_DAY) for _ in range(CYCLE_DAYS)]
+
+    @classmethod
+    def from_driver(cls, driver):
+        return cls(driver.ledger_end_date, driver.ledger_days)
+
+    def save_to(self, driver):
+        """Copy the ledger onto `driver` (not saved)."""
+        driver.ledger_end_date = self.end_date
+        driver.ledger_days = [
+            [day.on_duty_minutes, day.leading_off_minutes, day.trailing_off_minutes] for day in self.days
+        ]
+
+    def record(self, on_date, duty_day):
+        """Add one day's duty. Days older than the window are ignored."""
+        if self.end_date is None or on_date > self.end_date:
+            shift = CYCLE_DAYS if self.end_date is None else min((on_date - self.end_date).days, CYCLE_DAYS)
+            self.days = self.days[shift:] + [DutyDay(*OFF_DAY) for _ in range(shift)]
+            self.end_date = on_date
+        index = CYCLE_DAYS - 1 - (self.end_date - on_date).days
+        if index >= 0:
+            self.days[index] = self.days[index].merge(duty_day)
+
+    def record_days(self, start_date, summaries):
+        """Add a trip's DaySummary objects, day 1 falling on `start_date`."""
+        for summary in summaries:
+            self.record(start_date + timedelta(days=summary.day - 1), DutyDay.from_summary(summary))
+
+    def next_start_date(self, today=None):
+        """First day a new trip can be logged on: `today`, or the day after
+        the last logged day if that is later."""
+        today = today or date.today()
+        if self.end_date is None or self.end_date < today:
+            return today
+        return self.end_date + timedelta(days=1)
+
+    def _day(self, on_date):
+        if self.end_date is None:
+            return DutyDay(*OFF_DAY)
+        index = CYCLE_DAYS - 1 - (self.end_date - on_date).days
+        if 0 <= index < CYCLE_DAYS and on_date <= self.end_date:
+            return self.days[index]
+        return DutyDay(*OFF_DAY)
+
+    def _walk(self, on_date):
+        """Return (on-duty minutes since the latest restart, date of that
+        restart) over the seven days before `on_date`."""
+        used = 0
+        restart = None
+        off_streak = 0
+        for offset in range(CYCLE_DAYS - 1, 0, -1):
+            day_date = on_date - timedelta(days=offset)
+            day = self._day(day_date)
+            if not day.on_duty_minutes:
+                off_streak += DAY_MINUTES
+                continue
+            if off_streak + day.leading_off_minutes >= RESTART_MINUTES:
+                used, restart = 0, day_date
+            used += day.on_duty_minutes
+            off_streak = day.trailing_off_minutes
+        if off_streak >= RESTART_MINUTES:
+            return 0, on_date
+        return used, restart
+
+    def cycle_used_hours(self, on_date):
+        """Hours counting against the 70-hour cycle at the start of
+        `on_date`: on duty in the seven days before it, minus everything
+        before the latest 34-hour off-duty restart."""
+        return min(self._walk(on_date)[0] / MINUTES_PER_HOUR, MAX_CYCLE_HOURS)
+
+    def last_restart_date(self, on_date):
+        """Date the latest restart within the window ended on (the first day
+        back on duty, or `on_date` if the driver is off through it), or
+        None."""
+        return self._walk(on_date)[1]
+
+
+def rebuild_driver_ledger(driver_id):
+    """Recompute a driver's ledger from their persisted daily logs and save
+    it. Must run in a transaction; the driver row is locked."""
+    driver = Driver.objects.select_for_update().get(pk=driver_id)
+    ledger = CycleLedger()
+    latest = DailyLog.objects.filter(trip_id__driver=driver_id).aggregate(Max("date"))["date__max"]
+    if latest is not None:
+        for on_date, duty_day in _duty_days(driver_id, latest - timedelta(days=CYCLE_DAYS - 1)):
+            ledger.record(on_date, duty_day)
+    ledger.save_to(driver)
+    driver.save(update_fields=["ledger_end_date", "ledger_days"])
+    return ledger
+
+
+def rebuild_trip_driver_ledger(sender, instance, **kwargs):
+    """post_delete receiver for Trip: drop the deleted trip's days from its
+    driver's ledger."""
+    if instance.driver_id is not None:
+        with transaction.atomic():
+            rebuild_driver_ledger(instance.driver_id)
+
+
+def _duty_days(driver_id, since):
+    """Yield (date, DutyDay) for the driver's daily logs from `since` on.
+    On-duty time comes from the DailyLog totals; the segments only give the
+    off-duty edges."""
+    logs = list(
+        DailyLog.objects.filter(trip_id__driver=driver_id, date__gte=since)
+        .values_list("id", "date", "total_driving_hours", "total_on_duty_hour", "segments")
+    )
+    duty_segments = defaultdict(list)
+    for daily_log_id, start, end in (
+        LogSegment.objects.filter(daily_log__in=[log[0] for log in logs], status__in=DUTY_STATUSES)
+        .values_list("daily_log_id", "start_minute", "end_minute")
+    ):
+        duty_segments[daily_log_id].append(("ON_DUTY", start, end))
+
+    for daily_log_id, on_date, driving, on_duty, packed in logs:
+        if packed is not None:
+            segments = [(s["status"], s["start_minute"], s["end_minute"]) for s in decode_segments(packed)]
+        else:
+            segments = duty_segments[daily_log_id]
+        day = DutyDay.from_segments(segments)
+        day.on_duty_minutes = int((driving + on_duty).total_seconds() // 60)
+        yield on_date, day
@@ -0,0 +1,58 @@
+from datetime import date, timedelta
+import numpy as np
+from trip.services.cycle_ledger import CycleLedger
+from trip.services.hos_batch import evaluate_hos_batch
+from trip.services.hos_engine import MAX_CYCLE_HOURS
+
+
+def fleet_availability(distance_miles, drivers, start_date=None):
+    """Evaluate one load for many drivers with a single batched HOS run.
+
+    `drivers` are (id, name, ledger_end_date, ledger_days) tuples, as read
+    with `values_list` from Driver. Each driver starts on `start_date`
+    (default today) or, if their logs run past it, the day after their last
+    logged day, with the cycle hours their ledger shows for that day. The
+    whole fleet is then simulated at once by `evaluate_hos_batch`.
+
+    Returns one dict per driver, ranked: drivers who can complete the load
+    first, then by arrival date and by the cycle hours they would have left.
+    Like feasibility, the hours left count only driving against the cycle,
+    as the engine does.
+    """
+    start_date = start_date or date.today()
+    rows = []
+    cycle_used = []
+    for driver_id, name, ledger_end_date, ledger_days in drivers:
+        ledger = CycleLedger(ledger_end_date, ledger_days)
+        driver_start = ledger.next_start_date(start_date)
+        rows.append((driver_id, name, driver_start))
+        cycle_used.append(ledger.cycle_used_hours(driver_start))
+    if not rows:
+        return []
+
+    cycle_used = np.array(cycle_used)
+    outcome = evaluate_hos_batch(distance_miles, cycle_used)
+    cycle_left = MAX_CYCLE_HOURS - cycle_used - outcome["drive_hours"]
+
+    results = []
+    for index, (driver_id, name, driver_start) in enumerate(rows):
+        total_days = int(outcome["total_days"][index])
+        completed = bool(outcome["completed"][index])
+        results.append({
+            "driver": str(driver_id),
+            "name": name,
+            "start_date": driver_start,
+            "starts_on_time": driver_start == start_date,
+            "cycle_used_hours": float(cycle_used[index]),
+            "feasible": completed,
+            "total_days": total_days,
+            "arrival_date": driver_start + timedelta(days=max(total_days - 1, 0)) if completed else None,
+            "drive_hours": float(outcome["drive_hours"][index]),
+            "cycle_left_hours": max(float(cycle_left[index]), 0.0),
+        })
+    results.sort(key=lambda r: (
+        not r["feasible"],
+        r["arrival_date"] or date.max,
+        -r["cycle_left_hours"],
+    ))
+    return results
@@ -0,0 +1,115 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from trip.models import GeocodeCacheEntry
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 1024
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    """Normalize a free-form address so trivially different spellings
+    ("Chicago,  IL" / "chicago, il") share one cache entry."""
+    return _WHITESPACE_RE.sub(" ", query).strip().lower()
+
+
+class GeocodeCache:
+    """Two-level geocode cache: an in-process LRU in front of the
+    GeocodeCacheEntry table.
+
+    Entries older than `ttl_seconds` are treated as misses at both levels.
+    Lookups are counted in `hits` (memory or DB) and `misses`.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    @property
+    def hits(self):
+        return self.memory_hits + self.db_hits
+
+    def get(self, query):
+        """Return the cached {'lat', 'lon'} for `query`, or None."""
+        key = normalize_query(query)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, result = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return result
+                del self._entries[key]
+
+        cutoff = timezone.now() - timedelta(seconds=self.ttl_seconds)
+        row = (
+            GeocodeCacheEntry.objects
+            .filter(query=key, created_at__gt=cutoff)
+            .values("lat", "lon", "created_at")
+            .first()
+        )
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        result = {"lat": row["lat"], "lon": row["lon"]}
+        age = (timezone.now() - row["created_at"]).total_seconds()
+        with self._lock:
+            self.db_hits += 1
+            self._remember(key, result, now + self.ttl_seconds - age)
+        return result
+
+    def set(self, query, result):
+        """Store a geocoding result in the table and the in-process LRU."""
+        key = normalize_query(query)
+        lat, lon = float(result["lat"]), float(result["lon"])
+        GeocodeCacheEntry.objects.update_or_create(
+            query=key,
+            defaults={"lat": lat, "lon": lon, "created_at": timezone.now()},
+        )
+        with self._lock:
+            self._remember(key, {"lat": lat, "lon": lon}, time.monotonic() + self.ttl_seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self):
+        """Drop the in-process entries and reset the counters (the table is
+        left untouched)."""
+        with self._lock:
+            self._entries.clear()
+            self.memory_hits = self.db_hits = self.misses = 0
+
+    def _remember(self, key, result, expires_at):
+        self._entries[key] = (expires_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+geocode_cache = GeocodeCache(
+    max_entries=getattr(settings, "GEOCODE_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES),
+    ttl_seconds=getattr(settings, "GEOCODE_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS),
+)
@@ -0,0 +1,143 @@
+import math
+from bisect import bisect_left
+from functools import lru_cache
+import requests
+from django.conf import settings
+from trip.services.http_client import get_http_client
+from trip.services.instrumentation import timed
+
+EARTH_RADIUS_MILES = 3958.8
+# ~100 m; stops closer than this share a reverse-geocoded name
+REVERSE_GEOCODE_PRECISION = 3
+REVERSE_GEOCODE_STOPS = getattr(settings, "ROUTE_STOP_REVERSE_GEOCODE", False)
+NOMINATIM_REVERSE_URL = getattr(
+    settings, "NOMINATIM_REVERSE_URL", "https://nominatim.openstreetmap.org/reverse"
+)
+
+
+def decode_polyline(encoded, precision=5):
+    """Decode an encoded polyline (the ORS/Google format) into a list of
+    (lat, lon) tuples. Raises ValueError if `encoded` is malformed."""
+    points = []
+    index = lat = lon = 0
+    factor = 10 ** precision
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                if index >= length:
+                    raise ValueError("Truncated polyline")
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        points.append((lat / factor, lon / factor))
+    return points
+
+
+def haversine_miles(a, b):
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(h))
+
+
+class RouteIndex:
+    """Cumulative-distance index over a route polyline.
+
+    Built once per route in O(n); `locate` then maps a distance along the
+    route to a (lat, lon) in O(log n) by binary search and linear
+    interpolation between the two surrounding vertices.
+    """
+
+    def __init__(self, points):
+        if not points:
+            raise ValueError("Route geometry has no points")
+        self.points = points
+        self.cumulative = [0.0]
+        for previous, point in zip(points, points[1:]):
+            self.cumulative.append(self.cumulative[-1] + haversine_miles(previous, point))
+
+    @classmethod
+    def from_polyline(cls, encoded):
+        return cls(decode_polyline(encoded))
+
+    @property
+    def length_miles(self):
+        return self.cumulative[-1]
+
+    def locate(self, miles):
+        """Return the (lat, lon) `miles` along the polyline, clamped to its
+        ends."""
+        if miles <= 0 or len(self.points) == 1:
+            return self.points[0]
+        if miles >= self.length_miles:
+            return self.points[-1]
+        i = bisect_left(self.cumulative, miles)
+        start, end = self.cumulative[i - 1], self.cumulative[i]
+        fraction = (miles - start) / (end - start) if end > start else 0
+        (lat1, lon1), (lat2, lon2) = self.points[i - 1], self.points[i]
+        return lat1 + (lat2 - lat1) * fraction, lon1 + (lon2 - lon1) * fraction
+
+    def project(self, point):
+        """Return the distance along the polyline of the vertex nearest to
+        `point` (lat, lon)."""
+        nearest = min(range(len(self.points)), key=lambda i: haversine_miles(self.points[i], point))
+        return self.cumulative[nearest]
+
+
+def locate_stops(route_stops, geometry, route_miles, reverse_geocode=None):
+    """Set `lat`/`lon` on RouteStopDTOs from their `mile` along the route.
+
+    Stop mileages come from the HOS engine (driving time at constant speed)
+    and are scaled onto the polyline, whose haversine length differs
+    slightly from the routed distance `route_miles`. Non-driving stops
+    without a location name are reverse-geocoded when `reverse_geocode` (default
+    ROUTE_STOP_REVERSE_GEOCODE) is set. Stops are left as they are if the
+    geometry is missing or cannot be decoded.
+    """
+    if not geometry or not route_miles:
+        return
+    if reverse_geocode is None:
+        reverse_geocode = REVERSE_GEOCODE_STOPS
+    try:
+        index = RouteIndex.from_polyline(geometry)
+    except ValueError:
+        return
+    scale = index.length_miles / route_miles
+    for stop in route_stops:
+        if stop.mile is None:
+            continue
+        stop.lat, stop.lon = index.locate(stop.mile * scale)
+        if reverse_geocode and stop.location is None and stop.type != "DRIVING":
+            stop.location = reverse_geocode_name(stop.lat, stop.lon)
+
+
+def reverse_geocode_name(lat, lon):
+    """Return Nominatim's display name for a point, or None if the lookup
+    fails. Results are cached per ~100 m cell."""
+    try:
+        return _reverse_geocode(
+            round(lat, REVERSE_GEOCODE_PRECISION), round(lon, REVERSE_GEOCODE_PRECISION)
+        )
+    except (requests.RequestException, ValueError, KeyError):
+        return None
+
+
+@lru_cache(maxsize=getattr(settings, "GEOCODE_CACHE_MAX_ENTRIES", 1024))
+def _reverse_geocode(lat, lon):
+    params = {"lat": lat, "lon": lon, "format": "json", "zoom": 14}
+    headers = {"User-Agent": "DriveSheetBackend/1.0"}
+    with timed("nominatim"):
+        r = get_http_client().get("nominatim", NOMINATIM_REVERSE_URL, params=params, headers=headers)
+    r.raise_for_status()
+    return r.json()["display_name"][:255]
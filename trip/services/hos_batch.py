@@ -0,0 +1,92 @@
+import numpy as np
+from trip.services.hos_engine import (
+    MAX_DAILY_DRIVE_HOURS,
+    MAX_CYCLE_HOURS,
+    SPEED_MPH,
+    PICKUP_DROPOFF_MINUTES,
+    FUEL_INTERVAL_MILES,
+    FUEL_STOP_MINUTES,
+    BREAK_MINUTES,
+    BREAK_AFTER_MINUTES,
+    MINUTES_PER_HOUR,
+)
+
+
+def evaluate_hos_batch(distances, cycle_used_hours):
+    """Vectorized `HOSEngine.summarize()` over many trips.
+
+    `distances` and `cycle_used_hours` are broadcast against each other
+    (pass `d[:, None]` and `c[None, :]` for a full grid). Every trip is
+    stepped one day at a time in lockstep, with the same float arithmetic as
+    the engine, so results match `HOSEngine` exactly.
+
+    Returns a dict of arrays shaped like the broadcast inputs:
+    total_days, drive_hours, on_duty_hours (on duty, not driving),
+    fuel_stops, break_stops and completed (False when the 70-hour cycle ran
+    out before the distance was covered).
+    """
+    remaining, cycle_used = np.broadcast_arrays(
+        np.asarray(distances, dtype=float), np.asarray(cycle_used_hours, dtype=float)
+    )
+    remaining = remaining.astype(float)
+    cycle_left = MAX_CYCLE_HOURS - cycle_used
+    distance_since_fuel = np.zeros(remaining.shape)
+    days = np.zeros(remaining.shape, dtype=np.int64)
+    drive_minutes = np.zeros(remaining.shape, dtype=np.int64)
+    fuel_stops = np.zeros(remaining.shape, dtype=np.int64)
+    break_stops = np.zeros(remaining.shape, dtype=np.int64)
+
+    active = (remaining > 0) & (cycle_left > 0)
+    simulated = active.copy()
+    while active.any():
+        hours = np.minimum(
+            np.minimum(MAX_DAILY_DRIVE_HOURS, remaining / SPEED_MPH), cycle_left
+        )
+        hours = np.where(active, hours, 0.0)
+        minutes = (hours * MINUTES_PER_HOUR).astype(np.int64)
+
+        # a day drives up to two blocks split by the 8-hour break; fuel is
+        # checked before each block
+        needs_break = minutes > BREAK_AFTER_MINUTES
+        first_block = np.where(needs_break, BREAK_AFTER_MINUTES, minutes)
+        second_block = np.where(needs_break, minutes - BREAK_AFTER_MINUTES, 0)
+        for block in (first_block, second_block):
+            driving = block > 0
+            refuel = driving & (distance_since_fuel >= FUEL_INTERVAL_MILES)
+            fuel_stops += refuel
+            distance_since_fuel = np.where(refuel, 0.0, distance_since_fuel)
+            distance_since_fuel = np.where(
+                driving,
+                distance_since_fuel + (block / MINUTES_PER_HOUR) * SPEED_MPH,
+                distance_since_fuel,
+            )
+
+        break_stops += needs_break
+        drive_minutes += minutes
+        days += active
+        remaining = np.where(active, remaining - hours * SPEED_MPH, remaining)
+        cycle_left = np.where(active, cycle_left - hours, cycle_left)
+        active &= (remaining > 0) & (cycle_left > 0)
+
+    # pickup on day 1 and the dropoff on the following day
+    on_duty_minutes = (
+        simulated * 2 * PICKUP_DROPOFF_MINUTES
+        + fuel_stops * FUEL_STOP_MINUTES
+        + break_stops * BREAK_MINUTES
+    )
+    return {
+        "total_days": np.where(simulated, days + 1, 0),
+        "drive_hours": drive_minutes / MINUTES_PER_HOUR,
+        "on_duty_hours": on_duty_minutes / MINUTES_PER_HOUR,
+        "fuel_stops": fuel_stops,
+        "break_stops": break_stops,
+        "completed": remaining <= 0,
+    }
+
+
+def evaluate_hos_grid(distances, cycle_used_hours):
+    """Evaluate every (distance, cycle_used_hours) combination; result
+    arrays are shaped (len(distances), len(cycle_used_hours))."""
+    distances = np.asarray(distances, dtype=float)
+    cycle_used_hours = np.asarray(cycle_used_hours, dtype=float)
+    return evaluate_hos_batch(distances[:, None], cycle_used_hours[None, :])
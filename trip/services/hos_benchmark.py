@@ -0,0 +1,187 @@
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from trip.services.hos_engine import (
+    MAX_CYCLE_HOURS, START_OFF_DUTY_MINUTES, EngineCheckpoint, HOSEngine, LogSegmentDTO,
+)
+from trip.services.log_generator import generate_daily_logs
+from trip.services.persistence import TripPlan, persist_trips
+
+BENCHMARK_DIR = Path(__file__).resolve().parent.parent / "benchmarks"
+BASELINE_PATH = BENCHMARK_DIR / "hos_baseline.json"
+GOLDEN_PATH = BENCHMARK_DIR / "hos_golden.json"
+
+BENCHMARK_DISTANCES = (100, 1_000, 10_000, 100_000)
+BENCHMARK_CYCLE_USED_HOURS = 0
+
+# (distance miles, cycle used hours) pairs whose schedules are pinned in
+# GOLDEN_PATH: day boundaries, the 8-hour break, fuel stops and the 70-hour
+# cycle running out
+GOLDEN_CASES = [
+    (distance, cycle_used)
+    for distance in (0, 1, 100, 440, 460, 605, 1000, 1100, 1500, 2400, 3850, 10_000, 100_000)
+    for cycle_used in (0, 12.5, 40, 69.5, 70)
+]
+
+# metrics where any increase is a regression rather than a percentage
+EXACT_METRICS = ("persist_queries",)
+# smallest increase that counts as a regression, by metric suffix, so
+# sub-millisecond timings do not fail on noise
+MIN_MARGINS = {"_ms": 0.5, "_kib": 4.0}
+
+
+def golden_schedule(distance, cycle_used):
+    """Simulate one golden case as plain lists, as stored in GOLDEN_PATH."""
+    stops, segments = HOSEngine(distance, cycle_used).simulate()
+    return {
+        "distance": distance,
+        "cycle_used_hours": cycle_used,
+        "route_stops": [[s.type, s.day, s.start_minute, s.end_minute] for s in stops],
+        "log_segments": [[s.status, s.day, s.start_minute, s.end_minute] for s in segments],
+    }
+
+
+def load_golden():
+    with open(GOLDEN_PATH) as f:
+        return json.load(f)
+
+
+def write_golden():
+    cases = [golden_schedule(distance, cycle_used) for distance, cycle_used in GOLDEN_CASES]
+    with open(GOLDEN_PATH, "w") as f:
+        json.dump(cases, f, separators=(",", ":"))
+        f.write("\n")
+    return len(cases)
+
+
+def simulate_haul(distance, cycle_used=BENCHMARK_CYCLE_USED_HOURS):
+    """Simulate `distance` miles for the benchmark.
+
+    One 70-hour cycle covers about 3,850 miles, after which HOSEngine
+    stops. Longer hauls instead take a restart where the cycle runs out:
+    the driver is off through the next day (well over 34 hours) and a
+    resumed engine goes on with a fresh cycle, so the work keeps growing
+    with distance. Returns (route stops, log segments) like `simulate()`.
+    """
+    engine = HOSEngine(distance, cycle_used)
+    stops, segments = engine.simulate()
+    while engine.remaining_miles > 0:
+        # the engine's dropoff where the cycle ran out
+        stops.pop()
+        segments.pop()
+        day = engine.day + 1
+        checkpoint = EngineCheckpoint(
+            remaining_miles=engine.remaining_miles,
+            cycle_left_hours=MAX_CYCLE_HOURS,
+            distance_since_fuel=engine.distance_since_fuel,
+            day=day,
+            minute=START_OFF_DUTY_MINUTES,
+            pickup_done=True,
+        )
+        engine = HOSEngine.resume(checkpoint, distance)
+        more_stops, more_segments = engine.simulate()
+        stops.extend(more_stops)
+        segments.append(LogSegmentDTO("OFF", day, 0, START_OFF_DUTY_MINUTES))
+        segments.extend(more_segments)
+    return stops, segments
+
+
+def _median_time_ms(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def _peak_kib(func):
+    tracemalloc.start()
+    try:
+        func()
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+
+def measure(distance, repeat=5):
+    """Median time, peak allocations and query count for one trip length
+    (see `simulate_haul`).
+
+    Allocations are traced for the simulation and the daily log generation;
+    persistence is only timed, as the database driver's allocations would
+    drown the trip's own. The persistence step runs inside a transaction
+    that is rolled back, so nothing is left in the database.
+    """
+    def simulate():
+        return simulate_haul(distance)
+
+    def daily_logs():
+        return generate_daily_logs(segments)
+
+    stops, segments = simulate()
+
+    def persist():
+        route_stops, log_segments = simulate()
+        plan = TripPlan(
+            {
+                "current_location": "benchmark",
+                "pickup_location": "benchmark",
+                "drop_location": "benchmark",
+                "cycle_used_hours": BENCHMARK_CYCLE_USED_HOURS,
+                "total_distance_miles": distance,
+                "total_duration_hours": distance / 55,
+                "route_geometry": "",
+            },
+            route_stops,
+            log_segments,
+        )
+        with transaction.atomic():
+            persist_trips([plan])
+            transaction.set_rollback(True)
+
+    with CaptureQueriesContext(connection) as queries:
+        persist()
+
+    return {
+        "simulate_ms": _median_time_ms(simulate, repeat),
+        "simulate_peak_kib": _peak_kib(simulate),
+        "daily_logs_ms": _median_time_ms(daily_logs, repeat),
+        "daily_logs_peak_kib": _peak_kib(daily_logs),
+        "persist_ms": _median_time_ms(persist, repeat),
+        "persist_queries": len(queries),
+        "segments": len(segments),
+        "route_stops": len(stops),
+    }
+
+
+def find_regressions(results, baseline, threshold):
+    """Compare `measure()` results keyed by distance against a baseline.
+
+    Timings and allocations regress when they grow by more than `threshold`
+    (0.5 = 50%) and by at least their MIN_MARGINS; query counts regress on
+    any increase. Returns a list of human-readable messages.
+    """
+    regressions = []
+    for distance, metrics in results.items():
+        base = baseline.get(str(distance))
+        if base is None:
+            continue
+        for name, value in metrics.items():
+            if name not in base or name in ("segments", "route_stops"):
+                continue
+            if name in EXACT_METRICS:
+                limit = base[name]
+            else:
+                margin = next((m for suffix, m in MIN_MARGINS.items() if name.endswith(suffix)), 0)
+                limit = base[name] + max(base[name] * threshold, margin)
+            if value > limit:
+                regressions.append(
+                    f"{distance} mi {name}: {value:.3f} (baseline {base[name]:.3f})"
+                )
+    return regressions
@@ -1,4 +1,6 @@
-from dataclasses import dataclass
+import math
+from collections import Counter
+from dataclasses import dataclass, field
 
 # Constants
 MAX_DAILY_DRIVE_HOURS = 11
@@ -7,20 +9,57 @@ SPEED_MPH = 55
 BREAK_AFTER_HOURS = 8
 PICKUP_DROPOFF_MINUTES = 60
 FUEL_INTERVAL_MILES = 1000
+FUEL_STOP_MINUTES = 30
+BREAK_MINUTES = 30
+START_OFF_DUTY_MINUTES = 60
 
 MINUTES_PER_HOUR = 60
 DAY_MINUTES = 1440
 
+BREAK_AFTER_MINUTES = int(BREAK_AFTER_HOURS * MINUTES_PER_HOUR)
 
-@dataclass
+
+@dataclass(slots=True)
 class RouteStopDTO:
     type: str
     day: int
     start_minute: int
     end_minute: int
+    location: str | None = None
+    # miles from the start of the route where the stop begins; lat/lon are
+    # filled in from the route geometry (see geometry.locate_stops)
+    mile: float | None = None
+    lat: float | None = None
+    lon: float | None = None
 
 
-@dataclass
+@dataclass(slots=True)
+class Leg:
+    """One leg of a trip: `distance_miles` of driving that ends with a
+    `stop_type` (PICKUP or DROPOFF) stop at `location`."""
+    distance_miles: float
+    stop_type: str
+    location: str | None = None
+
+
+@dataclass(slots=True)
+class EngineCheckpoint:
+    """Engine state at `minute` of `day` of a trip in progress, to resume a
+    simulation from (see `HOSEngine.resume`)."""
+    remaining_miles: float
+    cycle_left_hours: float
+    distance_since_fuel: float
+    day: int
+    minute: int
+    # driving already logged on `day`, and since the last 30-minute interruption
+    driven_minutes: int = 0
+    since_break_minutes: int = 0
+    # the pickup's on-duty hour is already logged (even if the driver has
+    # not moved past the pickup yet)
+    pickup_done: bool = False
+
+
+@dataclass(slots=True)
 class LogSegmentDTO:
     status: str
     day: int
@@ -28,19 +67,132 @@ class LogSegmentDTO:
     end_minute: int
 
 
+@dataclass(slots=True)
+class DaySummary:
+    """One day's log segments, in order, with running duty totals."""
+    day: int
+    driving_minutes: int = 0
+    on_duty_minutes: int = 0
+    off_duty_minutes: int = 0
+    segments: list = field(default_factory=list)
+
+    def add(self, segment):
+        minutes = segment.end_minute - segment.start_minute
+        if segment.status == "DRIVING":
+            self.driving_minutes += minutes
+        elif segment.status == "ON_DUTY":
+            self.on_duty_minutes += minutes
+        else:
+            self.off_duty_minutes += minutes
+        self.segments.append(segment)
+
+
+@dataclass
+class HOSSummary:
+    total_days: int
+    drive_minutes: int
+    on_duty_minutes: int
+    stop_counts: dict = field(default_factory=dict)
+
+
 class HOSEngine:
-    def __init__(self, total_distance_miles: float, cycle_used_hours: float):
+    """Hours-of-service trip simulator.
+
+    Each day is planned from its regulatory events rather than stepped
+    minute by minute: the day's drive allowance (11-hour limit, remaining
+    miles, 70-hour cycle) is split at the 8-hour break, and a fuel stop is
+    inserted before a drive block once 1,000 miles have passed since the
+    last one. Days always fit well inside 24 hours (at most 14.5 on-duty
+    hours plus one hour per intermediate stop), so no event ever spills into
+    the next day.
+
+    `legs` describe a multi-stop trip (e.g. current -> pickup -> drops) and
+    must add up to `total_distance_miles`. Without them the trip is a single
+    pickup -> dropoff leg. A zero-mile first leg puts its stop right after
+    the day-1 off-duty hour and the last leg's stop opens the day after the
+    last drive, as for single-leg trips; stops in between are made when the
+    driver reaches them, and they reset the 8-hour break clock. Stops not
+    reached before the 70-hour cycle runs out are left out.
+
+    `resume` starts from an EngineCheckpoint of a trip in progress instead
+    of from the start of day 1.
+    """
+
+    def __init__(self, total_distance_miles: float, cycle_used_hours: float, legs=None):
         self.total_distance_miles = total_distance_miles
         self.remaining_miles = total_distance_miles
         self.cycle_left_hours = MAX_CYCLE_HOURS - cycle_used_hours
         self.distance_since_fuel = 0
         self.day = 1
         self._pickup_added = False
+        # miles from the start where the next stop is made
+        self._position = 0
+
+        if legs is None:
+            legs = [Leg(0, "PICKUP"), Leg(total_distance_miles, "DROPOFF")]
+        self._first_leg = legs[0] if legs[0].distance_miles == 0 else None
+        self._last_leg = legs[-1]
+        # stops made on the road, with their distance from the start
+        self._road_stops = []
+        position = 0
+        for leg in legs[:-1]:
+            position += leg.distance_miles
+            if leg is not self._first_leg:
+                self._road_stops.append((position, leg))
+        self._next_road_stop = 0
+        # summary-only runs keep the counters below but skip the DTOs
+        self._materialize = True
+        self._resume = None
 
         self.route_stops: list[RouteStopDTO] = []
         self.log_segments: list[LogSegmentDTO] = []
+        # the same segments grouped by day, filled in as they are emitted
+        self.days: list[DaySummary] = []
+
+        self.segment_count = 0
+        self.drive_minutes = 0
+        self.on_duty_minutes = 0
+        self.stop_counts = Counter()
+
+    @classmethod
+    def resume(cls, checkpoint, total_distance_miles, legs=None):
+        """An engine that continues a trip from `checkpoint`. Its schedule
+        starts at the checkpoint minute of the checkpoint day; road stops
+        behind the driver's position count as made, and so does the pickup
+        once the driver is past it or `checkpoint.pickup_done`."""
+        engine = cls(total_distance_miles, MAX_CYCLE_HOURS - checkpoint.cycle_left_hours, legs)
+        engine.remaining_miles = checkpoint.remaining_miles
+        engine.distance_since_fuel = checkpoint.distance_since_fuel
+        engine.day = checkpoint.day
+        done = total_distance_miles - checkpoint.remaining_miles
+        engine._next_road_stop = sum(1 for position, _ in engine._road_stops if position < done - 1e-6)
+        if engine._first_leg is not None:
+            engine._pickup_added = checkpoint.pickup_done or done > 1e-6
+        else:
+            # the pickup is the first road stop
+            engine._pickup_added = True
+            if checkpoint.pickup_done and engine._road_stops:
+                engine._next_road_stop = max(engine._next_road_stop, 1)
+        engine._resume = checkpoint
+        return engine
 
     def simulate(self):
+        self._run()
+        return self.route_stops, self.log_segments
+
+    def summarize(self) -> HOSSummary:
+        """Run the same schedule as `simulate()` but only return its totals,
+        without allocating any stop or segment objects."""
+        self._materialize = False
+        self._run()
+        return HOSSummary(
+            total_days=self.day if self.segment_count else 0,
+            drive_minutes=self.drive_minutes,
+            on_duty_minutes=self.on_duty_minutes,
+            stop_counts=dict(self.stop_counts),
+        )
+
+    def _run(self):
         # Pickup will be added after the initial OFF block on day 1 inside
         # `_simulate_day` to avoid overlap with the OFF segment.
         while self.remaining_miles > 0 and self.cycle_left_hours > 0:
@@ -50,111 +202,162 @@ class HOSEngine:
             # same day as the last driving/log segments when appropriate.
             if self.remaining_miles > 0 and self.cycle_left_hours > 0:
                 self.day += 1
-        
-        # Add dropoff stop at end
-        last_segment = self.log_segments[-1] if self.log_segments else None
-        if last_segment:
-            dropoff_start = last_segment.end_minute
-            if dropoff_start + PICKUP_DROPOFF_MINUTES <= DAY_MINUTES:
-                self._add_on_duty("DROPOFF", dropoff_start, dropoff_start + PICKUP_DROPOFF_MINUTES)
-            else:
-                # Dropoff on next day
-                self.day += 1
-                self._add_on_duty("DROPOFF", 0, PICKUP_DROPOFF_MINUTES)
 
-        return self.route_stops, self.log_segments
+        # Add dropoff stop at end. Every simulated day closes with a sleeper
+        # block running to midnight, so the dropoff opens the next day.
+        if self.segment_count:
+            self.day += 1
+            self._position = self.total_distance_miles - max(self.remaining_miles, 0)
+            self._add_on_duty(
+                self._last_leg.stop_type, 0, PICKUP_DROPOFF_MINUTES, self._last_leg.location
+            )
 
     def _simulate_day(self):
-        current_minute = 0
+        resume, self._resume = self._resume, None
+        drive_limit_hours = MAX_DAILY_DRIVE_HOURS
+        if resume is not None:
+            # what is left of the 11 hours, as far as it fits before midnight
+            # with room for breaks, fuel and the remaining road stops
+            slack = (
+                2 * BREAK_MINUTES + FUEL_STOP_MINUTES
+                + PICKUP_DROPOFF_MINUTES * (
+                    len(self._road_stops) - self._next_road_stop + (not self._pickup_added)
+                )
+            )
+            drive_limit_hours = max(min(
+                MAX_DAILY_DRIVE_HOURS - resume.driven_minutes / MINUTES_PER_HOUR,
+                (DAY_MINUTES - resume.minute - slack) / MINUTES_PER_HOUR,
+            ), 0)
         driving_hours_today = min(
-            MAX_DAILY_DRIVE_HOURS,
+            drive_limit_hours,
             self.remaining_miles / SPEED_MPH,
             self.cycle_left_hours
         )
-
         driving_minutes_today = int(driving_hours_today * MINUTES_PER_HOUR)
+        day_start_position = self.total_distance_miles - self.remaining_miles
+        day_end_position = day_start_position + driving_hours_today * SPEED_MPH
+
+        def position(driven):
+            if driven >= driving_minutes_today:
+                return day_end_position
+            return day_start_position + driven / MINUTES_PER_HOUR * SPEED_MPH
 
-        # OFF duty before start (cap to day end)
-        off_end = min(current_minute + 60, DAY_MINUTES)
-        self._add_log("OFF", current_minute, off_end)
-        current_minute = off_end
+        # OFF duty before start; a resumed day goes on from the checkpoint
+        if resume is None:
+            self._add_log("OFF", 0, START_OFF_DUTY_MINUTES)
+            current_minute = START_OFF_DUTY_MINUTES
+        else:
+            current_minute = resume.minute
+        self._position = day_start_position
 
-        # Add pickup on day 1 after OFF (only once)
-        if self.day == 1 and not self._pickup_added and current_minute < DAY_MINUTES:
-            pickup_end = min(current_minute + PICKUP_DROPOFF_MINUTES, DAY_MINUTES)
-            self._add_on_duty("PICKUP", current_minute, pickup_end)
-            current_minute = pickup_end
+        # Add pickup on day 1 after OFF, or where a resumed day starts (only once)
+        if not self._pickup_added:
+            if self._first_leg is not None:
+                pickup_end = current_minute + PICKUP_DROPOFF_MINUTES
+                self._add_on_duty(
+                    self._first_leg.stop_type, current_minute, pickup_end, self._first_leg.location
+                )
+                current_minute = pickup_end
             self._pickup_added = True
 
-        # Driving block(s) with fuel stops
-        remaining_drive_minutes = driving_minutes_today
-        
-        while remaining_drive_minutes > 0 and current_minute < DAY_MINUTES:
-            # Check if we need a fuel stop — only add if it fits in the day
+        # Driving blocks run until the next road stop or 8 hours since the
+        # last 30-minute interruption, whichever is first; a 30-minute break
+        # follows an 8-hour block when there is more to drive today. Fuel is
+        # checked before each block.
+        driven = 0
+        since_break = 0 if resume is None else resume.since_break_minutes
+        if since_break >= BREAK_AFTER_MINUTES and driving_minutes_today:
+            break_end = current_minute + BREAK_MINUTES
+            self._add_on_duty("BREAK", current_minute, break_end)
+            current_minute = break_end
+            since_break = 0
+        while driven < driving_minutes_today:
+            block = min(driving_minutes_today - driven, BREAK_AFTER_MINUTES - since_break)
+            if self._next_road_stop < len(self._road_stops):
+                stop_position = self._road_stops[self._next_road_stop][0]
+                to_stop = (stop_position - position(driven)) / SPEED_MPH * MINUTES_PER_HOUR
+                block = min(block, max(math.ceil(to_stop), 1))
+
             if self.distance_since_fuel >= FUEL_INTERVAL_MILES:
-                if current_minute + 30 > DAY_MINUTES:
-                    # postpone fuel to next day
-                    break
-                fuel_end = current_minute + 30
+                fuel_end = current_minute + FUEL_STOP_MINUTES
                 self._add_on_duty("FUEL", current_minute, fuel_end)
                 current_minute = fuel_end
                 self.distance_since_fuel = 0
 
-            # Drive until break is needed or day ends, capping to day end
-            if remaining_drive_minutes > int(BREAK_AFTER_HOURS * MINUTES_PER_HOUR):
-                first_drive = int(BREAK_AFTER_HOURS * MINUTES_PER_HOUR)
-                drive_minutes = min(first_drive, DAY_MINUTES - current_minute, remaining_drive_minutes)
-                if drive_minutes <= 0:
-                    break
-                self._add_drive(current_minute, current_minute + drive_minutes)
-                miles_this_segment = (drive_minutes / MINUTES_PER_HOUR) * SPEED_MPH
-                self.distance_since_fuel += miles_this_segment
-                current_minute += drive_minutes
-                remaining_drive_minutes -= drive_minutes
-
-                # Break (cap to day)
-                if current_minute < DAY_MINUTES:
-                    break_end = min(current_minute + 30, DAY_MINUTES)
-                    self._add_on_duty("BREAK", current_minute, break_end)
-                    current_minute = break_end
-            else:
-                drive_minutes = min(remaining_drive_minutes, DAY_MINUTES - current_minute)
-                if drive_minutes <= 0:
-                    break
-                self._add_drive(current_minute, current_minute + drive_minutes)
-                miles_this_segment = (drive_minutes / MINUTES_PER_HOUR) * SPEED_MPH
-                self.distance_since_fuel += miles_this_segment
-                current_minute += drive_minutes
-                remaining_drive_minutes -= drive_minutes
+            self._add_drive(current_minute, current_minute + block)
+            miles_this_segment = (block / MINUTES_PER_HOUR) * SPEED_MPH
+            self.distance_since_fuel += miles_this_segment
+            current_minute += block
+            driven += block
+            since_break += block
+            self._position = position(driven)
+
+            if self._add_road_stops(current_minute, position(driven)):
+                current_minute = self._road_stop_end
+                since_break = 0
+            elif since_break >= BREAK_AFTER_MINUTES and driven < driving_minutes_today:
+                break_end = current_minute + BREAK_MINUTES
+                self._add_on_duty("BREAK", current_minute, break_end)
+                current_minute = break_end
+                since_break = 0
 
         # End of day sleeper
-        if current_minute < DAY_MINUTES:
-            self._add_log("SLEEPER", current_minute, DAY_MINUTES)
+        self._add_log("SLEEPER", current_minute, DAY_MINUTES)
 
         # Update counters
         miles_driven = driving_hours_today * SPEED_MPH
         self.remaining_miles -= miles_driven
         self.cycle_left_hours -= driving_hours_today
 
+    def _add_road_stops(self, minute, position):
+        """Make every road stop at or before `position`, starting at
+        `minute`. Returns whether any was made; the minute after the last one
+        is left in `_road_stop_end`."""
+        made = False
+        while (
+            self._next_road_stop < len(self._road_stops)
+            and self._road_stops[self._next_road_stop][0] <= position + 1e-6
+        ):
+            self._position, leg = self._road_stops[self._next_road_stop]
+            self._add_on_duty(leg.stop_type, minute, minute + PICKUP_DROPOFF_MINUTES, leg.location)
+            minute += PICKUP_DROPOFF_MINUTES
+            self._next_road_stop += 1
+            made = True
+        self._road_stop_end = minute
+        return made
+
     # -------- helpers --------
 
     def _add_drive(self, start, end):
+        self.segment_count += 1
+        self.drive_minutes += end - start
+        self.stop_counts["DRIVING"] += 1
+        if not self._materialize:
+            return
         self.route_stops.append(
-            RouteStopDTO("DRIVING", self.day, start, end)
-        )
-        self.log_segments.append(
-            LogSegmentDTO("DRIVING", self.day, start, end)
+            RouteStopDTO("DRIVING", self.day, start, end, mile=self._position)
         )
+        self._add_segment(LogSegmentDTO("DRIVING", self.day, start, end))
 
-    def _add_on_duty(self, stop_type, start, end):
+    def _add_on_duty(self, stop_type, start, end, location=None):
+        self.segment_count += 1
+        self.on_duty_minutes += end - start
+        self.stop_counts[stop_type] += 1
+        if not self._materialize:
+            return
         self.route_stops.append(
-            RouteStopDTO(stop_type, self.day, start, end)
-        )
-        self.log_segments.append(
-            LogSegmentDTO("ON_DUTY", self.day, start, end)
+            RouteStopDTO(stop_type, self.day, start, end, location, self._position)
         )
+        self._add_segment(LogSegmentDTO("ON_DUTY", self.day, start, end))
 
     def _add_log(self, status, start, end):
-        self.log_segments.append(
-            LogSegmentDTO(status, self.day, start, end)
-        )
+        self.segment_count += 1
+        if not self._materialize:
+            return
+        self._add_segment(LogSegmentDTO(status, self.day, start, end))
+
+    def _add_segment(self, segment):
+        self.log_segments.append(segment)
+        if not self.days or self.days[-1].day != segment.day:
+            self.days.append(DaySummary(segment.day))
+        self.days[-1].add(segment)
@@ -0,0 +1,233 @@
+import asyncio
+import threading
+import time
+import weakref
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts in seconds per upstream endpoint
+DEFAULT_TIMEOUTS = {
+    "nominatim": (3.05, 10),
+    "ors": (3.05, 30),
+}
+DEFAULT_TIMEOUT = (3.05, 15)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of calling an endpoint whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Stop calling an endpoint after `failure_threshold` consecutive
+    failures, then let a single trial call through once `reset_timeout`
+    seconds have passed."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "half-open":
+                # re-arm so concurrent callers wait for this trial's outcome
+                self.opened_at = time.monotonic()
+            return state != "open"
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                # a failed half-open trial re-opens the circuit
+                self.opened_at = time.monotonic()
+
+
+class _EndpointPolicy:
+    """Per-endpoint timeouts and circuit breakers shared by the sync and
+    async clients."""
+
+    def __init__(self, timeouts=None, failure_threshold=5, reset_timeout=30):
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._breakers_lock = threading.Lock()
+
+    def breaker(self, endpoint):
+        with self._breakers_lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(
+                    self.failure_threshold, self.reset_timeout
+                )
+            return self._breakers[endpoint]
+
+    def _check_breaker(self, endpoint):
+        breaker = self.breaker(endpoint)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for '{endpoint}'")
+        return breaker
+
+
+class HttpClient(_EndpointPolicy):
+    """Shared `requests.Session` for the external routing/geocoding APIs.
+
+    Connections are pooled and kept alive, every call gets the timeout of
+    its endpoint, 429/5xx responses and connection errors are retried with
+    exponential backoff, and each endpoint has its own circuit breaker.
+    """
+
+    def __init__(self, timeouts=None, retries=3, backoff_factor=0.5,
+                 pool_maxsize=10, failure_threshold=5, reset_timeout=30):
+        super().__init__(timeouts, failure_threshold, reset_timeout)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["GET", "POST"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            max_retries=retry,
+            pool_connections=len(self.timeouts),
+            pool_maxsize=pool_maxsize,
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method, endpoint, url, **kwargs):
+        breaker = self._check_breaker(endpoint)
+
+        kwargs.setdefault("timeout", self.timeouts.get(endpoint, DEFAULT_TIMEOUT))
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            breaker.record_failure()
+            raise
+
+        if response.status_code in RETRY_STATUSES:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    def get(self, endpoint, url, **kwargs):
+        return self.request("GET", endpoint, url, **kwargs)
+
+    def post(self, endpoint, url, **kwargs):
+        return self.request("POST", endpoint, url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncHttpClient(_EndpointPolicy):
+    """`httpx.AsyncClient` counterpart of HttpClient for the async views,
+    with the same pooling, timeouts, retry and circuit breaker behaviour.
+
+    An httpx client is bound to the event loop it is used on; use
+    `get_async_http_client()` to get the one for the running loop.
+    """
+
+    # the client's single httpx connection pool serves every coroutine on
+    # its event loop, so it needs room for all in-flight calls
+    def __init__(self, timeouts=None, retries=3, backoff_factor=0.5,
+                 pool_maxsize=100, failure_threshold=5, reset_timeout=30):
+        super().__init__(timeouts, failure_threshold, reset_timeout)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize
+            )
+        )
+
+    async def request(self, method, endpoint, url, **kwargs):
+        breaker = self._check_breaker(endpoint)
+
+        connect, read = self.timeouts.get(endpoint, DEFAULT_TIMEOUT)
+        kwargs.setdefault("timeout", httpx.Timeout(read, connect=connect))
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError:
+                if attempt == self.retries:
+                    breaker.record_failure()
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    break
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+
+        if response.status_code in RETRY_STATUSES:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    async def get(self, endpoint, url, **kwargs):
+        return await self.request("GET", endpoint, url, **kwargs)
+
+    async def post(self, endpoint, url, **kwargs):
+        return await self.request("POST", endpoint, url, **kwargs)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Return the process-wide client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient(**getattr(settings, "ROUTE_SERVICE_HTTP_CLIENT", {}))
+        return _client
+
+
+def set_http_client(client):
+    """Replace the process-wide client (e.g. with one pointed at a local
+    fake server in tests). Returns the previous client."""
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+        return previous
+
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_http_client():
+    """Return the async client for the running event loop, creating it on
+    first use."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncHttpClient(**getattr(settings, "ROUTE_SERVICE_HTTP_CLIENT", {}))
+        _async_clients[loop] = client
+    return client
@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Lightweight per-request and per-process instrumentation.
+#
+# Code paths report phase durations with `timed(phase)` / `record(phase,
+# seconds)` and discrete events (cache hits, misses) with `count(event)`.
+# Everything goes into the process-wide `metrics` registry, served as
+# Prometheus text on /metrics; while a request is being handled by
+# RequestTimingMiddleware it is also collected on that request's
+# RequestTimings and returned in its Server-Timing header.
+
+_current_timings = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Phase durations and event counts for one request.
+
+    Phases may be recorded from worker threads (e.g. concurrent geocoding),
+    so updates are locked.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = defaultdict(lambda: [0.0, 0])
+        self.events = Counter()
+
+    def add(self, phase, seconds):
+        with self._lock:
+            entry = self.phases[phase]
+            entry[0] += seconds
+            entry[1] += 1
+
+    def increment(self, event, n=1):
+        with self._lock:
+            self.events[event] += n
+
+    def server_timing(self, total_seconds=None):
+        """Render a Server-Timing header value; each phase's `desc` is its
+        call count."""
+        with self._lock:
+            parts = [
+                f'{phase};desc="{count} calls";dur={seconds * 1000:.1f}'
+                for phase, (seconds, count) in self.phases.items()
+            ]
+            parts.extend(f'{event};desc="{n}"' for event, n in self.events.items())
+        if total_seconds is not None:
+            parts.append(f"total;dur={total_seconds * 1000:.1f}")
+        return ", ".join(parts)
+
+
+class MetricsRegistry:
+    """In-process counters rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = defaultdict(lambda: [0.0, 0])
+        self.events = Counter()
+        self.requests = defaultdict(lambda: [0.0, 0])
+
+    def observe(self, phase, seconds):
+        with self._lock:
+            entry = self.phases[phase]
+            entry[0] += seconds
+            entry[1] += 1
+
+    def increment(self, event, n=1):
+        with self._lock:
+            self.events[event] += n
+
+    def observe_request(self, view, status_code, seconds):
+        with self._lock:
+            entry = self.requests[(view, f"{status_code // 100}xx")]
+            entry[0] += seconds
+            entry[1] += 1
+
+    def clear(self):
+        with self._lock:
+            self.phases.clear()
+            self.events.clear()
+            self.requests.clear()
+
+    def render(self):
+        with self._lock:
+            lines = [
+                "# HELP drivesheet_requests_total Requests handled, by view and status class.",
+                "# TYPE drivesheet_requests_total counter",
+            ]
+            lines += [
+                f'drivesheet_requests_total{{view="{view}",status="{status}"}} {count}'
+                for (view, status), (_seconds, count) in sorted(self.requests.items())
+            ]
+            lines += [
+                "# HELP drivesheet_request_seconds_total Time spent handling requests.",
+                "# TYPE drivesheet_request_seconds_total counter",
+            ]
+            lines += [
+                f'drivesheet_request_seconds_total{{view="{view}",status="{status}"}} {seconds:.6f}'
+                for (view, status), (seconds, _count) in sorted(self.requests.items())
+            ]
+            lines += [
+                "# HELP drivesheet_phase_seconds Time spent per phase (external calls, HOS, persistence, SQL).",
+                "# TYPE drivesheet_phase_seconds summary",
+            ]
+            for phase, (seconds, count) in sorted(self.phases.items()):
+                lines.append(f'drivesheet_phase_seconds_sum{{phase="{phase}"}} {seconds:.6f}')
+                lines.append(f'drivesheet_phase_seconds_count{{phase="{phase}"}} {count}')
+            lines += [
+                "# HELP drivesheet_events_total Cache hits, misses and other counted events.",
+                "# TYPE drivesheet_events_total counter",
+            ]
+            lines += [
+                f'drivesheet_events_total{{event="{event}"}} {n}'
+                for event, n in sorted(self.events.items())
+            ]
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def start_request():
+    """Begin collecting timings for the current request; returns the
+    RequestTimings and a token for `end_request`."""
+    timings = RequestTimings()
+    return timings, _current_timings.set(timings)
+
+
+def end_request(token):
+    _current_timings.reset(token)
+
+
+def current_timings():
+    return _current_timings.get()
+
+
+def record(phase, seconds):
+    metrics.observe(phase, seconds)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+def count(event, n=1):
+    metrics.increment(event, n)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.increment(event, n)
+
+
+@contextmanager
+def timed(phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - start)
+
+
+def _sql_timer(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record("db", time.perf_counter() - start)
+
+
+def instrument_connection(connection, **kwargs):
+    """`connection_created` receiver: time every query on the connection."""
+    if _sql_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_sql_timer)
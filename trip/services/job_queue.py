@@ -0,0 +1,117 @@
+import logging
+from datetime import timedelta
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from trip.models import TripJob
+from trip.services.trip_planner import plan_trip
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("SUCCEEDED", "FAILED")
+# transient upstream failures are retried, bad input is not
+MAX_ATTEMPTS = getattr(settings, "TRIP_JOB_MAX_ATTEMPTS", 3)
+# RUNNING jobs older than this are assumed to belong to a dead worker
+STALE_AFTER_SECONDS = getattr(settings, "TRIP_JOB_STALE_SECONDS", 600)
+# a failed attempt waits this long before the retry, doubling each time
+RETRY_BACKOFF_SECONDS = getattr(settings, "TRIP_JOB_RETRY_BACKOFF_SECONDS", 30)
+
+
+def enqueue_trip_job(data):
+    """Queue validated trip `data` for background planning."""
+    payload = dict(data)
+    if payload.get("cycle_used_hours") is not None:
+        payload["cycle_used_hours"] = float(payload["cycle_used_hours"])
+    if payload.get("driver") is not None:
+        payload["driver"] = str(payload["driver"].pk)
+    return TripJob.objects.create(payload=payload)
+
+
+def _requeue_stale_jobs():
+    cutoff = timezone.now() - timedelta(seconds=STALE_AFTER_SECONDS)
+    TripJob.objects.filter(status="RUNNING", started_at__lt=cutoff).update(status="PENDING")
+
+
+def claim_next_job():
+    """Atomically move the oldest PENDING job that is due (see `not_before`)
+    to RUNNING and return it, or return None when no job is due.
+
+    Candidates are read with SKIP LOCKED where the database supports it, and
+    the claim itself is a conditional UPDATE, so concurrent workers never
+    run the same job.
+    """
+    _requeue_stale_jobs()
+    while True:
+        with transaction.atomic():
+            job = (
+                TripJob.objects.select_for_update(skip_locked=True)
+                .filter(status="PENDING")
+                .filter(Q(not_before__isnull=True) | Q(not_before__lte=timezone.now()))
+                .order_by("created_at")
+                .first()
+            )
+            if job is None:
+                return None
+            now = timezone.now()
+            claimed = TripJob.objects.filter(pk=job.pk, status="PENDING").update(
+                status="RUNNING", started_at=now, attempts=job.attempts + 1
+            )
+        if claimed:
+            job.status, job.started_at, job.attempts = "RUNNING", now, job.attempts + 1
+            return job
+
+
+def run_job(job):
+    """Plan the trip for a claimed job and record the outcome on it."""
+    try:
+        trip, total_days = plan_trip(job.payload)
+    except ValueError as exc:
+        _finish(job, "FAILED", error=str(exc))
+    except requests.RequestException as exc:
+        # includes GeocodingUnavailable and CircuitOpenError
+        if job.attempts < MAX_ATTEMPTS:
+            not_before = timezone.now() + timedelta(seconds=RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1))
+            logger.warning("Trip job %s failed (attempt %s), requeueing: %s", job.id, job.attempts, exc)
+            TripJob.objects.filter(pk=job.pk).update(status="PENDING", error=str(exc), not_before=not_before)
+            job.status, job.not_before = "PENDING", not_before
+        else:
+            _finish(job, "FAILED", error=str(exc))
+    except Exception as exc:
+        logger.exception("Trip job %s crashed", job.id)
+        _finish(job, "FAILED", error=str(exc))
+    else:
+        _finish(
+            job,
+            "SUCCEEDED",
+            trip=trip,
+            result={
+                "trip_id": str(trip.id),
+                "total_days": total_days,
+                "total_distance_miles": trip.total_distance_miles,
+            },
+        )
+    return job
+
+
+def run_pending_jobs(limit=None):
+    """Claim and run jobs until the queue is empty (or `limit` jobs have
+    run). Returns the number of jobs run."""
+    count = 0
+    while limit is None or count < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        count += 1
+    return count
+
+
+def _finish(job, status, trip=None, result=None, error=""):
+    job.status = status
+    job.trip = trip
+    job.result = result
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "trip", "result", "error", "finished_at"])
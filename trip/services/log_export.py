@@ -0,0 +1,86 @@
+import csv
+import heapq
+import json
+from django.utils.duration import duration_string
+from trip.models import DailyLog, LogSegment
+from trip.services.log_generator import decode_segments
+
+EXPORT_COLUMNS = (
+    "trip_id",
+    "day_number",
+    "date",
+    "total_driving_hours",
+    "total_on_duty_hour",
+    "total_off_duty_hour",
+    "status",
+    "start_minute",
+    "end_minute",
+)
+DEFAULT_CHUNK_SIZE = 2000
+
+_LOG_FIELDS = ("trip_id", "day_number", "date", "total_driving_hours",
+               "total_on_duty_hour", "total_off_duty_hour")
+
+
+def iter_log_rows(log_filters, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield one tuple (in EXPORT_COLUMNS order) per log segment of the
+    daily logs matching `log_filters` (DailyLog lookups), ordered by trip,
+    day and start minute.
+
+    Days stored as LogSegment rows and days stored packed are read with one
+    server-side cursor each and merged, so memory use does not depend on
+    the number of rows.
+    """
+    row_segments = (
+        LogSegment.objects
+        .filter(**{f"daily_log__{lookup}": value for lookup, value in log_filters.items()})
+        .filter(daily_log__segments__isnull=True)
+        .order_by("daily_log__trip_id", "daily_log__day_number", "start_minute")
+        .values_list(*(f"daily_log__{name}" for name in _LOG_FIELDS),
+                     "status", "start_minute", "end_minute")
+        .iterator(chunk_size=chunk_size)
+    )
+    packed_logs = (
+        DailyLog.objects
+        .filter(**log_filters)
+        .filter(segments__isnull=False)
+        .order_by("trip_id", "day_number")
+        .values_list(*_LOG_FIELDS, "segments")
+        .iterator(chunk_size=chunk_size)
+    )
+    rows = heapq.merge(
+        row_segments,
+        _unpack(packed_logs),
+        key=lambda row: (row[0], row[1], row[7]),
+    )
+    for trip_id, day, date, driving, on_duty, off_duty, status, start, end in rows:
+        yield (
+            str(trip_id), day, date.isoformat(),
+            duration_string(driving), duration_string(on_duty), duration_string(off_duty),
+            status, start, end,
+        )
+
+
+def _unpack(packed_logs):
+    for *log, segments in packed_logs:
+        for seg in decode_segments(segments):
+            yield (*log, seg["status"], seg["start_minute"], seg["end_minute"])
+
+
+class _Echo:
+    """File-like object whose write() returns the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n"
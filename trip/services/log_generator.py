@@ -1,3 +1,6 @@
+from trip.services.hos_engine import DaySummary
+
+
 
 def generate_daily_logs(stops):
     """Convert an iterable of RouteStopDTO or LogSegmentDTO into a dict
@@ -15,3 +18,43 @@ def generate_daily_logs(stops):
         }
         daily_logs.setdefault(day, []).append(seg)
     return daily_logs
+
+
+def summarize_days(log_segments):
+    """Group LogSegmentDTOs into DaySummary objects, ordered by day.
+
+    `HOSEngine.days` already holds this for a fresh simulation; this is for
+    segments that come from elsewhere.
+    """
+    days = {}
+    for seg in log_segments:
+        if seg.day not in days:
+            days[seg.day] = DaySummary(seg.day)
+        days[seg.day].add(seg)
+    return [days[day] for day in sorted(days)]
+
+
+# Compact log storage: a day's segments are packed into one
+# `DailyLog.segments` list of [status code, start minute, end minute]
+# triples instead of one LogSegment row each.
+SEGMENT_STATUSES = ("OFF", "SLEEPER", "DRIVING", "ON_DUTY")
+SEGMENT_STATUS_CODES = {status: code for code, status in enumerate(SEGMENT_STATUSES)}
+
+
+def encode_segments(segments):
+    """Pack LogSegmentDTO/LogSegment objects (`status`, `start_minute`,
+    `end_minute`) into a list of [code, start, end] triples, ordered by start
+    minute."""
+    return [
+        [SEGMENT_STATUS_CODES[seg.status], seg.start_minute, seg.end_minute]
+        for seg in sorted(segments, key=lambda s: s.start_minute)
+    ]
+
+
+def decode_segments(packed):
+    """Unpack `encode_segments` output into
+    [ {status, start_minute, end_minute}, ... ] dicts."""
+    return [
+        {"status": SEGMENT_STATUSES[code], "start_minute": start, "end_minute": end}
+        for code, start, end in packed
+    ]
@@ -0,0 +1,198 @@
+import hashlib
+import json
+from xml.sax.saxutils import escape
+
+# Server-side rendering of the 24-hour duty-status grid for a daily log.
+#
+# A sheet is laid out once as a list of primitive shapes in a 1000 x 260
+# canvas (y pointing down) and then written out as SVG, or as one page of a
+# PDF bundle for a whole trip.
+
+RENDER_VERSION = 1
+
+SHEET_WIDTH = 1000
+SHEET_HEIGHT = 260
+GRID_LEFT = 100
+GRID_TOP = 70
+GRID_WIDTH = 840
+ROW_HEIGHT = 40
+STATUS_ROWS = ("OFF", "SLEEPER", "DRIVING", "ON_DUTY")
+ROW_LABELS = ("Off Duty", "Sleeper", "Driving", "On Duty")
+HOUR_LABELS = ["Mid"] + [str(h) for h in range(1, 12)] + ["Noon"] + [str(h) for h in range(1, 12)] + ["Mid"]
+
+# landscape US Letter, in points
+PDF_PAGE_WIDTH = 792
+PDF_PAGE_HEIGHT = 612
+PDF_MARGIN = 21
+
+
+def sheet_etag(day):
+    """Content hash of a `trip_logs_data` day entry (ids excluded), used as
+    the ETag and cache key of its rendering."""
+    content = {key: value for key, value in day.items() if key not in ("id", "log_segments")}
+    content["segments"] = [
+        (seg["status"], seg["start_minute"], seg["end_minute"]) for seg in day["log_segments"]
+    ]
+    content["version"] = RENDER_VERSION
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def bundle_etag(days):
+    digest = hashlib.sha256("".join(sheet_etag(day) for day in days).encode())
+    return digest.hexdigest()[:32]
+
+
+def _x(minute):
+    return GRID_LEFT + minute * GRID_WIDTH / 1440
+
+
+def _row_center(status):
+    return GRID_TOP + STATUS_ROWS.index(status) * ROW_HEIGHT + ROW_HEIGHT / 2
+
+
+def _hours(minutes):
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
+def sheet_shapes(day):
+    """Lay out one daily log sheet as ("line", x1, y1, x2, y2, width),
+    ("rect", x, y, w, h) and ("text", x, y, size, text, anchor) shapes."""
+    shapes = [
+        ("text", GRID_LEFT, 28, 16, f"Day {day['day_number']} - {day['date']}", "start"),
+        ("rect", GRID_LEFT, GRID_TOP, GRID_WIDTH, ROW_HEIGHT * len(STATUS_ROWS)),
+    ]
+    grid_bottom = GRID_TOP + ROW_HEIGHT * len(STATUS_ROWS)
+
+    for index, label in enumerate(ROW_LABELS):
+        top = GRID_TOP + index * ROW_HEIGHT
+        shapes.append(("text", GRID_LEFT - 8, top + ROW_HEIGHT / 2 + 4, 11, label, "end"))
+        if index:
+            shapes.append(("line", GRID_LEFT, top, GRID_LEFT + GRID_WIDTH, top, 0.5))
+        for quarter in range(1, 96):
+            tick = 12 if quarter % 4 == 2 else 6
+            if quarter % 4:
+                x = _x(quarter * 15)
+                shapes.append(("line", x, top, x, top + tick, 0.3))
+
+    for hour, label in enumerate(HOUR_LABELS):
+        x = _x(hour * 60)
+        shapes.append(("line", x, GRID_TOP, x, grid_bottom, 0.5))
+        shapes.append(("text", x, GRID_TOP - 8, 9, label, "middle"))
+
+    # duty status line, with vertical connectors on status changes
+    totals = dict.fromkeys(STATUS_ROWS, 0)
+    previous_y = None
+    for seg in day["log_segments"]:
+        y = _row_center(seg["status"])
+        x1, x2 = _x(seg["start_minute"]), _x(seg["end_minute"])
+        if previous_y is not None and previous_y != y:
+            shapes.append(("line", x1, previous_y, x1, y, 2))
+        shapes.append(("line", x1, y, x2, y, 2))
+        totals[seg["status"]] += seg["end_minute"] - seg["start_minute"]
+        previous_y = y
+
+    for status in STATUS_ROWS:
+        shapes.append((
+            "text", GRID_LEFT + GRID_WIDTH + 30, _row_center(status) + 4, 11,
+            _hours(totals[status]), "middle",
+        ))
+    shapes.append(("text", GRID_LEFT + GRID_WIDTH + 30, GRID_TOP - 8, 9, "Total", "middle"))
+    return shapes
+
+
+def render_sheet_svg(day):
+    """Render one `trip_logs_data` day entry as an SVG document."""
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{SHEET_WIDTH}" height="{SHEET_HEIGHT}" '
+        f'viewBox="0 0 {SHEET_WIDTH} {SHEET_HEIGHT}" font-family="Helvetica, Arial, sans-serif">',
+        f'<rect width="{SHEET_WIDTH}" height="{SHEET_HEIGHT}" fill="#fff"/>',
+        '<g stroke="#000" fill="none">',
+    ]
+    texts = []
+    for shape in sheet_shapes(day):
+        kind = shape[0]
+        if kind == "line":
+            _, x1, y1, x2, y2, width = shape
+            parts.append(f'<line x1="{x1:.2f}" y1="{y1:.2f}" x2="{x2:.2f}" y2="{y2:.2f}" stroke-width="{width}"/>')
+        elif kind == "rect":
+            _, x, y, w, h = shape
+            parts.append(f'<rect x="{x}" y="{y}" width="{w}" height="{h}" stroke-width="1"/>')
+        else:
+            _, x, y, size, text, anchor = shape
+            texts.append(
+                f'<text x="{x:.2f}" y="{y:.2f}" font-size="{size}" text-anchor="{anchor}">{escape(text)}</text>'
+            )
+    parts.append("</g>")
+    parts.append('<g fill="#000">')
+    parts.extend(texts)
+    parts.append("</g></svg>")
+    return "".join(parts)
+
+
+def _pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _pdf_page_content(day):
+    """PDF content stream drawing one sheet scaled to the page width."""
+    scale = (PDF_PAGE_WIDTH - 2 * PDF_MARGIN) / SHEET_WIDTH
+    top = PDF_PAGE_HEIGHT - PDF_MARGIN
+
+    def point(x, y):
+        return PDF_MARGIN + x * scale, top - y * scale
+
+    ops = []
+    for shape in sheet_shapes(day):
+        kind = shape[0]
+        if kind == "line":
+            _, x1, y1, x2, y2, width = shape
+            (px1, py1), (px2, py2) = point(x1, y1), point(x2, y2)
+            ops.append(f"{width * scale:.2f} w {px1:.2f} {py1:.2f} m {px2:.2f} {py2:.2f} l S")
+        elif kind == "rect":
+            _, x, y, w, h = shape
+            px, py = point(x, y + h)
+            ops.append(f"{scale:.2f} w {px:.2f} {py:.2f} {w * scale:.2f} {h * scale:.2f} re S")
+        else:
+            _, x, y, size, text, anchor = shape
+            size *= scale
+            # Helvetica averages about half an em per character
+            width = len(text) * size * 0.5
+            offset = {"start": 0, "middle": width / 2, "end": width}[anchor]
+            px, py = point(x, y)
+            ops.append(f"BT /F1 {size:.2f} Tf {px - offset:.2f} {py:.2f} Td ({_pdf_text(text)}) Tj ET")
+    return "\n".join(ops).encode("latin-1", "replace")
+
+
+def render_trip_pdf(days):
+    """Render a trip's `trip_logs_data` days as a PDF with one sheet per
+    page, using only the standard Helvetica font."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page objects are numbered
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for day in days:
+        content = _pdf_page_content(day)
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % (PDF_PAGE_WIDTH, PDF_PAGE_HEIGHT, content_ref)
+        )
+        page_refs.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % ref for ref in page_refs), len(page_refs)
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
@@ -0,0 +1,210 @@
+from dataclasses import dataclass
+from datetime import date, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from trip.models import Driver, Trip, RouteStop, DailyLog, LogSegment
+from trip.services.cycle_ledger import CycleLedger, LedgerConflict, rebuild_driver_ledger
+from trip.services.instrumentation import timed
+from trip.services.log_generator import encode_segments, summarize_days
+
+# store each day's segments packed on the DailyLog instead of as LogSegment rows
+COMPACT_LOG_SEGMENTS = getattr(settings, "TRIP_COMPACT_LOG_SEGMENTS", False)
+
+
+@dataclass
+class TripPlan:
+    """A simulated trip that has not been written yet: the Trip field
+    values plus the DTOs returned by `HOSEngine.simulate()` and, optionally,
+    the engine's per-day summaries (`HOSEngine.days`) and the date of day 1
+    (defaults to the `start_date` given to `persist_trips`)."""
+    trip_fields: dict
+    route_stops: list
+    log_segments: list
+    days: list | None = None
+    start_date: date | None = None
+
+
+def _build_rows(trip, route_stops, log_segments, start_date, compact=False, days=None):
+    """Build unsaved RouteStop, DailyLog and LogSegment instances for a trip.
+
+    UUID primary keys are assigned on instantiation, so segments can point at
+    their daily log before anything has been written. With `compact`, the
+    segments are packed onto their DailyLog and no LogSegments are built.
+    `days` are the trip's DaySummary objects; they are derived from
+    `log_segments` when not given.
+    """
+    stops = [
+        RouteStop(
+            trip=trip,
+            type=stop.type,
+            start_time=stop.start_minute,
+            end_time=stop.end_minute,
+            duration_minutes=stop.end_minute - stop.start_minute,
+            day_number=stop.day,
+            location_name=stop.location,
+            latitude=stop.lat,
+            longitude=stop.lon,
+        )
+        for stop in route_stops
+    ]
+
+    if days is None:
+        days = summarize_days(log_segments)
+
+    daily_logs = []
+    segments = []
+    for summary in days:
+        daily_log = DailyLog(
+            trip_id=trip,
+            day_number=summary.day,
+            date=start_date + timedelta(days=summary.day - 1),
+            total_driving_hours=timedelta(minutes=summary.driving_minutes),
+            total_on_duty_hour=timedelta(minutes=summary.on_duty_minutes),
+            total_off_duty_hour=timedelta(minutes=summary.off_duty_minutes),
+        )
+        daily_logs.append(daily_log)
+
+        if compact:
+            daily_log.segments = encode_segments(summary.segments)
+            continue
+
+        for seg in summary.segments:
+            segments.append(
+                LogSegment(
+                    daily_log=daily_log,
+                    status=seg.status,
+                    start_minute=seg.start_minute,
+                    end_minute=seg.end_minute,
+                )
+            )
+
+    return stops, daily_logs, segments
+
+
+def persist_trips(plans, start_date=None, compact=None):
+    """Write several simulated trips and their schedules in a single
+    transaction.
+
+    The number of queries is fixed (one INSERT per table) regardless of how
+    many trips there are or how many days they span. `compact` (default
+    TRIP_COMPACT_LOG_SEGMENTS) packs log segments onto their daily logs,
+    which saves the LogSegment INSERT. Trips with a driver add their days to
+    the driver's cycle ledger in the same transaction; a plan whose
+    `start_date` came from the ledger (`apply_driver_cycle`) raises
+    LedgerConflict if the locked ledger no longer gives that start date and
+    at most its cycle hours.
+
+    Returns a list of (trip, total_days) tuples in the order of `plans`.
+    """
+    if start_date is None:
+        start_date = date.today()
+    if compact is None:
+        compact = COMPACT_LOG_SEGMENTS
+
+    trips = []
+    results = []
+    duty = []
+    all_stops, all_daily_logs, all_segments = [], [], []
+    for plan in plans:
+        trip = Trip(**plan.trip_fields)
+        days = plan.days if plan.days is not None else summarize_days(plan.log_segments)
+        trip_start = plan.start_date or start_date
+        stops, daily_logs, segments = _build_rows(
+            trip, plan.route_stops, plan.log_segments, trip_start, compact, days
+        )
+        if trip.driver_id is not None:
+            planned_from_ledger = plan.start_date is not None
+            duty.append((trip.driver_id, trip_start, days, trip.cycle_used_hours if planned_from_ledger else None))
+        trips.append(trip)
+        all_stops.extend(stops)
+        all_daily_logs.extend(daily_logs)
+        all_segments.extend(segments)
+        results.append((trip, len(daily_logs)))
+
+    with timed("persist"), transaction.atomic():
+        # lock the drivers first, so concurrent trips of one driver are
+        # written one after the other
+        _record_driver_duty(duty)
+        Trip.objects.bulk_create(trips)
+        RouteStop.objects.bulk_create(all_stops)
+        DailyLog.objects.bulk_create(all_daily_logs)
+        LogSegment.objects.bulk_create(all_segments)
+
+    return results
+
+
+def _record_driver_duty(duty):
+    """Add (driver id, start date, DaySummary list, planned cycle hours)
+    entries to the drivers' cycle ledgers, with the driver rows locked.
+    Entries with planned cycle hours are checked against the locked ledger
+    first (see `persist_trips`)."""
+    if not duty:
+        return
+    drivers = Driver.objects.select_for_update().in_bulk({driver_id for driver_id, _, _, _ in duty})
+    ledgers = {driver_id: CycleLedger.from_driver(driver) for driver_id, driver in drivers.items()}
+    for driver_id, start_date, days, cycle_used_hours in duty:
+        ledger = ledgers[driver_id]
+        if cycle_used_hours is not None and (
+            ledger.next_start_date() != start_date
+            or ledger.cycle_used_hours(start_date) > cycle_used_hours + 1e-6
+        ):
+            raise LedgerConflict(f"Driver {driver_id}'s schedule changed while the trip was planned.")
+        ledger.record_days(start_date, days)
+    for driver_id, ledger in ledgers.items():
+        ledger.save_to(drivers[driver_id])
+    Driver.objects.bulk_update(drivers.values(), ["ledger_end_date", "ledger_days"])
+
+
+def persist_trip(trip_fields, route_stops, log_segments, start_date=None, compact=None):
+    """Write a simulated trip and its schedule in a single transaction.
+
+    `trip_fields` are the keyword arguments for the Trip row and
+    `route_stops`/`log_segments` are the DTOs returned by
+    `HOSEngine.simulate()`. The number of queries is fixed (one INSERT per
+    table) regardless of how many days the trip spans. See `persist_trips`
+    for `compact`.
+
+    Returns a tuple of (trip, total_days).
+    """
+    plan = TripPlan(trip_fields, route_stops, log_segments)
+    return persist_trips([plan], start_date, compact)[0]
+
+
+def persist_replan(trip, day, minute, route_stops, log_segments, compact=None):
+    """Replace a trip's schedule from `minute` of `day` on.
+
+    `log_segments` are the LogSegmentDTOs of the whole of `day` and every
+    later day, `route_stops` the stops from `minute` of `day` on. Earlier
+    days, and the route stops of `day` that started before `minute`, are
+    left as they are; a stop in progress is cut off at `minute`. The new
+    rows are written with one INSERT per table, the trip's `updated_at` is
+    bumped and its driver's ledger is rebuilt. See `persist_trips` for
+    `compact`.
+
+    Returns the trip's new number of days.
+    """
+    if compact is None:
+        compact = COMPACT_LOG_SEGMENTS
+    day_date = DailyLog.objects.filter(trip_id=trip, day_number=day).values_list("date", flat=True).get()
+    stops, daily_logs, segments = _build_rows(
+        trip, route_stops, log_segments, day_date - timedelta(days=day - 1), compact
+    )
+
+    with timed("persist"), transaction.atomic():
+        DailyLog.objects.filter(trip_id=trip, day_number__gte=day).delete()
+        RouteStop.objects.filter(trip=trip).filter(
+            Q(day_number__gt=day) | Q(day_number=day, start_time__gte=minute)
+        ).delete()
+        # a stop in progress at the checkpoint ends there
+        RouteStop.objects.filter(
+            trip=trip, day_number=day, start_time__lt=minute, end_time__gt=minute
+        ).update(end_time=minute, duration_minutes=minute - F("start_time"))
+        RouteStop.objects.bulk_create(stops)
+        DailyLog.objects.bulk_create(daily_logs)
+        LogSegment.objects.bulk_create(segments)
+        trip.save(update_fields=["updated_at"])
+        if trip.driver_id is not None:
+            rebuild_driver_ledger(trip.driver_id)
+
+    return day - 1 + len(daily_logs)
@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from django.conf import settings
+from trip.services import hos_engine
+from trip.services.geocode_cache import normalize_query
+
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_ENTRIES = 256
+
+# every constant the schedule depends on; changing any of them changes the key
+_ENGINE_CONSTANTS = (
+    "MAX_DAILY_DRIVE_HOURS",
+    "MAX_CYCLE_HOURS",
+    "SPEED_MPH",
+    "BREAK_AFTER_HOURS",
+    "PICKUP_DROPOFF_MINUTES",
+    "FUEL_INTERVAL_MILES",
+    "FUEL_STOP_MINUTES",
+    "BREAK_MINUTES",
+    "START_OFF_DUTY_MINUTES",
+)
+
+
+def plan_cache_key(locations, cycle_used_hours):
+    """Key a plan on its normalized locations (current, pickup, drops), cycle
+    hours and the HOS engine constants."""
+    engine = ",".join(str(getattr(hos_engine, name)) for name in _ENGINE_CONSTANTS)
+    return "|".join((
+        *(normalize_query(location) for location in locations),
+        repr(float(cycle_used_hours)),
+        engine,
+    ))
+
+
+@dataclass(slots=True)
+class CachedPlan:
+    """A routed and simulated lane: the `get_route` result plus the engine
+    output. The DTOs are shared between hits and must not be mutated."""
+    route: dict
+    route_stops: list
+    log_segments: list
+    days: list
+
+
+class PlanCache:
+    """In-process LRU of simulated trip plans for recurring lanes.
+
+    Entries expire after `ttl_seconds`; the least recently used entry is
+    evicted beyond `max_entries` (0 disables the cache). Lookups are
+    counted in `hits` and `misses`.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the CachedPlan for `key`, or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, plan = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return plan
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def __contains__(self, key):
+        """Whether `key` has a live entry; not counted as a lookup."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def set(self, key, plan):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, plan)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+plan_cache = PlanCache(
+    max_entries=getattr(settings, "PLAN_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES),
+    ttl_seconds=getattr(settings, "PLAN_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS),
+)
@@ -0,0 +1,49 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+
+# Serialized trip read responses (retrieve, map, logs and the async map),
+# kept in Django's cache per trip and action. Entries carry the ETag they
+# were built for, so a stale entry is never served even if an invalidation
+# was missed.
+
+CACHED_ACTIONS = ("retrieve", "map", "logs", "async_map")
+TTL_SECONDS = getattr(settings, "TRIP_RESPONSE_CACHE_SECONDS", 3600)
+
+
+def trip_etag(trip_id, updated_at, action):
+    """Quoted ETag for one read action of a trip at a given updated_at."""
+    digest = hashlib.sha256(f"{trip_id}:{updated_at.isoformat()}:{action}".encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def _key(trip_id, action):
+    return f"trip-response:{trip_id}:{action}"
+
+
+def get_cached_response(trip_id, action, etag):
+    """Return the cached response data for `etag`, or None."""
+    entry = cache.get(_key(trip_id, action))
+    if entry is None or entry["etag"] != etag:
+        return None
+    return entry["data"]
+
+
+def set_cached_response(trip_id, action, etag, data):
+    cache.set(_key(trip_id, action), {"etag": etag, "data": data}, TTL_SECONDS)
+
+
+async def aget_cached_response(trip_id, action, etag):
+    entry = await cache.aget(_key(trip_id, action))
+    if entry is None or entry["etag"] != etag:
+        return None
+    return entry["data"]
+
+
+async def aset_cached_response(trip_id, action, etag, data):
+    await cache.aset(_key(trip_id, action), {"etag": etag, "data": data}, TTL_SECONDS)
+
+
+def invalidate_trip_responses(sender, instance, **kwargs):
+    """post_save/post_delete receiver for Trip."""
+    cache.delete_many([_key(instance.pk, action) for action in CACHED_ACTIONS])
@@ -0,0 +1,73 @@
+import hashlib
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from trip.models import RouteCacheEntry
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+# 5 decimal places is roughly 1 m, close enough to treat two lanes as equal
+COORDINATE_PRECISION = 5
+
+
+def route_cache_key(*coordinates):
+    """Key a route on its rounded waypoint coordinates, given flat as
+    (lat_o, lon_o, ..., lat_d, lon_d). The key is a sha256 hex digest, so
+    its length does not depend on the number of stops."""
+    waypoints = ";".join(f"{value:.{COORDINATE_PRECISION}f}" for value in coordinates)
+    return hashlib.sha256(waypoints.encode()).hexdigest()
+
+
+class RouteCache:
+    """Shared OpenRouteService result cache backed by RouteCacheEntry.
+
+    Routes for identical waypoint sequences are reused across trips until `ttl_seconds`
+    have passed. Lookups are counted in `hits` and `misses`.
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached route dict (as returned by `get_route`) for
+        `key`, or None."""
+        cutoff = timezone.now() - timedelta(seconds=self.ttl_seconds)
+        row = (
+            RouteCacheEntry.objects
+            .filter(key=key, created_at__gt=cutoff)
+            .values("distance_miles", "duration_hours", "geometry", "legs")
+            .first()
+        )
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        if row["legs"] is None:
+            # entries from before legs were stored are single-leg routes
+            row["legs"] = [{"distance_miles": row["distance_miles"], "duration_hours": row["duration_hours"]}]
+        return row
+
+    def set(self, key, route):
+        RouteCacheEntry.objects.update_or_create(
+            key=key,
+            defaults={
+                "distance_miles": route["distance_miles"],
+                "duration_hours": route["duration_hours"],
+                "geometry": route["geometry"],
+                "legs": route["legs"],
+                "created_at": timezone.now(),
+            },
+        )
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+route_cache = RouteCache(
+    ttl_seconds=getattr(settings, "ROUTE_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS),
+)
@@ -1,24 +1,52 @@
+import contextvars
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from decouple import config
+from django.conf import settings
+from trip.services.geocode_cache import geocode_cache, normalize_query
+from trip.services.http_client import CircuitOpenError, get_http_client
+from trip.services.instrumentation import count, timed
+from trip.services.route_cache import route_cache, route_cache_key
 API_KEY = config("OPENROUTESERVICE_API_KEY")
+NOMINATIM_URL = getattr(
+    settings, "NOMINATIM_URL", "https://nominatim.openstreetmap.org/search"
+)
+ORS_DIRECTIONS_URL = getattr(
+    settings, "ORS_DIRECTIONS_URL",
+    "https://api.openrouteservice.org/v2/directions/driving-car",
+)
+# Nominatim's usage policy asks for very few parallel requests
+GEOCODE_MAX_CONCURRENCY = getattr(settings, "GEOCODE_MAX_CONCURRENCY", 2)
 
 
-def _geocode_location(query):
+class GeocodingUnavailable(requests.RequestException):
+    """Nominatim could not be reached or answered with an error; unlike the
+    ValueError for an address it cannot find, the request may succeed
+    later."""
+
+
+def _request_geocode(query):
     """Geocode a free-form address string using Nominatim (OpenStreetMap).
 
+    Always performs the HTTP request; see `_geocode_location` for the
+    cached lookup. Safe to call from worker threads (no DB access).
+
     Returns a dict with keys 'lat' and 'lon' as strings.
-    Raises ValueError if geocoding fails.
+    Raises ValueError if the address cannot be found, GeocodingUnavailable
+    if Nominatim fails and CircuitOpenError while its circuit is open.
     """
-    url = "https://nominatim.openstreetmap.org/search"
     params = {"q": query, "format": "json", "limit": 1}
     headers = {"User-Agent": "DriveSheetBackend/1.0"}
     try:
-        r = requests.get(url, params=params, headers=headers, timeout=10)
+        with timed("nominatim"):
+            r = get_http_client().get("nominatim", NOMINATIM_URL, params=params, headers=headers)
         r.raise_for_status()
         results = r.json()
+    except CircuitOpenError:
+        raise
     except requests.RequestException as exc:
-        raise ValueError(f"Geocoding failed for '{query}': {exc}")
+        raise GeocodingUnavailable(f"Geocoding failed for '{query}': {exc}") from exc
 
     if not results:
         raise ValueError(f"Could not geocode location: '{query}'")
@@ -27,34 +55,68 @@ def _geocode_location(query):
     return {"lat": first.get("lat"), "lon": first.get("lon")}
 
 
-def _ensure_dict(obj):
+def _geocode_location(query):
+    """Geocode a free-form address, serving repeats from `geocode_cache`
+    so only misses reach Nominatim.
+
+    Returns a dict with keys 'lat' and 'lon'. Raises like
+    `_request_geocode`.
+    """
+    cached = geocode_cache.get(query)
+    if cached is not None:
+        count("geocode_cache_hit")
+        return cached
+
+    count("geocode_cache_miss")
+    location = _request_geocode(query)
+    geocode_cache.set(query, location)
+    return location
+
+
+def _parse_json_location(obj):
+    """Return the dict encoded in a JSON location string, or None if the
+    string is a free-form address."""
+    try:
+        parsed = json.loads(obj)
+    except json.JSONDecodeError:
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def _ensure_dict(obj, geocoded=None):
     """Ensure the location is a dict containing lat/lon.
 
     - If obj is a dict, return it.
+    - If obj is a (lat, lon) pair, return it as a dict.
     - If obj is a JSON string, parse and return dict.
-    - If obj is a free-form address string, geocode it and return {'lat', 'lon'}.
+    - If obj is a free-form address string, geocode it and return {'lat', 'lon'}
+      (using `geocoded`, keyed by normalized address, when it is already known).
     """
     if isinstance(obj, str):
         # try JSON first
-        try:
-            parsed = json.loads(obj)
-            if isinstance(parsed, dict):
-                return parsed
-        except json.JSONDecodeError:
-            # not JSON — fall through to geocoding
-            pass
+        parsed = _parse_json_location(obj)
+        if parsed is not None:
+            return parsed
 
         # treat as free-form address and geocode
+        if geocoded and normalize_query(obj) in geocoded:
+            location = geocoded[normalize_query(obj)]
+            if isinstance(location, Exception):
+                raise location
+            return location
         return _geocode_location(obj)
 
     if isinstance(obj, dict):
         return obj
 
+    if isinstance(obj, (tuple, list)) and len(obj) == 2:
+        return {"lat": obj[0], "lon": obj[1]}
+
     raise ValueError("Location must be a JSON object, dict, or address string")
 
 
-def _get_lat_lon(loc):
-    loc = _ensure_dict(loc)
+def _get_lat_lon(loc, geocoded=None):
+    loc = _ensure_dict(loc, geocoded)
     lat = loc.get("lat") or loc.get("latitude")
     lon = (
         loc.get("lng")
@@ -70,20 +132,110 @@ def _get_lat_lon(loc):
     return float(lat), float(lon)
 
 
-def get_route(origin, destination):
-    lat_o, lon_o = _get_lat_lon(origin)
-    lat_d, lon_d = _get_lat_lon(destination)
+def resolve_locations(locations, max_workers=None, return_exceptions=False):
+    """Resolve several locations to (lat, lon) pairs in one go.
+
+    Distinct free-form addresses that miss the geocode cache are sent to
+    Nominatim concurrently, at most `max_workers` (default
+    GEOCODE_MAX_CONCURRENCY) at a time. Cache reads and writes stay on the
+    calling thread.
+
+    Raises ValueError if any location cannot be resolved (or the
+    RequestException that stopped its geocoding), unless
+    `return_exceptions` is set, in which case the exception takes that
+    location's place in the returned list.
+    """
+    geocoded = {}
+    misses = []
+    for obj in locations:
+        if not isinstance(obj, str) or _parse_json_location(obj) is not None:
+            continue
+        key = normalize_query(obj)
+        if key in geocoded or key in misses:
+            continue
+        cached = geocode_cache.get(obj)
+        if cached is None:
+            misses.append(key)
+        else:
+            count("geocode_cache_hit")
+            geocoded[key] = cached
+
+    if misses:
+        count("geocode_cache_miss", len(misses))
+        workers = min(max_workers or GEOCODE_MAX_CONCURRENCY, len(misses))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # each call runs in a copy of this context, so its timing is
+            # recorded on the current request
+            futures = [
+                pool.submit(contextvars.copy_context().run, _request_geocode, key)
+                for key in misses
+            ]
+        for key, future in zip(misses, futures):
+            try:
+                location = future.result()
+            except (ValueError, requests.RequestException) as exc:
+                geocoded[key] = exc
+                continue
+            geocode_cache.set(key, location)
+            geocoded[key] = location
+
+    results = []
+    for obj in locations:
+        try:
+            results.append(_get_lat_lon(obj, geocoded))
+        except (ValueError, requests.RequestException) as exc:
+            if not return_exceptions:
+                raise
+            results.append(exc)
+    return results
+
+
+def get_route(origin, destination, waypoints=()):
+    """Return distance, duration and encoded polyline geometry for the
+    driving route from `origin` through `waypoints` (in order) to
+    `destination`, plus a `legs` list with the distance_miles and
+    duration_hours between consecutive points.
+
+    All legs come from a single OpenRouteService directions request.
+    Identical coordinate sequences are served from `route_cache`, so repeat
+    lanes cost no OpenRouteService call.
+    """
+    points = resolve_locations([origin, *waypoints, destination])
+
+    key = route_cache_key(*(value for point in points for value in point))
+    cached = route_cache.get(key)
+    if cached is not None:
+        count("route_cache_hit")
+        return cached
 
-    url = "https://api.openrouteservice.org/v2/directions/driving-car"
-    payload = {"coordinates": [[lon_o, lat_o], [lon_d, lat_d]]}
+    count("route_cache_miss")
+    payload = {"coordinates": [[lon, lat] for lat, lon in points]}
     headers = {"Authorization": API_KEY, "Content-Type": "application/json"}
-    res = requests.post(url, json=payload, headers=headers)
+    with timed("ors"):
+        res = get_http_client().post("ors", ORS_DIRECTIONS_URL, json=payload, headers=headers)
     res.raise_for_status()
-    data = res.json()
-    summary = data["routes"][0]["summary"]
+    route = _parse_directions(res.json(), len(points) - 1)
+    route_cache.set(key, route)
+    return route
+
 
+def _parse_directions(data, leg_count):
+    """Build the `get_route` dict from an ORS directions response."""
+    summary = data["routes"][0]["summary"]
+    # ORS returns one segment per pair of consecutive coordinates; a
+    # two-point route may come without them
+    segments = data["routes"][0].get("segments") or [summary]
+    if len(segments) != leg_count:
+        raise ValueError("Routing service returned an unexpected number of legs")
     return {
         "distance_miles": summary["distance"] / 1609,
         "duration_hours": summary["duration"] / 3600,
         "geometry": data["routes"][0]["geometry"],
-    }
\ No newline at end of file
+        "legs": [
+            {
+                "distance_miles": segment.get("distance", 0) / 1609,
+                "duration_hours": segment.get("duration", 0) / 3600,
+            }
+            for segment in segments
+        ],
+    }
@@ -0,0 +1,390 @@
+import requests
+from django.core.exceptions import ValidationError
+from django.db.models import Q, Sum
+from trip.models import DailyLog, Driver, LogSegment, RouteStop
+from trip.services.cycle_ledger import CycleLedger, LedgerConflict
+from trip.services.geometry import RouteIndex, locate_stops
+from trip.services.hos_engine import (
+    BREAK_MINUTES, MAX_CYCLE_HOURS, MINUTES_PER_HOUR, PICKUP_DROPOFF_MINUTES, SPEED_MPH,
+    EngineCheckpoint, HOSEngine, Leg, LogSegmentDTO,
+)
+from trip.services.instrumentation import count, timed
+from trip.services.log_generator import decode_segments
+from trip.services.persistence import TripPlan, persist_replan, persist_trips
+from trip.services.plan_cache import CachedPlan, plan_cache, plan_cache_key
+from trip.services.route_service import get_route, resolve_locations
+
+
+def trip_locations(data):
+    """The locations a trip visits, in order: current, pickup, any extra
+    drops and the final drop."""
+    return [
+        data["current_location"],
+        data["pickup_location"],
+        *data.get("extra_drop_locations", []),
+        data["drop_location"],
+    ]
+
+
+def route_trip(data):
+    """Route current -> pickup -> drops for validated trip `data` with a
+    single `get_route` call."""
+    current, pickup, *drops = trip_locations(data)
+    return get_route(current, drops[-1], [pickup, *drops[:-1]])
+
+
+def apply_driver_cycle(data, ledgers=None):
+    """Take a trip's cycle hours from its driver's ledger.
+
+    For `data` with a `driver` (a Driver or, in job payloads, its id), the
+    trip's logs start on the first day after the driver's last logged day
+    (today at the earliest), and `cycle_used_hours` becomes the ledger's
+    hours at that date, or the client's value if that is higher. `ledgers`
+    maps driver ids to CycleLedgers and lets a batch chain several trips of
+    one driver. Raises ValueError for an unknown driver id.
+
+    Returns (data, start_date); start_date is None without a driver.
+    """
+    driver = data.get("driver")
+    if driver is None:
+        return data, None
+    if not isinstance(driver, Driver):
+        try:
+            driver = Driver.objects.get(pk=driver)
+        except (Driver.DoesNotExist, ValidationError):
+            raise ValueError(f"Unknown driver: {driver}")
+    if ledgers is None:
+        ledgers = {}
+    if driver.pk not in ledgers:
+        ledgers[driver.pk] = CycleLedger.from_driver(driver)
+    ledger = ledgers[driver.pk]
+
+    start_date = ledger.next_start_date()
+    cycle_used_hours = ledger.cycle_used_hours(start_date)
+    if data.get("cycle_used_hours") is not None:
+        cycle_used_hours = max(cycle_used_hours, float(data["cycle_used_hours"]))
+    return {**data, "driver": driver, "cycle_used_hours": cycle_used_hours}, start_date
+
+
+def _trip_fields(data, route):
+    return {
+        "driver": data.get("driver"),
+        "current_location": data["current_location"],
+        "pickup_location": data["pickup_location"],
+        "drop_location": data["drop_location"],
+        "extra_drop_locations": list(data.get("extra_drop_locations", [])),
+        "cycle_used_hours": float(data["cycle_used_hours"]),
+        "total_distance_miles": route["distance_miles"],
+        "total_duration_hours": route["duration_hours"],
+        "route_geometry": route["geometry"],
+    }
+
+
+def _trip_legs(data, route):
+    """HOS engine legs for `route`: current -> pickup, then one leg per drop.
+    Routes without per-leg data are treated as pickup -> drop."""
+    _current, pickup, *drops = trip_locations(data)
+    if "legs" not in route:
+        return [Leg(0, "PICKUP", pickup), Leg(route["distance_miles"], "DROPOFF", drops[-1])]
+    first, *rest = route["legs"]
+    return [Leg(first["distance_miles"], "PICKUP", pickup)] + [
+        Leg(leg["distance_miles"], "DROPOFF", drop) for leg, drop in zip(rest, drops)
+    ]
+
+
+def build_trip_plan(data, route):
+    """Run the HOS engine for validated trip `data` over `route` (as returned
+    by `get_route`), place its stops on the route geometry and return the
+    unsaved TripPlan."""
+    legs = _trip_legs(data, route)
+    engine = HOSEngine(
+        total_distance_miles=sum(leg.distance_miles for leg in legs),
+        cycle_used_hours=float(data["cycle_used_hours"]),
+        legs=legs,
+    )
+    with timed("hos"):
+        route_stops, log_segments = engine.simulate()
+    locate_stops(route_stops, route["geometry"], engine.total_distance_miles)
+
+    return TripPlan(_trip_fields(data, route), route_stops, log_segments, engine.days)
+
+
+def cached_trip_plan(data):
+    """Return the TripPlan for `data` from `plan_cache`, or None.
+
+    A hit reuses the route and schedule of an earlier trip over the same
+    locations with the same cycle hours, so neither ORS nor the engine is
+    needed.
+    """
+    key = plan_cache_key(trip_locations(data), data["cycle_used_hours"])
+    cached = plan_cache.get(key)
+    if cached is None:
+        count("plan_cache_miss")
+        return None
+    count("plan_cache_hit")
+    return TripPlan(
+        _trip_fields(data, cached.route), cached.route_stops, cached.log_segments, cached.days
+    )
+
+
+def remember_trip_plan(data, route, plan):
+    key = plan_cache_key(trip_locations(data), data["cycle_used_hours"])
+    plan_cache.set(key, CachedPlan(route, plan.route_stops, plan.log_segments, plan.days))
+
+
+def plan_trip(data, route=None):
+    """Geocode, route, simulate and persist one validated trip.
+
+    All locations are geocoded concurrently and every leg (current ->
+    pickup -> drops) is routed with one ORS request, unless the `route` is
+    given (the async create fetches it itself). Recurring trips are served
+    from `plan_cache`. Trips with a driver take their cycle hours
+    from the driver's ledger (see `apply_driver_cycle`); if another trip of
+    the driver is booked meanwhile, the trip is planned again once before
+    LedgerConflict is raised. Raises ValueError if a location or the driver
+    cannot be resolved.
+
+    Returns a tuple of (trip, total_days).
+    """
+    for attempt in range(2):
+        trip_data, start_date = apply_driver_cycle(data)
+        plan = cached_trip_plan(trip_data)
+        if plan is None:
+            if route is None:
+                route = route_trip(trip_data)
+            plan = build_trip_plan(trip_data, route)
+            remember_trip_plan(trip_data, route, plan)
+        plan.start_date = start_date
+        try:
+            return persist_trips([plan])[0]
+        except LedgerConflict:
+            if attempt:
+                raise
+            # re-read the driver's ledger
+            data = {**data, "driver": trip_data["driver"].pk}
+
+
+def plan_trip_batch(items):
+    """Plan and persist many trips at once.
+
+    `items` are validated trip dicts. Every distinct address in the batch is
+    geocoded once (concurrently), every distinct sequence of locations is
+    routed once, and all successful trips are written with a single set of bulk
+    INSERTs. Several trips of one driver are scheduled one after another.
+
+    Returns one entry per item, in order: a (trip, total_days) tuple on
+    success or the exception that stopped that item. If a driver's ledger
+    changes while the batch is planned, nothing is written and every planned
+    item gets the LedgerConflict.
+    """
+    offsets = []
+    locations = []
+    for data in items:
+        offsets.append(len(locations))
+        locations.extend(trip_locations(data))
+    coords = resolve_locations(locations, return_exceptions=True)
+
+    results = [None] * len(items)
+    routes = {}
+    ledgers = {}
+    plans = []
+    planned_indexes = []
+    for index, data in enumerate(items):
+        item_coords = coords[offsets[index]:offsets[index] + len(trip_locations(data))]
+        error = next((c for c in item_coords if isinstance(c, Exception)), None)
+        if error is not None:
+            results[index] = error
+            continue
+
+        lane = tuple(item_coords)
+        if lane not in routes:
+            try:
+                routes[lane] = get_route(lane[0], lane[-1], lane[1:-1])
+            except (ValueError, requests.RequestException) as exc:
+                routes[lane] = exc
+        route = routes[lane]
+        if isinstance(route, Exception):
+            results[index] = route
+            continue
+
+        try:
+            data, start_date = apply_driver_cycle(data, ledgers)
+        except ValueError as exc:
+            results[index] = exc
+            continue
+        plan = build_trip_plan(data, route)
+        if start_date is not None:
+            plan.start_date = start_date
+            ledgers[data["driver"].pk].record_days(start_date, plan.days)
+        plans.append(plan)
+        planned_indexes.append(index)
+
+    try:
+        persisted = persist_trips(plans)
+    except LedgerConflict as exc:
+        persisted = [exc] * len(plans)
+    for index, outcome in zip(planned_indexes, persisted):
+        results[index] = outcome
+    return results
+
+
+def _trip_data(trip):
+    return {
+        "current_location": trip.current_location,
+        "pickup_location": trip.pickup_location,
+        "drop_location": trip.drop_location,
+        "extra_drop_locations": trip.extra_drop_locations,
+        "cycle_used_hours": trip.cycle_used_hours,
+    }
+
+
+def _day_segments(trip, day):
+    """(status, start, end) tuples of a stored day, in order. Raises
+    ValueError if the trip has no such day."""
+    log = DailyLog.objects.filter(trip_id=trip, day_number=day).values_list("id", "segments").first()
+    if log is None:
+        raise ValueError(f"Trip has no day {day}.")
+    daily_log_id, packed = log
+    if packed is not None:
+        return [(s["status"], s["start_minute"], s["end_minute"]) for s in decode_segments(packed)]
+    return list(
+        LogSegment.objects.filter(daily_log_id=daily_log_id)
+        .order_by("start_minute")
+        .values_list("status", "start_minute", "end_minute")
+    )
+
+
+def _stored_stop(trip, stop_type=None):
+    """(day, start, end) of the trip's first stop of `stop_type`, or of its
+    last stop without one; None if there is none."""
+    stops = RouteStop.objects.filter(trip=trip)
+    if stop_type is None:
+        stops = stops.order_by("-day_number", "-start_time")
+    else:
+        stops = stops.filter(type=stop_type).order_by("day_number", "start_time")
+    return stops.values_list("day_number", "start_time", "end_time").first()
+
+
+def _pickup_logged(elapsed):
+    return any(
+        status == "ON_DUTY" and end - start >= PICKUP_DROPOFF_MINUTES for status, start, end in elapsed
+    )
+
+
+def trip_checkpoint(trip, total_distance_miles, day, minute, miles_completed, elapsed,
+                    distance_since_fuel=None, pickup=None):
+    """The EngineCheckpoint of `trip` at `minute` of `day`.
+
+    `elapsed` are the day's (status, start, end) segments up to `minute`.
+    The pickup counts as made once they hold a full on-duty hour or the
+    stored PICKUP stop (`pickup`, as returned by `_stored_stop`) has ended.
+    Cycle hours are counted the engine's way (driving only) from the stored
+    totals of earlier days; the distance since fuel, unless given, runs from
+    where the last planned fuel stop before the checkpoint was made.
+    """
+    prior = DailyLog.objects.filter(trip_id=trip, day_number__lt=day).aggregate(
+        Sum("total_driving_hours")
+    )["total_driving_hours__sum"]
+    driven_minutes = 0
+    since_break_minutes = 0
+    for status, start, end in elapsed:
+        if status == "DRIVING":
+            driven_minutes += end - start
+            since_break_minutes += end - start
+        elif end - start >= BREAK_MINUTES:
+            since_break_minutes = 0
+    driven_hours = (prior.total_seconds() / 3600 if prior else 0) + driven_minutes / MINUTES_PER_HOUR
+
+    pickup_done = _pickup_logged(elapsed) or (
+        pickup is not None and (pickup[0], pickup[2]) <= (day, minute)
+    )
+
+    if distance_since_fuel is None:
+        mile = last_fuel_mile = 0
+        stops = (
+            RouteStop.objects.filter(trip=trip, type__in=("DRIVING", "FUEL"))
+            .filter(Q(day_number__lt=day) | Q(day_number=day, end_time__lte=minute))
+            .order_by("day_number", "start_time")
+            .values_list("type", "duration_minutes")
+        )
+        for stop_type, duration in stops:
+            if stop_type == "FUEL":
+                last_fuel_mile = mile
+            else:
+                mile += duration / MINUTES_PER_HOUR * SPEED_MPH
+        distance_since_fuel = max(miles_completed - last_fuel_mile, 0)
+
+    return EngineCheckpoint(
+        remaining_miles=total_distance_miles - miles_completed,
+        cycle_left_hours=max(MAX_CYCLE_HOURS - trip.cycle_used_hours - driven_hours, 0),
+        distance_since_fuel=distance_since_fuel,
+        day=day,
+        minute=minute,
+        driven_minutes=driven_minutes,
+        since_break_minutes=since_break_minutes,
+        pickup_done=pickup_done,
+    )
+
+
+def replan_trip(trip, day, minute, miles_completed=None, position=None, log_segments=None,
+                distance_since_fuel=None):
+    """Reschedule an in-progress trip from `minute` of `day`.
+
+    The driver is `miles_completed` along the route, or at `position`
+    (lat, lon), which is projected onto the route geometry. `log_segments`
+    are the day's actual (status, start, end) segments up to `minute`; by
+    default the stored plan is taken as followed until then. The HOS
+    engine resumes from the resulting checkpoint and only `day` and later
+    days are rewritten; a pickup in progress at `minute` is finished as
+    planned first. The route comes from `plan_cache` or the route cache.
+    Raises ValueError for a position or day the trip does not have, a
+    `minute` past the end of the stored day (without `log_segments`) or
+    once the trip's last stop has begun.
+
+    Returns the trip's new number of days.
+    """
+    stored = _day_segments(trip, day)
+    if log_segments is None and stored and minute > stored[-1][2]:
+        raise ValueError(f"Day {day}'s log ends at minute {stored[-1][2]}.")
+    last_stop = _stored_stop(trip)
+    if last_stop is not None and (last_stop[0], last_stop[1]) < (day, minute):
+        raise ValueError("The trip has already reached its last stop.")
+    data = _trip_data(trip)
+    cached = plan_cache.get(plan_cache_key(trip_locations(data), data["cycle_used_hours"]))
+    route = cached.route if cached is not None else route_trip(data)
+    legs = _trip_legs(data, route)
+    total_distance_miles = sum(leg.distance_miles for leg in legs)
+
+    if miles_completed is None:
+        try:
+            index = RouteIndex.from_polyline(route["geometry"] or "")
+        except ValueError:
+            raise ValueError("Trip has no route geometry; give miles_completed instead.")
+        miles_completed = index.project(position) * total_distance_miles / (index.length_miles or 1)
+    if miles_completed >= total_distance_miles:
+        raise ValueError("miles_completed must be less than the trip distance.")
+
+    if log_segments is None:
+        log_segments = [
+            (status, start, min(end, minute)) for status, start, end in stored if start < minute
+        ]
+    pickup = _stored_stop(trip, "PICKUP")
+    if pickup is not None and pickup[0] == day and pickup[1] < minute < pickup[2] \
+            and not _pickup_logged(log_segments):
+        # the driver is at the pickup: resume once it is done
+        if log_segments and log_segments[-1][0] == "ON_DUTY" and log_segments[-1][2] == minute:
+            log_segments = [*log_segments[:-1], ("ON_DUTY", log_segments[-1][1], pickup[2])]
+        else:
+            log_segments = [*log_segments, ("ON_DUTY", minute, pickup[2])]
+        minute = pickup[2]
+    checkpoint = trip_checkpoint(
+        trip, total_distance_miles, day, minute, miles_completed, log_segments, distance_since_fuel,
+        pickup,
+    )
+    engine = HOSEngine.resume(checkpoint, total_distance_miles, legs)
+    with timed("hos"):
+        route_stops, segments = engine.simulate()
+    locate_stops(route_stops, route["geometry"], total_distance_miles)
+
+    elapsed = [LogSegmentDTO(status, day, start, end) for status, start, end in log_segments]
+    return persist_replan(trip, day, minute, route_stops, elapsed + segments)
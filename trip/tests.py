@@ -1,3 +1,1267 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import random
+import threading
+import time
+import requests
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from trip.models import Driver, Trip, RouteStop, DailyLog, LogSegment, GeocodeCacheEntry, RouteCacheEntry, TripJob
+from trip.services.cycle_ledger import CYCLE_DAYS, CycleLedger, DutyDay, LedgerConflict
+from trip.services.geocode_cache import GeocodeCache, geocode_cache
+from trip.services.hos_batch import evaluate_hos_batch
+from trip.services.instrumentation import end_request, metrics, start_request
+from trip.services.hos_benchmark import find_regressions, golden_schedule, load_golden, measure, simulate_haul
+from trip.serializers import TripLogsSerializer, trip_logs_data
+from trip.services.geometry import RouteIndex, decode_polyline
+from trip.services.hos_engine import HOSEngine, Leg, LogSegmentDTO, RouteStopDTO
+from trip.services.log_generator import decode_segments, encode_segments, summarize_days
+from trip.services.job_queue import MAX_ATTEMPTS, enqueue_trip_job, run_pending_jobs
+from trip.services.persistence import persist_trip, persist_trips
+from trip.services.plan_cache import PlanCache, plan_cache, plan_cache_key
+from trip.services.route_cache import route_cache_key
+from trip.services.trip_planner import apply_driver_cycle, build_trip_plan
+from trip.services.http_client import CircuitOpenError, HttpClient, set_http_client
+from trip.services.route_service import _geocode_location, get_route, resolve_locations
 
-# Create your tests here.
+
+def _fake_route(distance_miles):
+    return {
+        "distance_miles": distance_miles,
+        "duration_hours": distance_miles / 55,
+        "geometry": "",
+    }
+
+
+def _trip_payload():
+    return {
+        "current_location": '{"lat": 41.88, "lon": -87.63}',
+        "pickup_location": '{"lat": 41.85, "lon": -87.65}',
+        "drop_location": '{"lat": 34.05, "lon": -118.24}',
+        "cycle_used_hours": 10,
+    }
+
+
+class TripCreateQueryBudgetTests(TestCase):
+    # SAVEPOINT + Trip + RouteStop + DailyLog + LogSegment + RELEASE
+    QUERY_BUDGET = 6
+
+    def setUp(self):
+        self.client = APIClient()
+        plan_cache.clear()
+
+    def _create(self, distance_miles):
+        with mock.patch("trip.services.trip_planner.get_route", return_value=_fake_route(distance_miles)):
+            with self.assertNumQueries(self.QUERY_BUDGET):
+                response = self.client.post("/api/trips/", _trip_payload(), format="json")
+        self.assertEqual(response.status_code, 201)
+        return response
+
+    def test_short_trip_within_budget(self):
+        response = self._create(100)
+        self.assertEqual(response.data["total_days"], DailyLog.objects.count())
+
+    def test_recurring_lane_reuses_cached_plan(self):
+        first = self._create(1500)
+        with mock.patch("trip.services.trip_planner.get_route") as lookup, \
+                mock.patch("trip.services.trip_planner.HOSEngine") as engine:
+            with self.assertNumQueries(self.QUERY_BUDGET):
+                second = self.client.post("/api/trips/", _trip_payload(), format="json")
+        lookup.assert_not_called()
+        engine.assert_not_called()
+        self.assertNotEqual(second.data["trip_id"], first.data["trip_id"])
+        self.assertEqual(second.data["total_days"], first.data["total_days"])
+        self.assertEqual(
+            RouteStop.objects.filter(trip_id=second.data["trip_id"]).count(),
+            RouteStop.objects.filter(trip_id=first.data["trip_id"]).count(),
+        )
+
+        other_cycle = {**_trip_payload(), "cycle_used_hours": 11}
+        with mock.patch("trip.services.trip_planner.get_route", return_value=_fake_route(1500)) as lookup:
+            self.client.post("/api/trips/", other_cycle, format="json")
+        lookup.assert_called_once()
+
+    def test_long_trip_within_same_budget(self):
+        response = self._create(3000)
+        trip = Trip.objects.get(pk=response.data["trip_id"])
+        self.assertGreater(response.data["total_days"], 5)
+        self.assertEqual(trip.daily_logs.count(), response.data["total_days"])
+        self.assertTrue(RouteStop.objects.filter(trip=trip, type="PICKUP").exists())
+        self.assertTrue(LogSegment.objects.filter(daily_log__trip_id=trip).exists())
+
+
+class GeocodeCacheTests(TestCase):
+    def setUp(self):
+        self.cache = GeocodeCache(max_entries=2, ttl_seconds=60)
+
+    def test_normalized_queries_share_an_entry(self):
+        self.assertIsNone(self.cache.get("Chicago, IL"))
+        self.cache.set("Chicago, IL", {"lat": "41.8", "lon": "-87.6"})
+        self.assertEqual(self.cache.get("  chicago,   il "), {"lat": 41.8, "lon": -87.6})
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_db_entry_survives_lru_eviction(self):
+        for i in range(3):
+            self.cache.set(f"yard {i}", {"lat": i, "lon": i})
+        self.assertEqual(self.cache.stats()["size"], 2)
+        self.assertEqual(self.cache.get("yard 0"), {"lat": 0.0, "lon": 0.0})
+        self.assertEqual(self.cache.db_hits, 1)
+
+    def test_expired_entries_are_misses(self):
+        self.cache.set("Dallas, TX", {"lat": 32.7, "lon": -96.8})
+        GeocodeCacheEntry.objects.update(created_at=timezone.now() - timedelta(seconds=120))
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("Dallas, TX"))
+
+    def test_route_service_skips_nominatim_on_hit(self):
+        self.cache.set("Denver, CO", {"lat": 39.7, "lon": -104.9})
+        with mock.patch("trip.services.route_service.geocode_cache", self.cache), \
+                mock.patch("trip.services.route_service.get_http_client") as client:
+            self.assertEqual(_geocode_location("denver, co"), {"lat": 39.7, "lon": -104.9})
+        client.assert_not_called()
+
+
+class PlanCacheTests(SimpleTestCase):
+    def test_lru_eviction_and_ttl(self):
+        cache = PlanCache(max_entries=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((cache.get("a"), cache.get("c")), (1, 3))
+
+        expired = PlanCache(ttl_seconds=0)
+        expired.set("a", 1)
+        self.assertIsNone(expired.get("a"))
+
+    def test_key_includes_engine_constants(self):
+        key = plan_cache_key(["Gary, IN", "Chicago,  IL", "Los Angeles, CA"], 10)
+        self.assertEqual(key, plan_cache_key(["gary, in", "chicago, il", "los angeles, ca"], 10.0))
+        with mock.patch("trip.services.hos_engine.SPEED_MPH", 60):
+            self.assertNotEqual(key, plan_cache_key(["Gary, IN", "Chicago, IL", "Los Angeles, CA"], 10))
+
+
+class RouteCacheTests(TestCase):
+    ORS_RESPONSE = {
+        "routes": [{"summary": {"distance": 160900, "duration": 7200}, "geometry": "_p~iF~ps|U_ulLnnqC"}]
+    }
+
+    def setUp(self):
+        plan_cache.clear()
+
+    def _post(self):
+        client = mock.Mock()
+        client.post.return_value.json.return_value = self.ORS_RESPONSE
+        return mock.patch("trip.services.route_service.get_http_client", return_value=client)
+
+    def test_identical_lanes_share_one_ors_call(self):
+        origin = {"lat": 41.85, "lon": -87.65}
+        destination = {"lat": 34.05, "lon": -118.24}
+        with self._post() as get_client:
+            first = get_route(origin, destination)
+            second = get_route(dict(origin), dict(destination))
+        self.assertEqual(get_client.return_value.post.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertAlmostEqual(first["distance_miles"], 100)
+
+    def test_key_length_does_not_grow_with_stops(self):
+        short = route_cache_key(41.85, -87.65, 34.05, -118.24)
+        long = route_cache_key(*[41.85, -87.65] * 40)
+        self.assertEqual(len(short), len(long))
+        self.assertLessEqual(len(long), RouteCacheEntry._meta.get_field("key").max_length)
+        self.assertNotEqual(short, route_cache_key(41.85, -87.65, 34.05, -118.25))
+
+    def test_map_reads_stored_geometry(self):
+        with mock.patch("trip.services.trip_planner.get_route", return_value=dict(_fake_route(500), geometry="abc")):
+            trip_id = self.client.post("/api/trips/", _trip_payload(), content_type="application/json").data["trip_id"]
+        with mock.patch("trip.services.trip_planner.get_route") as lookup:
+            response = self.client.get(f"/api/trips/{trip_id}/map/")
+        lookup.assert_not_called()
+        self.assertEqual(response.data["geometry"], "abc")
+
+
+class _FlakyHandler(BaseHTTPRequestHandler):
+    # status codes to answer with, in order; the last one repeats
+    statuses = [200]
+    calls = 0
+
+    def do_GET(self):
+        cls = type(self)
+        status_code = cls.statuses[min(cls.calls, len(cls.statuses) - 1)]
+        cls.calls += 1
+        body = b'[{"lat": "1.5", "lon": "2.5"}]'
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpClientTests(TestCase):
+    def setUp(self):
+        _FlakyHandler.calls = 0
+        self.server = HTTPServer(("127.0.0.1", 0), _FlakyHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/search"
+        self.client = HttpClient(retries=2, backoff_factor=0, failure_threshold=2, reset_timeout=60)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.client.close()
+
+    def test_retries_server_errors(self):
+        _FlakyHandler.statuses = [503, 502, 200]
+        response = self.client.get("nominatim", self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_FlakyHandler.calls, 3)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        _FlakyHandler.statuses = [500]
+        for _ in range(2):
+            self.assertEqual(self.client.get("nominatim", self.url).status_code, 500)
+        with self.assertRaises(CircuitOpenError):
+            self.client.get("nominatim", self.url)
+        self.assertEqual(_FlakyHandler.calls, 6)
+        # other endpoints keep their own breaker
+        _FlakyHandler.statuses = [200]
+        self.assertEqual(self.client.get("ors", self.url).status_code, 200)
+
+    def test_geocoder_uses_injected_client(self):
+        _FlakyHandler.statuses = [200]
+        previous = set_http_client(self.client)
+        try:
+            with mock.patch("trip.services.route_service.NOMINATIM_URL", self.url):
+                location = _geocode_location("Fake Yard 1")
+        finally:
+            set_http_client(previous)
+        self.assertEqual(location, {"lat": "1.5", "lon": "2.5"})
+
+
+class ConcurrentGeocodingTests(TestCase):
+    def setUp(self):
+        self.active = 0
+        self.peak = 0
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _slow_geocode(self, query):
+        with self.lock:
+            self.calls.append(query)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(0.05)
+        with self.lock:
+            self.active -= 1
+        return {"lat": "1", "lon": str(len(query))}
+
+    def _resolve(self, locations, max_workers):
+        with mock.patch("trip.services.route_service.geocode_cache", GeocodeCache()), \
+                mock.patch("trip.services.route_service._request_geocode", self._slow_geocode):
+            return resolve_locations(locations, max_workers=max_workers)
+
+    def test_addresses_are_geocoded_in_parallel_and_deduplicated(self):
+        coords = self._resolve(["Gary, IN", "Reno, NV", "gary,  in", '{"lat": 5, "lon": 6}'], max_workers=4)
+        self.assertEqual(coords, [(1.0, 8.0), (1.0, 8.0), (1.0, 8.0), (5.0, 6.0)])
+        self.assertEqual(sorted(self.calls), ["gary, in", "reno, nv"])
+        self.assertEqual(self.peak, 2)
+
+    def test_concurrency_cap_is_respected(self):
+        self._resolve(["A st", "B st", "C st", "D st"], max_workers=1)
+        self.assertEqual(self.peak, 1)
+
+
+class GeocoderOutageTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        plan_cache.clear()
+
+    def _create(self, nominatim):
+        payload = {**_trip_payload(), "drop_location": "Los Angeles, CA"}
+        with mock.patch("trip.services.route_service.geocode_cache", GeocodeCache()), \
+                mock.patch("trip.services.route_service.get_http_client", return_value=nominatim):
+            return self.client.post("/api/trips/", payload, format="json")
+
+    def test_unknown_address_is_a_bad_request(self):
+        nominatim = mock.Mock()
+        nominatim.get.return_value.json.return_value = []
+        response = self._create(nominatim)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Could not geocode", response.data["detail"])
+
+    def test_nominatim_outage_is_a_bad_gateway(self):
+        nominatim = mock.Mock()
+        nominatim.get.side_effect = requests.ConnectionError("connection refused")
+        response = self._create(nominatim)
+        self.assertEqual(response.status_code, 502)
+        self.assertIn("connection refused", response.data["detail"])
+
+    def test_open_circuit_is_service_unavailable(self):
+        nominatim = mock.Mock()
+        nominatim.get.side_effect = CircuitOpenError("nominatim circuit is open")
+        self.assertEqual(self._create(nominatim).status_code, 503)
+        self.assertFalse(Trip.objects.exists())
+
+
+class TripBatchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_batch_shares_routing_and_reports_item_errors(self):
+        good = _trip_payload()
+        bad_cycle = dict(_trip_payload(), cycle_used_hours="lots")
+        unknown = dict(_trip_payload(), drop_location="Nowhere")
+        payload = {"trips": [good, bad_cycle, unknown, dict(good)]}
+
+        with mock.patch("trip.services.trip_planner.get_route", return_value=_fake_route(1200)) as lookup, \
+                mock.patch("trip.services.route_service._request_geocode", side_effect=ValueError("Could not geocode")):
+            # geocode cache lookup + SAVEPOINT + 4 bulk INSERTs + RELEASE
+            with self.assertNumQueries(7):
+                response = self.client.post("/api/trips/batch/", payload, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(lookup.call_count, 1)
+        self.assertEqual((response.data["created"], response.data["failed"]), (2, 2))
+        results = response.data["results"]
+        self.assertIn("cycle_used_hours", results[1]["errors"])
+        self.assertIn("detail", results[2]["errors"])
+        self.assertEqual(Trip.objects.count(), 2)
+        self.assertEqual(
+            DailyLog.objects.filter(trip_id=results[3]["trip_id"]).count(),
+            results[3]["total_days"],
+        )
+
+
+class HOSEngineSummaryTests(SimpleTestCase):
+    def _totals_from_schedule(self, distance, cycle_used):
+        route_stops, log_segments = HOSEngine(distance, cycle_used).simulate()
+        stop_counts = {}
+        for stop in route_stops:
+            stop_counts[stop.type] = stop_counts.get(stop.type, 0) + 1
+        return {
+            "total_days": max((s.day for s in log_segments), default=0),
+            "drive_minutes": sum(
+                s.end_minute - s.start_minute for s in log_segments if s.status == "DRIVING"
+            ),
+            "on_duty_minutes": sum(
+                s.end_minute - s.start_minute for s in log_segments if s.status == "ON_DUTY"
+            ),
+            "stop_counts": stop_counts,
+        }
+
+    def test_summary_matches_full_schedule_on_random_corpus(self):
+        rng = random.Random(7)
+        cases = [(0, 0), (605, 0), (3000, 69.5), (10000, 0), (500, 75)]
+        cases += [(rng.uniform(0, 6000), rng.uniform(0, 72)) for _ in range(2000)]
+        for distance, cycle_used in cases:
+            summary = HOSEngine(distance, cycle_used).summarize()
+            self.assertEqual(
+                vars(summary), self._totals_from_schedule(distance, cycle_used),
+                msg=f"distance={distance} cycle_used={cycle_used}",
+            )
+
+    def test_summary_does_not_materialize_segments(self):
+        engine = HOSEngine(2500, 0)
+        engine.summarize()
+        self.assertEqual((engine.route_stops, engine.log_segments), ([], []))
+
+
+class MultiStopTripTests(TestCase):
+    ORS_RESPONSE = {
+        "routes": [{
+            "summary": {"distance": 1609 * 900, "duration": 3600 * 16},
+            "segments": [
+                {"distance": 1609 * 100, "duration": 3600 * 2},
+                {"distance": 1609 * 300, "duration": 3600 * 5},
+                {"distance": 1609 * 500, "duration": 3600 * 9},
+            ],
+            "geometry": "_p~iF~ps|U_ulLnnqC",
+        }]
+    }
+
+    def setUp(self):
+        plan_cache.clear()
+
+    def test_engine_places_stops_at_leg_ends(self):
+        legs = [Leg(110, "PICKUP", "Gary"), Leg(275, "DROPOFF", "Toledo"), Leg(400, "DROPOFF", "Buffalo")]
+        stops, _segments = HOSEngine(785, 0, legs=legs).simulate()
+        made = [(s.type, s.day, s.start_minute, s.location) for s in stops if s.location]
+        # 110 mi = 120 min of driving, then 275 mi = 300 min after the pickup hour
+        self.assertEqual(made, [
+            ("PICKUP", 1, 180, "Gary"),
+            ("DROPOFF", 1, 540, "Toledo"),
+            ("DROPOFF", 3, 0, "Buffalo"),
+        ])
+        self.assertNotIn("BREAK", [s.type for s in stops])
+
+    def test_all_legs_routed_with_one_ors_request(self):
+        client = mock.Mock()
+        client.post.return_value.json.return_value = self.ORS_RESPONSE
+        payload = {**_trip_payload(), "extra_drop_locations": ['{"lat": 39.1, "lon": -94.58}']}
+        with mock.patch("trip.services.route_service.get_http_client", return_value=client):
+            response = APIClient().post("/api/trips/", payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(client.post.call_count, 1)
+        self.assertEqual(len(client.post.call_args.kwargs["json"]["coordinates"]), 4)
+
+        stops = RouteStop.objects.filter(trip_id=response.data["trip_id"]).exclude(location_name=None)
+        self.assertEqual(
+            list(stops.order_by("day_number", "start_time").values_list("type", "location_name")),
+            [
+                ("PICKUP", payload["pickup_location"]),
+                ("DROPOFF", payload["extra_drop_locations"][0]),
+                ("DROPOFF", payload["drop_location"]),
+            ],
+        )
+
+
+class RouteGeometryTests(TestCase):
+    POLYLINE = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+    def test_decode_and_locate(self):
+        points = decode_polyline(self.POLYLINE)
+        self.assertEqual(points, [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)])
+        index = RouteIndex(points)
+        self.assertEqual(index.locate(0), points[0])
+        self.assertEqual(index.locate(index.cumulative[1]), points[1])
+        self.assertEqual(index.locate(10 ** 6), points[-1])
+        lat, lon = index.locate(index.cumulative[1] / 2)
+        self.assertAlmostEqual(lat, 39.6, places=6)
+        self.assertAlmostEqual(lon, -120.575, places=6)
+        with self.assertRaises(ValueError):
+            decode_polyline("abc")
+
+    def test_stops_are_placed_along_the_route(self):
+        route = dict(_fake_route(1500), geometry=self.POLYLINE)
+        client = mock.Mock()
+        client.get.return_value.json.return_value = {"display_name": "Somewhere, NV"}
+        with mock.patch("trip.services.trip_planner.get_route", return_value=route), \
+                mock.patch("trip.services.geometry.REVERSE_GEOCODE_STOPS", True), \
+                mock.patch("trip.services.geometry.get_http_client", return_value=client):
+            plan_cache.clear()
+            response = APIClient().post("/api/trips/", _trip_payload(), format="json")
+        stops = {s.type: s for s in RouteStop.objects.filter(trip_id=response.data["trip_id"])}
+        self.assertEqual((stops["PICKUP"].latitude, stops["PICKUP"].longitude), (38.5, -120.2))
+        self.assertEqual((stops["DROPOFF"].latitude, stops["DROPOFF"].longitude), (43.252, -126.453))
+        self.assertTrue(38.5 < stops["FUEL"].latitude < 43.252)
+        self.assertEqual(stops["FUEL"].location_name, "Somewhere, NV")
+        self.assertEqual(stops["PICKUP"].location_name, _trip_payload()["pickup_location"])
+
+
+class HOSEngineDaySummaryTests(SimpleTestCase):
+    def test_days_match_regrouped_segments(self):
+        for distance, cycle_used in ((0, 0), (300, 0), (2400, 12.5), (5200, 64)):
+            engine = HOSEngine(total_distance_miles=distance, cycle_used_hours=cycle_used)
+            _stops, segments = engine.simulate()
+            self.assertEqual(engine.days, summarize_days(segments))
+            for summary in engine.days:
+                self.assertEqual(
+                    summary.driving_minutes + summary.on_duty_minutes + summary.off_duty_minutes,
+                    sum(s.end_minute - s.start_minute for s in summary.segments),
+                )
+
+    def test_dtos_use_slots(self):
+        segment = LogSegmentDTO("OFF", 1, 0, 60)
+        self.assertFalse(hasattr(segment, "__dict__"))
+
+
+class HOSGoldenScheduleTests(SimpleTestCase):
+    def test_engine_matches_golden_schedules(self):
+        for case in load_golden():
+            with self.subTest(distance=case["distance"], cycle_used_hours=case["cycle_used_hours"]):
+                self.assertEqual(golden_schedule(case["distance"], case["cycle_used_hours"]), case)
+
+
+class HOSBenchmarkTests(TestCase):
+    def test_measure_leaves_no_rows_and_flags_regressions(self):
+        results = {100: measure(100, repeat=1)}
+        self.assertFalse(Trip.objects.exists())
+
+        baseline = {"100": {**results[100], "persist_queries": results[100]["persist_queries"] - 1}}
+        self.assertEqual(len(find_regressions(results, baseline, threshold=10)), 1)
+        self.assertEqual(find_regressions(results, {"100": results[100]}, threshold=0), [])
+
+    def test_noise_below_the_minimum_margin_is_not_a_regression(self):
+        baseline = {"100": {"simulate_ms": 0.02, "simulate_peak_kib": 1.5}}
+        self.assertEqual(find_regressions({100: {"simulate_ms": 0.05, "simulate_peak_kib": 3}}, baseline, 0.5), [])
+        self.assertEqual(len(find_regressions({100: {"simulate_ms": 0.6, "simulate_peak_kib": 9}}, baseline, 0.5)), 2)
+
+    def test_long_hauls_restart_the_cycle(self):
+        stops, segments = simulate_haul(10_000)
+        self.assertGreater(len(simulate_haul(100_000)[1]), 5 * len(segments))
+        self.assertEqual([s.type for s in stops].count("DROPOFF"), 1)
+        driven = sum(s.end_minute - s.start_minute for s in segments if s.status == "DRIVING")
+        self.assertAlmostEqual(driven / 60 * 55, 10_000, delta=1)
+
+
+class HOSBatchTests(TestCase):
+    def test_batch_matches_engine_summary(self):
+        rng = random.Random(11)
+        cases = [(0, 0), (605, 0), (3000, 69.5), (500, 75)]
+        cases += [(rng.uniform(0, 6000), rng.uniform(0, 72)) for _ in range(500)]
+        results = evaluate_hos_batch([d for d, _ in cases], [c for _, c in cases])
+        for i, (distance, cycle_used) in enumerate(cases):
+            summary = HOSEngine(distance, cycle_used).summarize()
+            msg = f"distance={distance} cycle_used={cycle_used}"
+            self.assertEqual(results["total_days"][i], summary.total_days, msg)
+            self.assertAlmostEqual(results["drive_hours"][i] * 60, summary.drive_minutes, msg=msg)
+            self.assertAlmostEqual(results["on_duty_hours"][i] * 60, summary.on_duty_minutes, msg=msg)
+            self.assertEqual(results["fuel_stops"][i], summary.stop_counts.get("FUEL", 0), msg)
+            self.assertEqual(results["break_stops"][i], summary.stop_counts.get("BREAK", 0), msg)
+
+    def test_what_if_endpoint_returns_grid(self):
+        response = APIClient().post(
+            "/api/trips/what-if/",
+            {"distances": [100, 1500, 3000], "cycle_used_hours": [0, 35, 69]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["total_days"]), 3)
+        self.assertEqual(len(response.data["total_days"][0]), 3)
+        self.assertEqual(
+            response.data["total_days"][2][0], HOSEngine(3000, 0).summarize().total_days
+        )
+        self.assertFalse(response.data["completed"][2][2])
+
+
+def _make_trip(days, compact=False):
+    """Persist a synthetic trip with `days` full days of segments."""
+    stops, segments = [], []
+    for day in range(1, days + 1):
+        stops.append(RouteStopDTO("DRIVING", day, 60, 540))
+        stops.append(RouteStopDTO("BREAK", day, 540, 570))
+        segments.append(LogSegmentDTO("OFF", day, 0, 60))
+        segments.append(LogSegmentDTO("DRIVING", day, 60, 540))
+        segments.append(LogSegmentDTO("ON_DUTY", day, 540, 570))
+        segments.append(LogSegmentDTO("SLEEPER", day, 570, 1440))
+    trip, _ = persist_trip(
+        {
+            **_trip_payload(),
+            "total_distance_miles": days * 440,
+            "total_duration_hours": days * 8,
+            "route_geometry": "",
+        },
+        stops,
+        segments,
+        compact=compact,
+    )
+    return trip
+
+
+class TripReadQueryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_logs_query_count_is_constant(self):
+        short_trip, long_trip = _make_trip(2), _make_trip(10)
+        for trip in (short_trip, long_trip):
+            # updated_at + trip + daily logs + segments
+            with self.assertNumQueries(4):
+                response = self.client.get(f"/api/trips/{trip.id}/logs/")
+        self.assertEqual(len(response.data["daily_logs"]), 10)
+        self.assertEqual(
+            [s["start_minute"] for s in response.data["daily_logs"][9]["log_segments"]],
+            [0, 60, 540, 570],
+        )
+
+    def test_map_query_count_is_constant(self):
+        short_trip, long_trip = _make_trip(2), _make_trip(10)
+        for trip in (short_trip, long_trip):
+            # updated_at + trip + route stops
+            with self.assertNumQueries(3):
+                response = self.client.get(f"/api/trips/{trip.id}/map/")
+        self.assertEqual(len(response.data["route_stops"]), 20)
+
+    def test_values_based_logs_match_model_serializer(self):
+        trip = _make_trip(3)
+        trip = Trip.objects.prefetch_related(
+            Prefetch(
+                "daily_logs",
+                queryset=DailyLog.objects.order_by("day_number").prefetch_related(
+                    Prefetch("log_segments", queryset=LogSegment.objects.order_by("start_minute"))
+                ),
+            )
+        ).get(pk=trip.pk)
+        expected = json.loads(json.dumps(TripLogsSerializer(trip).data, cls=DjangoJSONEncoder))
+        self.assertEqual(trip_logs_data(trip), expected)
+
+
+class CompactLogSegmentTests(TestCase):
+    def _without_segment_ids(self, data):
+        for log in data["daily_logs"]:
+            for seg in log["log_segments"]:
+                seg.pop("id")
+        return data
+
+    def test_encode_decode_round_trip(self):
+        segments = [LogSegmentDTO("DRIVING", 1, 60, 540), LogSegmentDTO("OFF", 1, 0, 60)]
+        packed = encode_segments(segments)
+        self.assertEqual(packed, [[0, 0, 60], [2, 60, 540]])
+        self.assertEqual(
+            decode_segments(packed),
+            [
+                {"status": "OFF", "start_minute": 0, "end_minute": 60},
+                {"status": "DRIVING", "start_minute": 60, "end_minute": 540},
+            ],
+        )
+
+    def test_compact_trip_writes_no_segment_rows_and_reads_in_one_fetch(self):
+        rows_trip = _make_trip(5)
+        with self.assertNumQueries(5):
+            compact_trip = _make_trip(5, compact=True)
+        self.assertFalse(LogSegment.objects.filter(daily_log__trip_id=compact_trip).exists())
+
+        # updated_at + trip + daily logs
+        with self.assertNumQueries(3):
+            response = APIClient().get(f"/api/trips/{compact_trip.id}/logs/")
+        expected = self._without_segment_ids(trip_logs_data(rows_trip))
+        actual = self._without_segment_ids(response.data)
+        for data in (expected, actual):
+            data.pop("id")
+            for log in data["daily_logs"]:
+                log.pop("id")
+        self.assertEqual(actual, expected)
+
+    def test_pack_command_round_trip(self):
+        trip = _make_trip(3)
+        expected = self._without_segment_ids(trip_logs_data(trip))
+
+        call_command("pack_log_segments", stdout=io.StringIO())
+        self.assertFalse(LogSegment.objects.exists())
+        self.assertFalse(DailyLog.objects.filter(segments__isnull=True).exists())
+        self.assertEqual(self._without_segment_ids(trip_logs_data(trip)), expected)
+
+        call_command("pack_log_segments", "--unpack", stdout=io.StringIO())
+        self.assertEqual(LogSegment.objects.count(), 12)
+        self.assertFalse(DailyLog.objects.filter(segments__isnull=False).exists())
+        self.assertEqual(self._without_segment_ids(trip_logs_data(trip)), expected)
+
+
+class TripListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_list_is_cursor_paginated_newest_first(self):
+        trips = [_make_trip(1) for _ in range(3)]
+        response = self.client.get("/api/trips/", {"page_size": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [t["id"] for t in response.data["results"]],
+            [str(trips[2].id), str(trips[1].id)],
+        )
+        self.assertNotIn("route_geometry", response.data["results"][0])
+        response = self.client.get(response.data["next"])
+        self.assertEqual([t["id"] for t in response.data["results"]], [str(trips[0].id)])
+        self.assertIsNone(response.data["next"])
+
+    def test_list_filters(self):
+        short_trip, long_trip = _make_trip(1), _make_trip(5)
+        Trip.objects.filter(pk=long_trip.pk).update(drop_location="Reno, NV")
+
+        response = self.client.get("/api/trips/", {"min_distance": 1000})
+        self.assertEqual([t["id"] for t in response.data["results"]], [str(long_trip.id)])
+        response = self.client.get("/api/trips/", {"location": "reno"})
+        self.assertEqual([t["id"] for t in response.data["results"]], [str(long_trip.id)])
+        response = self.client.get(
+            "/api/trips/", {"created_before": (timezone.now() - timedelta(days=1)).isoformat()}
+        )
+        self.assertEqual(response.data["results"], [])
+        response = self.client.get("/api/trips/", {"min_distance": 5, "max_distance": 1})
+        self.assertEqual(response.status_code, 400)
+
+
+class TripJobTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        plan_cache.clear()
+
+    def test_async_create_returns_job_and_worker_plans_it(self):
+        response = self.client.post("/api/trips/?async=1", _trip_payload(), format="json")
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Trip.objects.exists())
+        job_url = f"/api/trips/jobs/{response.data['job_id']}/"
+        self.assertTrue(response["Location"].endswith(job_url))
+        self.assertEqual(self.client.get(job_url).data["status"], "PENDING")
+
+        with mock.patch("trip.services.trip_planner.get_route", return_value=_fake_route(1500)):
+            self.assertEqual(run_pending_jobs(), 1)
+
+        job = self.client.get(job_url, {"wait": 1}).data
+        self.assertEqual(job["status"], "SUCCEEDED")
+        self.assertEqual(job["result"]["total_days"], DailyLog.objects.filter(trip_id=job["trip"]).count())
+
+    def test_unknown_or_malformed_job_id_is_not_found(self):
+        for job_id in ("not-a-uuid", "00000000-0000-0000-0000-000000000000"):
+            self.assertEqual(self.client.get(f"/api/trips/jobs/{job_id}/").status_code, 404)
+
+    def test_transient_failures_are_retried_then_fail(self):
+        job = enqueue_trip_job({**_trip_payload(), "cycle_used_hours": 5})
+        with mock.patch("trip.services.trip_planner.get_route", side_effect=requests.ConnectionError("down")):
+            self.assertEqual(run_pending_jobs(), 1)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), ("PENDING", 1))
+            self.assertGreater(job.not_before, timezone.now())
+            # not due yet
+            self.assertEqual(run_pending_jobs(), 0)
+
+            TripJob.objects.filter(pk=job.pk).update(not_before=timezone.now())
+            with mock.patch("trip.services.job_queue.RETRY_BACKOFF_SECONDS", 0):
+                run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("FAILED", MAX_ATTEMPTS))
+        self.assertIn("down", job.error)
+
+    def test_nominatim_outage_is_retried(self):
+        job = enqueue_trip_job({**_trip_payload(), "drop_location": "Los Angeles, CA", "cycle_used_hours": 5})
+        nominatim = mock.Mock()
+        nominatim.get.side_effect = requests.ConnectionError("connection refused")
+        with mock.patch("trip.services.route_service.geocode_cache", GeocodeCache()), \
+                mock.patch("trip.services.route_service.get_http_client", return_value=nominatim):
+            run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("PENDING", 1))
+        self.assertIn("connection refused", job.error)
+
+        TripJob.objects.filter(pk=job.pk).update(not_before=timezone.now())
+        with mock.patch("trip.services.trip_planner.get_route", return_value=_fake_route(1500)):
+            self.assertEqual(run_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("SUCCEEDED", 2))
+
+    def test_bad_locations_fail_without_retry(self):
+        job = enqueue_trip_job({**_trip_payload(), "drop_location": "Nowhere", "cycle_used_hours": 5})
+        with mock.patch("trip.services.route_service._request_geocode", side_effect=ValueError("Could not geocode")):
+            run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("FAILED", 1))
+
+
+class AsyncTripViewTests(TestCase):
+    def setUp(self):
+        plan_cache.clear()
+
+    async def test_async_create_and_map_match_drf_responses(self):
+        with mock.patch("trip.async_views.async_get_route", return_value=_fake_route(1500)):
+            response = await self.async_client.post(
+                "/api/async/trips/", _trip_payload(), content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        trip_id = body["trip_id"]
+        self.assertEqual(body["total_days"], await DailyLog.objects.filter(trip_id=trip_id).acount())
+
+        response = await self.async_client.get(f"/api/async/trips/{trip_id}/map/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["route_stops"][-1]["type"], "DROPOFF")
+
+    async def test_async_create_rejects_invalid_payload(self):
+        response = await self.async_client.post(
+            "/api/async/trips/", {"pickup_location": "x"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("drop_location", response.json())
+
+    async def test_async_create_retries_a_ledger_conflict(self):
+        driver = await Driver.objects.acreate(name="Dana")
+        calls = []
+
+        def conflict_once(plans):
+            calls.append(plans)
+            if len(calls) == 1:
+                raise LedgerConflict("booked meanwhile")
+            return persist_trips(plans)
+
+        with mock.patch("trip.async_views.async_get_route", return_value=_fake_route(1500)), \
+                mock.patch("trip.services.trip_planner.persist_trips", side_effect=conflict_once):
+            response = await self.async_client.post(
+                "/api/async/trips/", {**_trip_payload(), "driver": str(driver.id)},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(calls), 2)
+
+    async def test_async_create_maps_upstream_failures(self):
+        for error, expected in (
+            (ValueError("Could not geocode location: 'x'"), 400),
+            (requests.ConnectionError("connection refused"), 502),
+            (CircuitOpenError("nominatim circuit is open"), 503),
+        ):
+            with mock.patch("trip.async_views.async_get_route", side_effect=error):
+                response = await self.async_client.post(
+                    "/api/async/trips/", _trip_payload(), content_type="application/json"
+                )
+            self.assertEqual(response.status_code, expected)
+        self.assertFalse(await Trip.objects.aexists())
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        metrics.clear()
+        geocode_cache.clear()
+        plan_cache.clear()
+
+    def test_create_reports_server_timing_and_metrics(self):
+        with mock.patch("trip.services.trip_planner.get_route", return_value=_fake_route(1500)):
+            response = APIClient().post("/api/trips/", _trip_payload(), format="json")
+        self.assertEqual(response.status_code, 201)
+        phases = {part.split(";")[0] for part in response["Server-Timing"].split(", ")}
+        self.assertTrue({"hos", "persist", "db", "total"} <= phases)
+
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn('drivesheet_requests_total{view="trip-list",status="2xx"} 1', body)
+        self.assertIn('drivesheet_phase_seconds_count{phase="persist"} 1', body)
+
+    def test_concurrent_geocoding_is_recorded_on_the_request(self):
+        client = mock.Mock()
+        client.get.return_value.json.return_value = [{"lat": "41.8", "lon": "-87.6"}]
+        timings, token = start_request()
+        try:
+            with mock.patch("trip.services.route_service.get_http_client", return_value=client):
+                resolve_locations(["Chicago, IL", "Gary, IN", "Chicago, IL"])
+        finally:
+            end_request(token)
+        self.assertEqual(timings.phases["nominatim"][1], 2)
+        self.assertEqual(timings.events["geocode_cache_miss"], 2)
+
+
+class LogExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.rows_trip = _make_trip(2)
+        self.compact_trip = _make_trip(3, compact=True)
+
+    def _export(self, **params):
+        response = self.client.get("/api/trips/logs/export/", params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_csv_export_merges_both_storage_forms_in_order(self):
+        response, body = self._export()
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0][:3], ["trip_id", "day_number", "date"])
+        self.assertEqual(len(rows) - 1, 5 * 4)
+        keys = [(r[0], int(r[1]), int(r[7])) for r in rows[1:]]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual({r[0] for r in rows[1:]}, {str(self.rows_trip.id), str(self.compact_trip.id)})
+
+    def test_ndjson_export_filters_by_trip_and_date(self):
+        first_day = DailyLog.objects.get(trip_id=self.compact_trip, day_number=1).date
+        response, body = self._export(
+            export_format="ndjson", trip=[str(self.compact_trip.id)],
+            date_after=first_day, date_before=first_day,
+        )
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([r["status"] for r in rows], ["OFF", "DRIVING", "ON_DUTY", "SLEEPER"])
+        self.assertEqual({r["day_number"] for r in rows}, {1})
+        self.assertEqual(rows[0]["total_driving_hours"], "08:00:00")
+
+
+class LogRenderTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.trip = _make_trip(2)
+
+    def test_svg_sheet_with_etag_revalidation(self):
+        url = f"/api/trips/{self.trip.id}/logs/1/sheet/"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/svg+xml")
+        svg = response.content.decode()
+        self.assertTrue(svg.startswith("<svg"))
+        self.assertIn(">8:00</text>", svg)
+
+        # the trip's updated_at alone answers the revalidation
+        with mock.patch("trip.views.render_sheet_svg") as render, self.assertNumQueries(1):
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        render.assert_not_called()
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again["ETag"], response["ETag"])
+
+        other_day = self.client.get(f"/api/trips/{self.trip.id}/logs/2/sheet/")
+        self.assertEqual(other_day.status_code, 200)
+        self.assertEqual(self.client.get(f"/api/trips/{self.trip.id}/logs/9/sheet/").status_code, 404)
+
+        # a changed trip gets a fresh sheet
+        self.trip.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+    def test_pdf_bundle_has_a_page_per_day(self):
+        response = self.client.get(f"/api/trips/{self.trip.id}/logs/pdf/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(response.content.startswith(b"%PDF-1.4"))
+        self.assertIn(b"/Count 2", response.content)
+        self.assertTrue(response.content.rstrip().endswith(b"%%EOF"))
+        with self.assertNumQueries(1):
+            again = self.client.get(f"/api/trips/{self.trip.id}/logs/pdf/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+
+class TripReadCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.trip = _make_trip(2)
+
+    def test_conditional_get_and_cached_responses(self):
+        for path in ("", "logs/", "map/"):
+            url = f"/api/trips/{self.trip.id}/{path}"
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn("Last-Modified", response)
+
+            # one updated_at lookup answers both a 304 and a cached 200
+            with self.assertNumQueries(1):
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+            with self.assertNumQueries(1):
+                self.assertEqual(
+                    self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 304
+                )
+            with self.assertNumQueries(1):
+                cached = self.client.get(url)
+            self.assertEqual(cached.json(), response.json())
+            self.assertEqual(cached["ETag"], response["ETag"])
+
+    def test_map_without_geometry_is_not_validated(self):
+        Trip.objects.filter(pk=self.trip.pk).update(route_geometry=None)
+        url = f"/api/trips/{self.trip.id}/map/"
+        with mock.patch("trip.views.get_route", side_effect=requests.ConnectionError("down")):
+            response = self.client.get(url)
+        self.assertNotIn("geometry", response.json())
+        self.assertNotIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+        self.assertEqual(response["Cache-Control"], "no-store")
+
+        # the backfilled geometry is served to the next request
+        with mock.patch("trip.views.get_route", return_value=dict(_fake_route(500), geometry="abc")):
+            response = self.client.get(url)
+        self.assertEqual(response.json()["geometry"], "abc")
+        self.assertIn("ETag", response)
+
+    def test_update_and_delete_invalidate(self):
+        url = f"/api/trips/{self.trip.id}/"
+        before = self.client.get(url)
+        self.trip.drop_location = "Denver"
+        self.trip.save()
+        after = self.client.get(url, HTTP_IF_NONE_MATCH=before["ETag"])
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after["ETag"], before["ETag"])
+        self.assertEqual(after.json()["drop_location"], "Denver")
+
+        self.trip.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get("/api/trips/not-a-uuid/logs/").status_code, 404)
+
+
+class CycleLedgerTests(SimpleTestCase):
+    START = date(2026, 1, 5)
+
+    def _ledger(self, days, on_duty=600, leading=60, trailing=780):
+        ledger = CycleLedger()
+        for offset in days:
+            ledger.record(self.START + timedelta(days=offset), DutyDay(on_duty, leading, trailing))
+        return ledger
+
+    def test_window_rolls_over_the_last_seven_days(self):
+        ledger = self._ledger(range(8), on_duty=300)
+        self.assertEqual(ledger.cycle_used_hours(self.START + timedelta(days=8)), 35)
+        self.assertEqual(ledger.next_start_date(self.START), self.START + timedelta(days=8))
+        self.assertEqual(self._ledger(range(7)).cycle_used_hours(self.START + timedelta(days=7)), 70)
+
+    def test_34_hour_restart(self):
+        # 13h off after day 4, a day off, 1h off before day 6: 38 hours
+        ledger = self._ledger([0, 1, 2, 3, 4, 6])
+        self.assertEqual(ledger.cycle_used_hours(self.START + timedelta(days=7)), 10)
+        self.assertEqual(ledger.last_restart_date(self.START + timedelta(days=7)), self.START + timedelta(days=6))
+        # back on duty after 23 hours: no restart
+        ledger = self._ledger([0, 1, 2, 3, 4], trailing=780)
+        ledger.record(self.START + timedelta(days=5), DutyDay(600, 600, 780))
+        self.assertEqual(ledger.cycle_used_hours(self.START + timedelta(days=6)), 60)
+        self.assertIsNone(ledger.last_restart_date(self.START + timedelta(days=6)))
+        # off through the next start
+        self.assertEqual(ledger.cycle_used_hours(self.START + timedelta(days=8)), 0)
+
+    def test_same_date_logs_merge(self):
+        ledger = self._ledger([0])
+        ledger.record(self.START, DutyDay(120, 900, 300))
+        self.assertEqual(ledger.days[-1], DutyDay(720, 60, 300))
+        ledger.record(self.START - timedelta(days=CYCLE_DAYS), DutyDay(600, 0, 0))
+        self.assertEqual(ledger.cycle_used_hours(self.START + timedelta(days=1)), 12)
+
+
+class DriverCycleTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        plan_cache.clear()
+        self.driver = Driver.objects.create(name="Dana")
+
+    def _create(self, **extra):
+        payload = {**_trip_payload(), "driver": str(self.driver.id), **extra}
+        payload.pop("cycle_used_hours")
+        with mock.patch("trip.services.trip_planner.get_route", return_value=_fake_route(1500)):
+            response = self.client.post("/api/trips/", payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        return Trip.objects.get(pk=response.data["trip_id"])
+
+    def _on_duty_hours(self, trip):
+        return sum(
+            (log.total_driving_hours + log.total_on_duty_hour).total_seconds() / 3600
+            for log in trip.daily_logs.all()
+        )
+
+    def test_trips_take_cycle_hours_from_the_ledger(self):
+        first = self._create()
+        self.assertEqual(first.cycle_used_hours, 0)
+        self.driver.refresh_from_db()
+        first_days = first.daily_logs.order_by("date")
+        self.assertEqual(first_days.first().date, date.today())
+        self.assertEqual(self.driver.ledger_end_date, first_days.last().date)
+
+        second = self._create()
+        self.assertEqual(second.cycle_used_hours, self._on_duty_hours(first))
+        self.assertEqual(
+            second.daily_logs.order_by("date").first().date, first_days.last().date + timedelta(days=1)
+        )
+
+        driver = self.client.get(f"/api/drivers/{self.driver.id}/").data
+        self.assertEqual(driver["next_start_date"], second.daily_logs.order_by("date").last().date + timedelta(days=1))
+        self.assertAlmostEqual(driver["cycle_used_hours"] + driver["cycle_available_hours"], 70)
+
+        # rebuilding from the logs reproduces the incrementally kept ledger
+        self.driver.refresh_from_db()
+        incremental = (self.driver.ledger_end_date, self.driver.ledger_days)
+        Driver.objects.filter(pk=self.driver.pk).update(ledger_end_date=None, ledger_days=[])
+        call_command("rebuild_cycle_ledgers", stdout=io.StringIO())
+        self.driver.refresh_from_db()
+        self.assertEqual((self.driver.ledger_end_date, self.driver.ledger_days), incremental)
+
+    def test_concurrent_booking_is_rejected(self):
+        data, start_date = apply_driver_cycle({**_trip_payload(), "driver": self.driver})
+        plan = build_trip_plan(data, _fake_route(1500))
+        plan.start_date = start_date
+        # another trip of the driver is booked while `plan` was made
+        booked = self._create()
+        self.driver.refresh_from_db()
+        ledger = (self.driver.ledger_end_date, self.driver.ledger_days)
+
+        with self.assertRaises(LedgerConflict):
+            persist_trips([plan])
+        self.assertEqual(list(Trip.objects.values_list("id", flat=True)), [booked.id])
+        self.driver.refresh_from_db()
+        self.assertEqual((self.driver.ledger_end_date, self.driver.ledger_days), ledger)
+
+    def test_deleting_a_trip_rebuilds_the_ledger(self):
+        self._create()
+        self.driver.refresh_from_db()
+        ledger = (self.driver.ledger_end_date, self.driver.ledger_days)
+        second = self._create()
+
+        response = self.client.delete(f"/api/trips/{second.id}/")
+        self.assertEqual(response.status_code, 204)
+        self.driver.refresh_from_db()
+        self.assertEqual((self.driver.ledger_end_date, self.driver.ledger_days), ledger)
+
+    def test_cycle_hours_required_without_driver(self):
+        payload = _trip_payload()
+        payload.pop("cycle_used_hours")
+        response = self.client.post("/api/trips/", payload, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("cycle_used_hours", response.data)
+
+
+class FleetAvailabilityTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        today = date.today()
+        self.fresh = Driver.objects.create(name="Fresh")
+        # 9.5 on-duty hours on each of the last 7 days
+        self.tired = Driver.objects.create(
+            name="Tired", ledger_end_date=today - timedelta(days=1), ledger_days=[[570, 60, 810]] * 8
+        )
+        # on a trip that ends tomorrow
+        self.busy = Driver.objects.create(
+            name="Busy", ledger_end_date=today + timedelta(days=1), ledger_days=[[300, 60, 1080]] * 8
+        )
+
+    def test_drivers_are_ranked_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.post("/api/drivers/availability/", {"distance_miles": 600}, format="json")
+        self.assertEqual(response.status_code, 200)
+        results = response.data["results"]
+        self.assertEqual([r["name"] for r in results], ["Fresh", "Busy", "Tired"])
+        self.assertEqual(response.data["feasible"], 2)
+
+        fresh, busy, tired = results
+        self.assertEqual((fresh["start_date"], fresh["total_days"]), (date.today(), 2))
+        self.assertTrue(fresh["starts_on_time"])
+        self.assertEqual(busy["start_date"], date.today() + timedelta(days=2))
+        self.assertFalse(busy["starts_on_time"])
+        self.assertEqual(tired["cycle_used_hours"], 66.5)
+        self.assertEqual((tired["feasible"], tired["arrival_date"]), (False, None))
+        self.assertFalse(Trip.objects.exists())
+
+    def test_cycle_left_agrees_with_feasibility(self):
+        # 58 hours used: the 600-mile drive fits, the drive plus the pickup
+        # and dropoff hours would not
+        Driver.objects.create(
+            name="Close", ledger_end_date=date.today() - timedelta(days=1),
+            ledger_days=[[0, 1440, 1440]] + [[540, 60, 840]] * 6 + [[240, 60, 1140]],
+        )
+        response = self.client.post("/api/drivers/availability/", {"distance_miles": 600}, format="json")
+        for result in response.data["results"]:
+            self.assertAlmostEqual(
+                result["cycle_left_hours"], max(70 - result["cycle_used_hours"] - result["drive_hours"], 0)
+            )
+            if result["feasible"]:
+                self.assertGreater(result["cycle_left_hours"], 0)
+        close = next(r for r in response.data["results"] if r["name"] == "Close")
+        self.assertEqual(close["cycle_used_hours"], 58)
+        self.assertTrue(close["feasible"])
+        self.assertAlmostEqual(close["cycle_left_hours"], 12 - 600 / 55, places=1)
+
+    def test_load_from_locations_is_routed_once(self):
+        with mock.patch("trip.views.get_route", return_value=_fake_route(600)) as lookup:
+            response = self.client.post(
+                "/api/drivers/availability/",
+                {"pickup_location": "Chicago", "drop_location": "Denver", "drivers": [str(self.tired.id)]},
+                format="json",
+            )
+        lookup.assert_called_once_with("Chicago", "Denver")
+        self.assertEqual([r["name"] for r in response.data["results"]], ["Tired"])
+        self.assertEqual(
+            self.client.post("/api/drivers/availability/", {"pickup_location": "Chicago"}, format="json").status_code,
+            400,
+        )
+
+
+class ReplanTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        plan_cache.clear()
+        with mock.patch("trip.services.trip_planner.get_route", return_value=_fake_route(1500)):
+            response = self.client.post("/api/trips/", _trip_payload(), format="json")
+        self.trip = Trip.objects.get(pk=response.data["trip_id"])
+        self.url = f"/api/trips/{self.trip.id}/replan/"
+
+    def _days(self):
+        return [
+            (day["day_number"], [(s["status"], s["start_minute"], s["end_minute"]) for s in day["log_segments"]])
+            for day in trip_logs_data(self.trip)["daily_logs"]
+        ]
+
+    def test_resuming_on_plan_reproduces_the_schedule(self):
+        before = self._days()
+        day_one = DailyLog.objects.get(trip_id=self.trip, day_number=1).id
+        with mock.patch("trip.services.trip_planner.get_route") as lookup:
+            response = self.client.post(
+                self.url, {"day_number": 2, "minute": 60, "miles_completed": 605}, format="json"
+            )
+        lookup.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["total_days"], len(before))
+        self.assertEqual(self._days(), before)
+        self.assertTrue(DailyLog.objects.filter(pk=day_one).exists())
+
+    def test_delay_reschedules_later_days_only(self):
+        before = self._days()
+        etag = self.client.get(f"/api/trips/{self.trip.id}/logs/")["ETag"]
+        # stuck in traffic: 4 hours of driving covered 100 miles
+        elapsed = [
+            {"status": "OFF", "start_minute": 0, "end_minute": 60},
+            {"status": "DRIVING", "start_minute": 60, "end_minute": 300},
+        ]
+        response = self.client.post(
+            self.url,
+            {"day_number": 2, "minute": 300, "miles_completed": 705, "log_segments": elapsed},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        after = self._days()
+        self.assertEqual(after[0], before[0])
+        day_two = after[1][1]
+        self.assertEqual(day_two[:2], [("OFF", 0, 60), ("DRIVING", 60, 300)])
+        # 7 more hours today, after a break at 8 hours of driving
+        self.assertEqual(day_two[2:], [
+            ("DRIVING", 300, 540), ("ON_DUTY", 540, 570), ("DRIVING", 570, 750), ("SLEEPER", 750, 1440),
+        ])
+        for _, segments in after:
+            self.assertEqual([s[1] for s in segments[1:]], [s[2] for s in segments[:-1]])
+        self.assertEqual(response.data["total_days"], len(after))
+        # 410 miles left for day 3 instead of 290
+        self.assertEqual(sum(end - start for status, start, end in after[2][1] if status == "DRIVING"), 447)
+        self.assertNotEqual(self.client.get(f"/api/trips/{self.trip.id}/logs/")["ETag"], etag)
+
+    def _stops(self, day):
+        return list(
+            RouteStop.objects.filter(trip=self.trip, day_number=day)
+            .order_by("start_time")
+            .values_list("type", "start_time", "end_time", "duration_minutes")
+        )
+
+    def test_replan_before_pickup_keeps_the_pickup(self):
+        response = self.client.post(
+            self.url, {"day_number": 1, "minute": 30, "miles_completed": 0}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        day_one = self._days()[0][1]
+        self.assertEqual(day_one[:3], [("OFF", 0, 30), ("ON_DUTY", 30, 90), ("DRIVING", 90, 570)])
+        self.assertEqual(self._stops(1)[0], ("PICKUP", 30, 90, 60))
+
+    def test_replan_during_the_pickup_finishes_it(self):
+        response = self.client.post(
+            self.url, {"day_number": 1, "minute": 75, "miles_completed": 0}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        day_one = self._days()[0][1]
+        self.assertEqual(day_one[:3], [("OFF", 0, 60), ("ON_DUTY", 60, 120), ("DRIVING", 120, 600)])
+        self.assertEqual(RouteStop.objects.filter(trip=self.trip, type="PICKUP").count(), 1)
+        self.assertEqual(self._stops(1)[0], ("PICKUP", 60, 120, 60))
+
+    def test_replan_on_the_last_day_is_rejected(self):
+        before = self._days()
+        last_day = before[-1][0]
+        self.assertEqual(before[-1][1], [("ON_DUTY", 0, 60)])
+        for minute in (605, 30):
+            response = self.client.post(
+                self.url, {"day_number": last_day, "minute": minute, "miles_completed": 1400}, format="json"
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self._days(), before)
+        self.assertEqual(RouteStop.objects.filter(trip=self.trip, type="DROPOFF").count(), 1)
+
+    def test_stop_in_progress_is_cut_at_the_checkpoint(self):
+        response = self.client.post(
+            self.url, {"day_number": 1, "minute": 200, "miles_completed": 73}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        stops = self._stops(1)
+        self.assertEqual(stops[:3], [
+            ("PICKUP", 60, 120, 60), ("DRIVING", 120, 200, 80), ("DRIVING", 200, 600, 400),
+        ])
+        for previous, stop in zip(stops, stops[1:]):
+            self.assertEqual(previous[2], stop[1])
+
+    def test_invalid_replans(self):
+        for payload in (
+            {"day_number": 2, "minute": 60},
+            {"day_number": 2, "minute": 300, "miles_completed": 700,
+             "log_segments": [{"status": "OFF", "start_minute": 0, "end_minute": 60}]},
+            {"day_number": 9, "minute": 60, "miles_completed": 700},
+            {"day_number": 2, "minute": 60, "miles_completed": 1500},
+            {"day_number": 2, "minute": 60, "latitude": 40.0, "longitude": -100.0},
+        ):
+            self.assertEqual(self.client.post(self.url, payload, format="json").status_code, 400, payload)
@@ -1,139 +1,468 @@
-from collections import defaultdict
-from datetime import date, timedelta
+import time
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Prefetch, Q
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from trip.models import Trip, RouteStop, DailyLog, LogSegment
+from trip.models import Driver, Trip, RouteStop, TripJob
 from trip.serializers import (
-    TripSerializer, RouteStopSerializer, DailyLogSerializer, 
-    LogSegmentSerializer, TripMapSerializer, TripLogsSerializer
+    TripSerializer, TripMapSerializer, TripBatchSerializer,
+    WhatIfSerializer, TripListFilterSerializer,
+    TripJobSerializer, LogExportFilterSerializer, DriverSerializer,
+    FleetAvailabilitySerializer, TripReplanSerializer, trip_logs_data
 )
-from trip.services.hos_engine import HOSEngine
+from trip.pagination import TripCursorPagination
+from trip.services.cycle_ledger import LedgerConflict
+from trip.services.fleet import fleet_availability
+from trip.services.hos_batch import evaluate_hos_grid
+from trip.services.http_client import CircuitOpenError
+from trip.services.job_queue import TERMINAL_STATUSES, enqueue_trip_job
 from trip.services.route_service import get_route
-from trip.services.log_generator import generate_daily_logs
+from trip.services.log_export import iter_log_rows, stream_csv, stream_ndjson
+from trip.services.log_render import (
+    RENDER_VERSION, bundle_etag, render_sheet_svg, render_trip_pdf, sheet_etag,
+)
+from trip.services.response_cache import get_cached_response, set_cached_response, trip_etag
+from trip.services.trip_planner import plan_trip, plan_trip_batch, replan_trip
 
 
 # Create your views here.
 
+def upstream_error_status(exc):
+    """HTTP status for a geocoding/routing service failure: 503 while its
+    circuit breaker is open, 502 for any other transport or HTTP error."""
+    if isinstance(exc, CircuitOpenError):
+        return status.HTTP_503_SERVICE_UNAVAILABLE
+    return status.HTTP_502_BAD_GATEWAY
+
+
 class TripViewSet(viewsets.ModelViewSet):
     queryset = Trip.objects.all()
     serializer_class = TripSerializer
     # everyone can acess and read, write update, delete
     permission_classes = [AllowAny]
+    pagination_class = TripCursorPagination
+    # a waiting poller holds a worker (sleeping) for up to this long, so
+    # the wait stays short; clients poll again for longer jobs
+    JOB_MAX_WAIT_SECONDS = 5
+    JOB_POLL_SECONDS = 0.5
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'map':
+            return queryset.prefetch_related(
+                Prefetch(
+                    'route_stops',
+                    queryset=RouteStop.objects.order_by('day_number', 'start_time'),
+                )
+            )
+        if self.action in ('logs', 'log_sheet', 'log_sheets_pdf'):
+            # logs are read separately by trip_logs_data
+            return queryset.only('id', 'total_distance_miles', 'total_duration_hours')
+        if self.action == 'list':
+            return self._filter_list(queryset.defer('route_geometry'))
+        return queryset
+
+    def _filter_list(self, queryset):
+        """Apply the date range, distance range and location filters from
+        the query string."""
+        filters = TripListFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        params = filters.validated_data
+
+        if 'created_after' in params:
+            queryset = queryset.filter(created_at__gte=params['created_after'])
+        if 'created_before' in params:
+            queryset = queryset.filter(created_at__lt=params['created_before'])
+        if 'min_distance' in params:
+            queryset = queryset.filter(total_distance_miles__gte=params['min_distance'])
+        if 'max_distance' in params:
+            queryset = queryset.filter(total_distance_miles__lte=params['max_distance'])
+        if 'location' in params:
+            location = params['location']
+            queryset = queryset.filter(
+                Q(current_location__icontains=location)
+                | Q(pickup_location__icontains=location)
+                | Q(drop_location__icontains=location)
+            )
+        return queryset
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         # check data is valid or not
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
-        # Route calculation (from pickup to dropoff)
-        route = get_route(
-            data["pickup_location"],
-            data["drop_location"]
-        )
 
-        # Create Trip
-        trip = Trip.objects.create(
-            current_location=data["current_location"],
-            pickup_location=data["pickup_location"],
-            drop_location=data["drop_location"],
-            cycle_used_hours=float(data["cycle_used_hours"]),
-            total_distance_miles=route["distance_miles"],
-            total_duration_hours=route["duration_hours"],
-        )
+        # Asynchronous mode: queue the planning for the job worker and let
+        # the client poll the job
+        if self._wants_async(request):
+            job = enqueue_trip_job(data)
+            status_url = request.build_absolute_uri(f"jobs/{job.id}/")
+            return Response(
+                {"job_id": str(job.id), "status": job.status, "status_url": status_url},
+                status=status.HTTP_202_ACCEPTED,
+                headers={"Location": status_url},
+            )
+
+        # Geocode, route (from pickup to dropoff), run the HOS engine and
+        # persist Trip, RouteStops, DailyLogs and LogSegments in bulk
+        try:
+            trip, total_days = plan_trip(data)
+        except LedgerConflict as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_409_CONFLICT)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except requests.RequestException as exc:
+            return Response({"detail": str(exc)}, status=upstream_error_status(exc))
 
-        # Run HOS Engine
-        engine = HOSEngine(
-            total_distance_miles=trip.total_distance_miles,
-            cycle_used_hours=trip.cycle_used_hours,
+        # Response
+        return Response(
+            {
+                "trip_id": str(trip.id),
+                "total_days": total_days,
+                "total_distance_miles": trip.total_distance_miles,
+            },
+            status=status.HTTP_201_CREATED,
         )
 
-        route_stops_dto, log_segments_dto = engine.simulate()
-
-        # Persist RouteStops
-        for stop in route_stops_dto:
-            RouteStop.objects.create(
-                trip=trip,
-                type=stop.type,
-                start_time=stop.start_minute,
-                end_time=stop.end_minute,
-                duration_minutes=stop.end_minute - stop.start_minute,
-                day_number=stop.day,
-            )
+    def _wants_async(self, request):
+        if request.query_params.get("async", "").lower() in ("1", "true", "yes"):
+            return True
+        return "respond-async" in request.headers.get("Prefer", "")
 
-        #  Group LogSegments by day
-        logs_by_day = defaultdict(list)
-        for seg in log_segments_dto:
-            logs_by_day[seg.day].append(seg)
+    @action(detail=False, methods=['get'], url_path=r'jobs/(?P<job_id>[^/.]+)')
+    def job(self, request, job_id=None):
+        """Status of an asynchronous trip job.
 
-        # Persist DailyLogs + LogSegments
-        start_date = date.today()
+        `?wait=<seconds>` long-polls (up to JOB_MAX_WAIT_SECONDS) until the
+        job has finished. The request keeps its worker while it waits.
+        """
+        job = get_object_or_404(TripJob, pk=job_id)
+        try:
+            wait = min(float(request.query_params.get("wait", 0)), self.JOB_MAX_WAIT_SECONDS)
+        except ValueError:
+            wait = 0
+        deadline = time.monotonic() + wait
+        while job.status not in TERMINAL_STATUSES and time.monotonic() < deadline:
+            time.sleep(self.JOB_POLL_SECONDS)
+            job.refresh_from_db()
+        return Response(TripJobSerializer(job).data)
 
-        for day, segments in logs_by_day.items():
-            driving_minutes = sum(
-                s.end_minute - s.start_minute
-                for s in segments if s.status == "DRIVING"
-            )
-            on_duty_minutes = sum(
-                s.end_minute - s.start_minute
-                for s in segments if s.status == "ON_DUTY"
-            )
-            off_duty_minutes = sum(
-                s.end_minute - s.start_minute
-                for s in segments if s.status in ("OFF", "SLEEPER")
-            )
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Plan and persist many trips in one request.
 
-            daily_log = DailyLog.objects.create(
-                trip_id=trip,
-                day_number=day,
-                date=start_date + timedelta(days=day - 1),
-                total_driving_hours=timedelta(minutes=driving_minutes),
-                total_on_duty_hour=timedelta(minutes=on_duty_minutes),
-                total_off_duty_hour=timedelta(minutes=off_duty_minutes),
-            )
+        Geocoding and routing are shared across the batch and everything is
+        written with a handful of bulk queries. Each trip gets its own entry
+        in `results`; invalid or unroutable trips report their errors there
+        without failing the rest.
+        """
+        batch_serializer = TripBatchSerializer(data=request.data)
+        batch_serializer.is_valid(raise_exception=True)
 
-            for seg in segments:
-                LogSegment.objects.create(
-                    daily_log=daily_log,
-                    status=seg.status,
-                    start_minute=seg.start_minute,
-                    end_minute=seg.end_minute,
-                )
+        results = []
+        valid_items = []
+        valid_indexes = []
+        for index, item in enumerate(batch_serializer.validated_data["trips"]):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                valid_items.append(serializer.validated_data)
+                valid_indexes.append(index)
+                results.append(None)
+            else:
+                results.append({"index": index, "errors": serializer.errors})
 
-        # Response
-        return Response(
-            {
+        for index, outcome in zip(valid_indexes, plan_trip_batch(valid_items)):
+            if isinstance(outcome, Exception):
+                results[index] = {"index": index, "errors": {"detail": str(outcome)}}
+                continue
+            trip, total_days = outcome
+            results[index] = {
+                "index": index,
                 "trip_id": str(trip.id),
-                "total_days": len(logs_by_day),
+                "total_days": total_days,
                 "total_distance_miles": trip.total_distance_miles,
+            }
+
+        return Response(
+            {
+                "created": sum(1 for r in results if "trip_id" in r),
+                "failed": sum(1 for r in results if "errors" in r),
+                "results": results,
             },
-            status=status.HTTP_201_CREATED,
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=['post'], url_path='what-if')
+    def what_if(self, request):
+        """Compare HOS outcomes across a grid of distances and cycle hours.
+
+        Every result array is indexed [distance][cycle_used_hours].
+        """
+        serializer = WhatIfSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        results = evaluate_hos_grid(data["distances"], data["cycle_used_hours"])
+        return Response(
+            {
+                "distances": data["distances"],
+                "cycle_used_hours": data["cycle_used_hours"],
+                **{name: values.tolist() for name, values in results.items()},
+            }
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional_read(
+            request, lambda: (self.get_serializer(self.get_object()).data, True)
         )
 
     @action(detail=True, methods=['get'])
     def map(self, request, pk=None):
         """Get map data including route geometry and stops for a trip."""
+        return self._conditional_read(request, self._map_data)
+
+    def _map_data(self):
         trip = self.get_object()
         serializer = TripMapSerializer(trip)
-        
-        # Add geometry from the route if available (stored in first route stop)
         data = serializer.data
-        
-        # Optionally fetch fresh geometry if needed
+
+        # Geometry is stored on the trip at creation time. Trips created
+        # before that fall back to the (cached) route lookup once and keep
+        # the result.
+        geometry = trip.route_geometry
+        if geometry is None:
+            try:
+                geometry = get_route(trip.pickup_location, trip.drop_location).get('geometry')
+            except Exception:
+                # If the lookup fails, data will just not include geometry
+                pass
+            else:
+                Trip.objects.filter(pk=trip.pk).update(route_geometry=geometry)
+
+        if geometry is not None:
+            data['geometry'] = geometry
+        # a failed lookup is retried on the next request
+        return data, geometry is not None
+
+    @action(detail=True, methods=['post'])
+    def replan(self, request, pk=None):
+        """Reschedule a delayed trip from the driver's current position.
+
+        Takes `day_number` and `minute`, the position (`miles_completed`, or
+        `latitude`/`longitude`) and optionally the day's actual
+        `log_segments` up to `minute`. The HOS engine resumes from there and
+        only that day and later ones are rewritten.
+        """
+        trip = self.get_object()
+        serializer = TripReplanSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        position = None
+        if 'latitude' in data:
+            position = (data['latitude'], data['longitude'])
+        log_segments = None
+        if 'log_segments' in data:
+            log_segments = [
+                (seg['status'], seg['start_minute'], seg['end_minute']) for seg in data['log_segments']
+            ]
         try:
-            route = get_route(trip.pickup_location, trip.drop_location)
-            data['geometry'] = route.get('geometry')
-        except Exception:
-            # If fresh fetch fails, data will just not include live geometry
-            pass
-        
-        return Response(data)
+            total_days = replan_trip(
+                trip, data['day_number'], data['minute'],
+                miles_completed=data.get('miles_completed'),
+                position=position,
+                log_segments=log_segments,
+                distance_since_fuel=data.get('distance_since_fuel'),
+            )
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except requests.RequestException as exc:
+            return Response({"detail": str(exc)}, status=upstream_error_status(exc))
+
+        return Response({
+            "trip_id": str(trip.id),
+            "replanned_from_day": data['day_number'],
+            "total_days": total_days,
+        })
 
     @action(detail=True, methods=['get'])
     def logs(self, request, pk=None):
         """Get daily logs with all log segments for a trip."""
-        trip = self.get_object()
-        serializer = TripLogsSerializer(trip)
-        return Response(serializer.data)
+        return self._conditional_read(request, lambda: (trip_logs_data(self.get_object()), True))
+
+    def _conditional_read(self, request, build):
+        """Serve a read action of one trip with ETag/Last-Modified validation.
+
+        Trips only change through save() (which bumps `updated_at`), so the
+        validators come from a single primary-key lookup of `updated_at`. A
+        matching If-None-Match/If-Modified-Since gets a 304; otherwise the
+        serialized data comes from the response cache, and `build` (returning
+        the data and whether it may be cached) only runs on a miss. Data that
+        may not be cached is sent without validators, so clients never
+        revalidate against it.
+        """
+        trip_id, updated_at = self._trip_version()
+        etag = trip_etag(trip_id, updated_at, self.action)
+        last_modified = int(updated_at.timestamp())
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            data = get_cached_response(trip_id, self.action, etag)
+            if data is None:
+                data, cacheable = build()
+                if not cacheable:
+                    response = Response(data)
+                    response['Cache-Control'] = 'no-store'
+                    return response
+                set_cached_response(trip_id, self.action, etag, data)
+            response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def _trip_version(self):
+        """(id, updated_at) of the requested trip, from a single primary-key
+        lookup. Raises Http404."""
+        try:
+            row = Trip.objects.filter(pk=self.kwargs['pk']).values_list('id', 'updated_at').first()
+        except (TypeError, ValueError, ValidationError):
+            row = None
+        if row is None:
+            raise Http404
+        return row
+
+    @action(detail=True, methods=['get'], url_path=r'logs/(?P<day_number>[0-9]+)/sheet')
+    def log_sheet(self, request, pk=None, day_number=None):
+        """Render one day's duty-status grid as an SVG log sheet."""
+        def load():
+            daily_logs = trip_logs_data(self.get_object())['daily_logs']
+            day = next((d for d in daily_logs if d['day_number'] == int(day_number)), None)
+            if day is None:
+                raise NotFound("No log for this day.")
+            return sheet_etag(day), lambda: render_sheet_svg(day)
+
+        return self._rendered(request, f'log_sheet:{int(day_number)}', load, 'image/svg+xml')
+
+    @action(detail=True, methods=['get'], url_path='logs/pdf')
+    def log_sheets_pdf(self, request, pk=None):
+        """Render every daily log sheet of a trip as a multi-page PDF."""
+        def load():
+            days = trip_logs_data(self.get_object())['daily_logs']
+            if not days:
+                raise NotFound("Trip has no logs.")
+            return bundle_etag(days), lambda: render_trip_pdf(days)
+
+        response = self._rendered(request, 'log_sheets_pdf', load, 'application/pdf')
+        response['Content-Disposition'] = f'inline; filename="trip-{pk}-logs.pdf"'
+        return response
+
+    def _rendered(self, request, variant, load, content_type):
+        """Serve a rendering of the trip's logs.
+
+        The ETag comes from the trip's `updated_at`, `variant` and
+        RENDER_VERSION, so a matching If-None-Match gets a 304 after a
+        single primary-key lookup, without reading the logs. Otherwise
+        `load` reads them and returns their content hash and a render
+        function; the body comes from the cache under that hash (shared by
+        identical sheets), rendering it on a miss. No Last-Modified is sent,
+        as a new RENDER_VERSION changes the body but not `updated_at`.
+        """
+        trip_id, updated_at = self._trip_version()
+        etag = trip_etag(trip_id, updated_at, f'{variant}:{RENDER_VERSION}')
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            content_hash, render = load()
+            key = f'log-render:{content_hash}'
+            body = cache.get(key)
+            if body is None:
+                body = render()
+                cache.set(key, body, getattr(settings, 'LOG_RENDER_CACHE_SECONDS', 24 * 3600))
+            response = HttpResponse(body, content_type=content_type)
+        response['ETag'] = etag
+        # clients keep the rendering but revalidate it on every view
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @action(detail=False, methods=['get'], url_path='logs/export')
+    def export_logs(self, request):
+        """Stream every log segment, one row each, as CSV or NDJSON.
+
+        Accepts `export_format` (csv or ndjson), a `date_after`/`date_before`
+        range on the log date (inclusive) and repeated `trip` ids. Rows are
+        read with server-side cursors and written as they are produced, so
+        exports of any size use constant memory.
+        """
+        filters = LogExportFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        params = filters.validated_data
+
+        log_filters = {}
+        if 'date_after' in params:
+            log_filters['date__gte'] = params['date_after']
+        if 'date_before' in params:
+            log_filters['date__lte'] = params['date_before']
+        if params.get('trip'):
+            log_filters['trip_id__in'] = params['trip']
 
+        rows = iter_log_rows(log_filters)
+        if params['export_format'] == 'ndjson':
+            response = StreamingHttpResponse(stream_ndjson(rows), content_type='application/x-ndjson')
+        else:
+            response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="daily-logs.{params["export_format"]}"'
+        return response
+
+
+class DriverViewSet(viewsets.ModelViewSet):
+    """Drivers and their cycle hours from the rolling duty ledger, which is
+    kept up to date as their trips are planned."""
+    queryset = Driver.objects.order_by('name')
+    serializer_class = DriverSerializer
+    permission_classes = [AllowAny]
+
+    @action(detail=False, methods=['post'])
+    def availability(self, request):
+        """Rank drivers for one load.
+
+        The load is a `distance_miles` or a `pickup_location` and
+        `drop_location`, routed once. Every driver in `drivers` (default:
+        all) is evaluated from their cycle ledger in one batched HOS run
+        starting on `start_date` (default today); nothing is persisted.
+        """
+        serializer = FleetAvailabilitySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        distance_miles = data.get('distance_miles')
+        if distance_miles is None:
+            try:
+                distance_miles = get_route(data['pickup_location'], data['drop_location'])['distance_miles']
+            except ValueError as exc:
+                return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            except requests.RequestException as exc:
+                return Response({"detail": str(exc)}, status=upstream_error_status(exc))
+
+        drivers = self.get_queryset()
+        if 'drivers' in data:
+            drivers = drivers.filter(pk__in=data['drivers'])
+        results = fleet_availability(
+            distance_miles,
+            drivers.values_list('id', 'name', 'ledger_end_date', 'ledger_days'),
+            data.get('start_date'),
+        )
+        return Response({
+            "distance_miles": distance_miles,
+            "feasible": sum(1 for r in results if r["feasible"]),
+            "results": results,
+        })